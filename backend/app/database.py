@@ -11,6 +11,18 @@ engine = create_async_engine(
     max_overflow=20,
 )
 
+# Optional read replica for analytics reads (NL2SQL); falls back to the primary
+replica_engine = (
+    create_async_engine(
+        settings.DATABASE_REPLICA_URL,
+        echo=False,
+        pool_pre_ping=True,
+        pool_size=5,
+        max_overflow=5,
+    )
+    if settings.DATABASE_REPLICA_URL else None
+)
+
 AsyncSessionLocal = async_sessionmaker(
     engine,
     class_=AsyncSession,
@@ -19,6 +31,11 @@ AsyncSessionLocal = async_sessionmaker(
 )
 
 
+def read_engine():
+    """Engine for read-only analytics queries: the replica if configured."""
+    return replica_engine or engine
+
+
 class Base(DeclarativeBase):
     pass
 
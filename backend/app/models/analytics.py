@@ -1,3 +1,4 @@
+from datetime import date
 from pydantic import BaseModel
 from typing import Any, Dict, List, Optional
 
@@ -12,3 +13,19 @@ class NLQueryResult(BaseModel):
     rows: List[Dict[str, Any]]
     count: int
     error: Optional[str] = None
+    truncated: bool = False   # more rows matched than NL2SQL_MAX_ROWS
+    cached: bool = False
+
+
+class DailyStats(BaseModel):
+    day: date
+    sessions: int
+    messages: int
+    tokens: int
+    unanswered: int
+    avg_confidence: Optional[float] = None
+
+
+class AnalyticsOverview(BaseModel):
+    daily: List[DailyStats]
+    languages: Dict[str, int]
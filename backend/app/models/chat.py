@@ -11,8 +11,12 @@ class ChatRequest(BaseModel):
     chatbot_id: str
     session_id: str
     message: str
-    history: List[HistoryMessage] = Field(default_factory=list)
+    history: List[HistoryMessage] = Field(default_factory=list)  # optional – the server keeps the session
     visitor_id: str = ""
+    # Tenant persona – forms the cacheable part of the prompt
+    business_name: str = ""
+    system_prompt: str = ""
+    language: str = ""
 
 
 class ChatResponse(BaseModel):
@@ -0,0 +1,30 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
+
+
+class EmbeddingQuery(BaseModel):
+    chatbot_id: str
+    query: str
+    n_results: int = Field(default=5, ge=1, le=50)
+
+
+class EmbeddingQueryRequest(BaseModel):
+    queries: List[EmbeddingQuery] = Field(min_length=1, max_length=1000)
+
+
+class RetrievedChunkOut(BaseModel):
+    id: str
+    text: str
+    score: float
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+
+
+class EmbeddingQueryResult(BaseModel):
+    chatbot_id: str
+    query: str
+    chunks: List[RetrievedChunkOut]
+    error: Optional[str] = None   # set when the search failed (chunks is then empty)
+
+
+class EmbeddingQueryResponse(BaseModel):
+    results: List[EmbeddingQueryResult]
@@ -0,0 +1,57 @@
+"""
+Analytics router – natural-language questions over the dashboard's data.
+Called from the Next.js /api/analytics/nl-query route; /overview serves
+dashboard charts from the precomputed rollups.
+"""
+import logging
+from dataclasses import asdict
+
+from fastapi import APIRouter, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+from app.models.analytics import AnalyticsOverview, DailyStats, NLQueryRequest, NLQueryResult
+from app.services.nl2sql_service import NL2SQLService
+from app.services.rollups import get_rollup_service
+from app.utils import sse
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+nl2sql_service = NL2SQLService()
+
+
+@router.post("/nl-query", response_model=NLQueryResult)
+async def nl_query(request: NLQueryRequest):
+    """Answer an analytics question scoped to the user's own chatbots."""
+    result = await nl2sql_service.query(request.question, request.user_id)
+    return NLQueryResult(
+        sql=result.get("sql", ""),
+        rows=result.get("rows", []),
+        count=result.get("count", 0),
+        error=result.get("error"),
+        truncated=result.get("truncated", False),
+        cached=result.get("cached", False),
+    )
+
+
+@router.post("/nl-query/stream")
+async def nl_query_stream(request: NLQueryRequest):
+    """
+    Same as /nl-query, as NDJSON: {"sql"}, then one {"rows": [...]} line per
+    page as the cursor yields it, then {"count", "truncated", "cached"} or {"error"}.
+    """
+    async def lines():
+        async for event in nl2sql_service.stream(request.question, request.user_id):
+            yield sse.dumps(jsonable_encoder(event)) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/overview", response_model=AnalyticsOverview)
+async def overview(user_id: str, days: int = Query(14, ge=1, le=366)):
+    """Per-day sessions, messages, tokens, unanswered and confidence, plus languages."""
+    result = await get_rollup_service().overview(user_id, days)
+    return AnalyticsOverview(
+        daily=[DailyStats(**asdict(d)) for d in result.daily],
+        languages=result.languages,
+    )
@@ -1,76 +1,118 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse, JSONResponse
-import json
+from starlette.background import BackgroundTask
+import asyncio
 import logging
 
-from app.models.chat import ChatRequest
-from app.services.rag_service import RagService
+from app.config import settings
+from app.models.chat import ChatRequest, ChatResponse
+from app.utils import sse
+from app.utils.prompt_builder import Persona
+from app.services.admission import get_admission
+from app.services.rag_service import get_rag_service
+from app.services.stream_guard import StreamGuard
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
-rag_service = RagService()
+rag_service = get_rag_service()
+
+
+def _persona(request: ChatRequest) -> Persona:
+    return Persona(
+        company_name=request.business_name,
+        personality=request.system_prompt,
+        language=request.language,
+    )
 
 
 @router.post("/message")
-async def chat_message(request: ChatRequest):
+async def chat_message(request: ChatRequest, http_request: Request):
     """
     Stream an AI response for the given message using RAG.
-    Returns Server-Sent Events (text/event-stream).
+    Returns Server-Sent Events (text/event-stream). Generation stops as soon
+    as the client disconnects or the per-reply time / token caps are hit.
+    Answers 429 with Retry-After when the chatbot is over its rate limit or
+    no reply slot frees up within ADMISSION_QUEUE_TIMEOUT_SECONDS.
     """
+    ticket = await get_admission().admit("chat", request.chatbot_id)
+    await ticket.wait(settings.ADMISSION_QUEUE_TIMEOUT_SECONDS)
+
     # Convert HistoryMessage pydantic objects to plain dicts for the AI engine
     history_dicts = [
         {"role": h.role, "content": h.content}
         for h in request.history
     ]
 
+    guard = StreamGuard(request.chatbot_id, http_request)
+
     async def event_stream():
+        deltas = guard.wrap(rag_service.stream_response(
+            chatbot_id=request.chatbot_id,
+            session_id=request.session_id,
+            message=request.message,
+            history=history_dicts,
+            visitor_id=request.visitor_id,
+            persona=_persona(request),
+        ))
         try:
-            async for chunk in rag_service.stream_response(
-                chatbot_id=request.chatbot_id,
-                session_id=request.session_id,
-                message=request.message,
-                history=history_dicts,
-                visitor_id=request.visitor_id,
-            ):
-                yield f"data: {json.dumps({'content': chunk})}\n\n"
-            yield "data: [DONE]\n\n"
+            async for frame in sse.coalesce(deltas):
+                yield frame
+            if not guard.disconnected:
+                yield sse.DONE
         except Exception as exc:
             logger.exception("Error in chat stream")
-            yield f"data: {json.dumps({'error': str(exc), 'content': '😞 Something went wrong. Please try again.'})}\n\n"
+            yield sse.event({"error": str(exc), "content": "😞 Something went wrong. Please try again."})
+        finally:
+            ticket.release()
 
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(ticket.release),  # in case the stream never starts
+    )
 
 
 @router.post("/telegram")
 async def telegram_chat(request: ChatRequest):
     """
     Non-streaming endpoint for Telegram / n8n integration.
-    Returns a plain JSON response with the full AI reply.
+    Returns a plain JSON response with the full AI reply and its token usage.
     """
     history_dicts = [
         {"role": h.role, "content": h.content}
         for h in request.history
     ]
 
-    full_response = ""
+    ticket = await get_admission().admit("chat", request.chatbot_id)
+    await ticket.wait(settings.ADMISSION_QUEUE_TIMEOUT_SECONDS)
     try:
-        async for chunk in rag_service.stream_response(
-            chatbot_id=request.chatbot_id,
-            session_id=request.session_id,
-            message=request.message,
-            history=history_dicts,
-            visitor_id=request.visitor_id,
-        ):
-            full_response += chunk
+        async with asyncio.timeout(settings.CHAT_STREAM_MAX_SECONDS):
+            completion = await rag_service.complete(
+                chatbot_id=request.chatbot_id,
+                session_id=request.session_id,
+                message=request.message,
+                history=history_dicts,
+                visitor_id=request.visitor_id,
+                persona=_persona(request),
+                max_tokens=min(settings.MAX_TOKENS, settings.CHAT_STREAM_MAX_TOKENS),
+            )
     except Exception as exc:
         logger.exception("Error in telegram chat")
         return JSONResponse(
             status_code=500,
             content={"error": str(exc), "reply": "😞 Something went wrong. Please try again."},
         )
+    finally:
+        ticket.release()
 
+    response = ChatResponse(
+        content=completion.text,
+        session_id=request.session_id,
+        tokens_used=completion.total_tokens or None,
+    )
     return JSONResponse(content={
-        "reply": full_response,
+        "reply": completion.text,
         "chatbot_id": request.chatbot_id,
-        "session_id": request.session_id,
+        **response.model_dump(),
     })
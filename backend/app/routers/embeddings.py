@@ -1,10 +1,26 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
 from fastapi import APIRouter
 from fastapi.responses import JSONResponse
 
-from app.services.chroma_service import ChromaService
+from app.config import settings
+from app.models.embeddings import (
+    EmbeddingQueryRequest,
+    EmbeddingQueryResponse,
+    EmbeddingQueryResult,
+    RetrievedChunkOut,
+)
+from app.services.chroma_service import ChromaService, EmbeddingModelChanged, RetrievedChunk
+from app.services.embedding_service import EmbeddingService
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 chroma_service = ChromaService()
+embedding_service = EmbeddingService()
+
+QUERY_BATCH = 64  # query vectors per Chroma call
 
 
 @router.get("/status/{chatbot_id}")
@@ -12,3 +28,76 @@ async def embedding_status(chatbot_id: str):
     """Return the number of embedded chunks for a chatbot."""
     count = await chroma_service.count_chunks(chatbot_id)
     return JSONResponse({"chatbot_id": chatbot_id, "chunk_count": count})
+
+
+@router.post("/query", response_model=EmbeddingQueryResponse)
+async def query_embeddings(request: EmbeddingQueryRequest):
+    """
+    Retrieval only, no LLM – for offline evaluation, n8n and cache warming.
+    Distinct query texts are embedded in one batched pass per embedding
+    model in use; queries are grouped per chatbot and searched concurrently,
+    QUERY_BATCH vectors per Chroma call. Results come back in request order;
+    a query whose search failed has an `error` instead of chunks, so callers
+    can tell "no matches" from "Chroma is down".
+    """
+    queries = request.queries
+    chatbot_ids = list(dict.fromkeys(q.chatbot_id for q in queries))
+    models = dict(zip(chatbot_ids, await asyncio.gather(
+        *(chroma_service.embedding_model(c) for c in chatbot_ids)
+    )))
+
+    vectors: Dict[Tuple[str, str], List[float]] = {}  # (model, text) -> vector
+    for model in dict.fromkeys(models.values()):
+        texts = list(dict.fromkeys(q.query for q in queries if models[q.chatbot_id] == model))
+        embedded = await embedding_service.embed_chunks(texts, model=model)
+        vectors.update(((model, t), v) for t, v in zip(texts, embedded))
+
+    groups: Dict[Tuple[str, int], List[int]] = {}
+    for i, q in enumerate(queries):
+        groups.setdefault((q.chatbot_id, q.n_results), []).append(i)
+
+    ranked: List[List[RetrievedChunk]] = [[] for _ in queries]
+    errors: List[Optional[str]] = [None for _ in queries]
+    gate = asyncio.Semaphore(settings.CHROMA_QUERY_CONCURRENCY)
+
+    async def _search(chatbot_id: str, n_results: int, indexes: List[int]) -> None:
+        async with gate:
+            try:
+                try:
+                    rows = await chroma_service.query_batch(
+                        chatbot_id,
+                        [vectors[models[chatbot_id], queries[i].query] for i in indexes],
+                        n_results,
+                        model=models[chatbot_id],
+                    )
+                except EmbeddingModelChanged as changed:
+                    # the collection was re-embedded since its model was cached
+                    texts = [queries[i].query for i in indexes]
+                    embedded = await embedding_service.embed_chunks(texts, model=changed.model)
+                    rows = await chroma_service.query_batch(chatbot_id, embedded, n_results)
+            except Exception as exc:
+                logger.warning("Batch query for chatbot=%s failed: %s", chatbot_id, exc)
+                for i in indexes:
+                    errors[i] = f"Search failed: {exc}"
+                return
+        for i, row in zip(indexes, rows):
+            ranked[i] = row
+
+    await asyncio.gather(*(
+        _search(chatbot_id, n_results, indexes[k : k + QUERY_BATCH])
+        for (chatbot_id, n_results), indexes in groups.items()
+        for k in range(0, len(indexes), QUERY_BATCH)
+    ))
+
+    return EmbeddingQueryResponse(results=[
+        EmbeddingQueryResult(
+            chatbot_id=q.chatbot_id,
+            query=q.query,
+            chunks=[
+                RetrievedChunkOut(id=c.id, text=c.text, score=c.score, metadata=c.metadata)
+                for c in chunks
+            ],
+            error=error,
+        )
+        for q, chunks, error in zip(queries, ranked, errors)
+    ])
@@ -1,5 +1,6 @@
 from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 router = APIRouter()
 
@@ -7,3 +8,9 @@ router = APIRouter()
 @router.get("/health")
 async def health_check():
     return JSONResponse({"status": "ok", "service": "chatbot-ai-backend"})
+
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,15 +1,19 @@
 from fastapi import APIRouter, UploadFile, File, Form, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import logging
-import sqlalchemy as sa
+from dataclasses import asdict
 
-from app.database import engine
 from app.config import settings
 from app.models.document import FAQPair, IngestFAQRequest, IngestURLRequest
 from app.services.document_processor import DocumentProcessor
 from app.services.url_scraper import URLScraper
 from app.services.embedding_service import EmbeddingService
 from app.services.chroma_service import ChromaService
+from app.services.admission import AdmissionRejected, Ticket, get_admission
+from app.services.doc_status import get_doc_status_service
+from app.services.ingest_pipeline import PipelineResult, URLIngestPipeline
+from app.utils import sse
+from app.utils.simhash import dedup_chunks
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -18,23 +22,31 @@ doc_processor = DocumentProcessor()
 url_scraper = URLScraper()
 embedding_service = EmbeddingService()
 chroma_service = ChromaService()
+url_pipeline = URLIngestPipeline(url_scraper, embedding_service, chroma_service)
 
 
-async def _update_status(document_id: str, status: str, chunk_count: int = 0) -> None:
-    """Update document status directly in Postgres (no HTTP roundtrip)."""
+def _dedup(label: str, chunks: list[str]) -> list[str]:
+    """Drop near-duplicate chunks before they are embedded."""
+    kept, stats = dedup_chunks(chunks, threshold=settings.NEAR_DUPLICATE_THRESHOLD)
+    if stats.dropped:
+        logger.info(
+            "%s: %d near-duplicate chunks not embedded (~%d KB storage avoided)",
+            label, stats.dropped, stats.storage_avoided() // 1024,
+        )
+    return kept
+
+
+async def _admit(chatbot_id: str, document_id: str) -> Ticket:
+    """
+    Admit one ingestion job (429 when the chatbot is over its limits). The
+    dashboard doesn't wait for this response, so a rejected document is
+    marked FAILED rather than left PENDING.
+    """
     try:
-        async with engine.begin() as conn:
-            await conn.execute(
-                sa.text(
-                    'UPDATE "Document" SET status = CAST(:status AS "DocStatus"), '
-                    '"chunkCount" = :chunk_count, "updatedAt" = now() '
-                    'WHERE id = :id'
-                ),
-                {"status": status, "chunk_count": chunk_count, "id": document_id},
-            )
-        logger.info("Document %s → %s (chunks=%d)", document_id, status, chunk_count)
-    except Exception:
-        logger.exception("Failed to update status for document %s", document_id)
+        return await get_admission().admit("ingest", chatbot_id)
+    except AdmissionRejected:
+        await get_doc_status_service().update(document_id, "FAILED")
+        raise
 
 
 @router.post("/document")
@@ -45,8 +57,11 @@ async def ingest_document(
     file: UploadFile = File(...),
 ):
     """Ingest an uploaded file into ChromaDB."""
-    content = await file.read()
+    content = await file.read()  # before admitting: a failed upload must not hold a ticket
+    ticket = await _admit(chatbot_id, document_id)
     background_tasks.add_task(
+        _run_admitted,
+        ticket,
         _process_and_embed,
         chatbot_id=chatbot_id,
         document_id=document_id,
@@ -59,7 +74,10 @@ async def ingest_document(
 @router.post("/faq")
 async def ingest_faq(request: IngestFAQRequest, background_tasks: BackgroundTasks):
     """Ingest FAQ pairs directly as text chunks."""
+    ticket = await _admit(request.chatbot_id, request.document_id)
     background_tasks.add_task(
+        _run_admitted,
+        ticket,
         _embed_faq,
         chatbot_id=request.chatbot_id,
         document_id=request.document_id,
@@ -71,7 +89,10 @@ async def ingest_faq(request: IngestFAQRequest, background_tasks: BackgroundTask
 @router.post("/url")
 async def ingest_url(request: IngestURLRequest, background_tasks: BackgroundTasks):
     """Crawl a website (up to max_pages pages) and ingest the content."""
+    ticket = await _admit(request.chatbot_id, request.document_id)
     background_tasks.add_task(
+        _run_admitted,
+        ticket,
         _scrape_and_embed,
         chatbot_id=request.chatbot_id,
         document_id=request.document_id,
@@ -85,6 +106,24 @@ async def ingest_url(request: IngestURLRequest, background_tasks: BackgroundTask
     })
 
 
+@router.get("/progress/{document_id}")
+async def ingest_progress(document_id: str):
+    """
+    Ingestion progress as SSE: the current {document_id, status, chunks, pages},
+    then one frame per update until DONE or FAILED, then [DONE].
+    """
+    async def frames():
+        async for state in get_doc_status_service().subscribe(document_id):
+            yield sse.PING if state is None else sse.event(asdict(state))
+        yield sse.DONE
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.delete("/document/{chatbot_id}/{document_id}")
 async def delete_document(chatbot_id: str, document_id: str):
     """Remove a document's embeddings from ChromaDB."""
@@ -95,13 +134,26 @@ async def delete_document(chatbot_id: str, document_id: str):
 # ── Background task helpers ──────────────────────────────────────────────
 
 
+async def _run_admitted(ticket: Ticket, job, **kwargs) -> None:
+    """Run an ingestion job once the fair scheduler grants it a slot."""
+    async with ticket:
+        await job(**kwargs)
+
+
+async def _report_progress(document_id: str, result: PipelineResult) -> None:
+    await get_doc_status_service().update(document_id, "PROCESSING", result.chunks, result.pages)
+
+
 async def _process_and_embed(
     chatbot_id: str, document_id: str, filename: str, content: bytes
 ):
-    await _update_status(document_id, "PROCESSING")
+    await get_doc_status_service().update(document_id, "PROCESSING")
     try:
         chunks = await doc_processor.process(filename=filename, content=content)
-        embeddings = await embedding_service.embed_chunks(chunks)
+        chunks = _dedup(f"Document {document_id}", chunks)
+        embeddings = await embedding_service.embed_chunks(
+            chunks, model=await chroma_service.embedding_model(chatbot_id)
+        )
         await chroma_service.add_chunks(
             chatbot_id=chatbot_id,
             document_id=document_id,
@@ -109,17 +161,19 @@ async def _process_and_embed(
             embeddings=embeddings,
         )
         logger.info("Ingested document %s (%d chunks)", document_id, len(chunks))
-        await _update_status(document_id, "DONE", len(chunks))
+        await get_doc_status_service().update(document_id, "DONE", len(chunks))
     except Exception:
         logger.exception("Failed to ingest document %s", document_id)
-        await _update_status(document_id, "FAILED")
+        await get_doc_status_service().update(document_id, "FAILED")
 
 
 async def _embed_faq(chatbot_id: str, document_id: str, pairs: list[FAQPair]):
-    await _update_status(document_id, "PROCESSING")
+    await get_doc_status_service().update(document_id, "PROCESSING")
     try:
         chunks = [f"Q: {p.question}\nA: {p.answer}" for p in pairs]
-        embeddings = await embedding_service.embed_chunks(chunks)
+        embeddings = await embedding_service.embed_chunks(
+            chunks, model=await chroma_service.embedding_model(chatbot_id)
+        )
         await chroma_service.add_chunks(
             chatbot_id=chatbot_id,
             document_id=document_id,
@@ -127,70 +181,37 @@ async def _embed_faq(chatbot_id: str, document_id: str, pairs: list[FAQPair]):
             embeddings=embeddings,
         )
         logger.info("Ingested FAQ %s (%d pairs)", document_id, len(pairs))
-        await _update_status(document_id, "DONE", len(chunks))
+        await get_doc_status_service().update(document_id, "DONE", len(chunks))
     except Exception:
         logger.exception("Failed to ingest FAQ %s", document_id)
-        await _update_status(document_id, "FAILED")
+        await get_doc_status_service().update(document_id, "FAILED")
 
 
 async def _scrape_and_embed(
     chatbot_id: str, document_id: str, url: str, max_pages: int = 50
 ):
-    await _update_status(document_id, "PROCESSING")
+    await get_doc_status_service().update(document_id, "PROCESSING")
     try:
         logger.info("Starting crawl: %s (max_pages=%d)", url, max_pages)
 
-        # Phase 1: Basic httpx-based crawl (fast, gets most content)
-        combined_text, pages_crawled = await url_scraper.crawl(url, max_pages=max_pages)
-
-        # Phase 2: JS-aware scrape for pages with dynamic content (pricing, tabs)
-        # This catches data hidden behind JavaScript tabs/carousels
-        try:
-            from app.services.js_scraper import scrape_with_js
-            logger.info("Running JS scraper for dynamic content on %s ...", url)
-
-            # Scrape the main URL and its pricing/services sub-pages with Playwright
-            js_text = await scrape_with_js(url, wait_seconds=5)
-            if js_text:
-                combined_text += f"\n\n--- JS-RENDERED CONTENT: {url} ---\n{js_text}"
-
-            # Also try common pricing/services sub-pages
-            from urllib.parse import urljoin
-            pricing_paths = [
-                "/PRICING_WOMEN/index.html", "/PRICING_MEN/index.html",
-                "/pricing", "/prices", "/services", "/menu",
-            ]
-            for path in pricing_paths:
-                sub_url = urljoin(url, path)
-                if sub_url != url:
-                    try:
-                        js_sub = await scrape_with_js(sub_url, wait_seconds=5)
-                        if js_sub and len(js_sub) > 100:
-                            combined_text += f"\n\n--- JS-RENDERED CONTENT: {sub_url} ---\n{js_sub}"
-                            pages_crawled += 1
-                    except Exception:
-                        pass
-
-        except ImportError:
-            logger.info("Playwright not available – skipping JS scraping")
-        except Exception as exc:
-            logger.warning("JS scraping failed (non-fatal): %s", exc)
-
-        from app.utils.text_splitter import TextSplitter
-        chunks = TextSplitter().split(combined_text)
-        embeddings = await embedding_service.embed_chunks(chunks)
-        await chroma_service.add_chunks(
+        # Pages are split, embedded and upserted while the crawl is still
+        # running; JS-dependent pages are rendered with Playwright in-line.
+        result = await url_pipeline.run(
             chatbot_id=chatbot_id,
             document_id=document_id,
-            chunks=chunks,
-            embeddings=embeddings,
+            url=url,
+            max_pages=max_pages,
+            on_progress=lambda r: _report_progress(document_id, r),
         )
+
+        logger.info("Crawl report for %s: %s", url, result.report.summary())
         logger.info(
-            "Ingested URL %s — pages: %d, chunks: %d",
-            url, pages_crawled, len(chunks),
+            "Ingested URL %s — pages: %d, chunks: %d, near-duplicate chunks skipped: %d",
+            url, result.pages, result.chunks, result.dedup.dropped,
+        )
+        await get_doc_status_service().update(
+            document_id, "DONE", result.chunks, result.pages
         )
-        await _update_status(document_id, "DONE", len(chunks))
     except Exception:
         logger.exception("Failed to ingest URL %s", url)
-        await _update_status(document_id, "FAILED")
-
+        await get_doc_status_service().update(document_id, "FAILED")
@@ -1,14 +1,27 @@
 """
-Telegram integration router – start/stop/status of Telegram bots.
-Called from the Next.js frontend when a user saves their Telegram token.
+Telegram integration router – start/stop/status of Telegram bots, plus the
+shared webhook endpoint every bot posts to in webhook mode.
+Called from the Next.js frontend when a user saves their Telegram token
+(the token itself is stored in "Chatbot"."telegramToken" by the frontend).
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Request
 from pydantic import BaseModel
 from typing import Optional
+import hmac
 import logging
 
-from app.services.telegram_bot import start_bot, stop_bot, get_running_bots
 from app.config import settings
+from app.services.telegram_bot import (
+    check_token,
+    get_running_bots,
+    handle_webhook_update,
+    load_registrations,
+    owns,
+    shard_of,
+    start_bot,
+    stop_bot,
+    webhook_secret,
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -22,17 +35,30 @@ class TelegramConnectRequest(BaseModel):
 
 class TelegramDisconnectRequest(BaseModel):
     chatbot_id: str
+    token: Optional[str] = None   # the token being removed, to unregister its webhook
+
+
+def _polled_elsewhere(chatbot_id: str) -> bool:
+    """The bot is run by a telegram_worker.py process or another shard, not here."""
+    mode = settings.TELEGRAM_MODE
+    return mode == "worker" or (mode == "polling" and not owns(chatbot_id))
 
 
 @router.post("/connect")
 async def connect_telegram(request: TelegramConnectRequest):
     """Start a Telegram bot for a chatbot."""
-    success = await start_bot(
-        chatbot_id=request.chatbot_id,
-        token=request.token,
-        business_name=request.business_name,
-        backend_url=settings.FASTAPI_URL,
-    )
+    if _polled_elsewhere(request.chatbot_id):
+        # The owning shard picks the saved token up on its next sync
+        if await check_token(request.token):
+            shard = shard_of(request.chatbot_id)
+            return {"status": "connected", "message": f"Telegram bot registered (shard {shard})"}
+        success = False
+    else:
+        success = await start_bot(
+            chatbot_id=request.chatbot_id,
+            token=request.token,
+            business_name=request.business_name,
+        )
     if success:
         return {"status": "connected", "message": f"Telegram bot started for {request.business_name}"}
     raise HTTPException(status_code=400, detail="Failed to start Telegram bot. Please check your bot token.")
@@ -41,10 +67,26 @@ async def connect_telegram(request: TelegramConnectRequest):
 @router.post("/disconnect")
 async def disconnect_telegram(request: TelegramDisconnectRequest):
     """Stop a Telegram bot for a chatbot."""
-    await stop_bot(request.chatbot_id)
+    await stop_bot(request.chatbot_id, unregister=True, token=request.token)
     return {"status": "disconnected", "message": "Telegram bot stopped."}
 
 
+@router.post("/webhook/{chatbot_id}")
+async def telegram_webhook(
+    chatbot_id: str,
+    request: Request,
+    secret: Optional[str] = Header(None, alias="X-Telegram-Bot-Api-Secret-Token"),
+):
+    """Webhook mode: receive one update for any bot and hand it to that bot's handlers."""
+    if not settings.TELEGRAM_WEBHOOK_SECRET or not hmac.compare_digest(
+        secret or "", webhook_secret(chatbot_id)
+    ):
+        raise HTTPException(status_code=403, detail="Bad webhook secret")
+    if not await handle_webhook_update(chatbot_id, await request.json()):
+        raise HTTPException(status_code=404, detail="No Telegram bot for this chatbot")
+    return {"ok": True}
+
+
 @router.get("/status")
 async def telegram_status():
     """Get all running Telegram bots."""
@@ -55,6 +97,8 @@ async def telegram_status():
 @router.get("/status/{chatbot_id}")
 async def telegram_bot_status(chatbot_id: str):
     """Check if a specific chatbot has an active Telegram bot."""
-    bots = get_running_bots()
-    is_running = chatbot_id in bots
+    is_running = chatbot_id in get_running_bots()
+    if not is_running and (settings.TELEGRAM_MODE == "webhook" or _polled_elsewhere(chatbot_id)):
+        # Served by a webhook on demand or by another process: registered means running
+        is_running = bool(await load_registrations(chatbot_id))
     return {"chatbot_id": chatbot_id, "is_running": is_running}
@@ -0,0 +1,289 @@
+"""
+Admission Control – per-chatbot rate limits and fair scheduling in front of
+/chat/* and /ingest/*, so one busy tenant can't starve the rest.
+
+Two checks run before a request gets work done:
+
+1. Token bucket per (entry point, chatbot), kept in Redis and updated by a
+   Lua script so the limit holds across workers. If Redis is unreachable
+   each worker falls back to its own in-process buckets and retries Redis
+   after REDIS_RETRY_SECONDS (see redis_client.py).
+2. Weighted fair queue per entry point with ADMISSION_*_CONCURRENCY slots
+   per worker. Waiting requests are tagged with a virtual finish time
+   (start + 1/weight), and freed slots go to the lowest tag, so chatbots
+   share the slots in proportion to their weight. A chatbot is limited to
+   ADMISSION_MAX_QUEUE waiting requests.
+
+Rates, bursts and weights scale with the owner's plan
+(ADMISSION_PLAN_WEIGHTS). Rejections raise AdmissionRejected, a 429
+HTTPException with Retry-After, and are counted in
+admission_throttled_total.
+
+Usage::
+
+    ticket = await get_admission().admit("chat", chatbot_id)
+    await ticket.wait(settings.ADMISSION_QUEUE_TIMEOUT_SECONDS)  # 429 on timeout
+    try:
+        ...
+    finally:
+        ticket.release()
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import sqlalchemy as sa
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.database import engine
+from app.services.metrics import ADMISSION_QUEUE, ADMISSION_THROTTLED, chatbot_label
+from app.services.redis_client import shared_redis
+
+logger = logging.getLogger(__name__)
+
+WEIGHT_TTL_SECONDS = 300.0   # how long a chatbot's plan weight is cached
+_LOCAL_BUCKETS = 10000       # in-process buckets kept when Redis is down
+
+# KEYS[1] = bucket; ARGV = rate/s, burst, cost. Returns {allowed, retry_after_s}.
+# Uses the server clock so every worker refills the bucket the same way.
+_TOKEN_BUCKET = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed, retry = 0, 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(retry)}
+"""
+
+
+class AdmissionRejected(HTTPException):
+    """429 Too Many Requests with a Retry-After header."""
+
+    def __init__(self, retry_after: float, detail: str):
+        seconds = max(1, math.ceil(retry_after))
+        super().__init__(status_code=429, detail=detail, headers={"Retry-After": str(seconds)})
+        self.retry_after = seconds
+
+
+class Ticket:
+    """A request's place in a FairScheduler queue; holds a slot once granted."""
+
+    def __init__(self, scheduler: Optional["FairScheduler"], chatbot_id: str, weight: float):
+        self.scheduler = scheduler
+        self.chatbot_id = chatbot_id
+        self.weight = weight
+        self.cancelled = False
+        self._granted = asyncio.Event()
+        self._released = False
+        if scheduler is None:  # admission disabled
+            self._granted.set()
+
+    @property
+    def granted(self) -> bool:
+        return self._granted.is_set()
+
+    async def wait(self, timeout: Optional[float] = None) -> None:
+        """Wait for a slot; after *timeout* seconds give up with a 429."""
+        try:
+            await asyncio.wait_for(self._granted.wait(), timeout)
+        except asyncio.TimeoutError:
+            self.release()
+            if self.scheduler is not None:
+                self.scheduler.throttled(self.chatbot_id, "timeout")
+            raise AdmissionRejected(timeout or 1.0, "Server busy, please retry shortly.")
+        except asyncio.CancelledError:
+            self.release()
+            raise
+
+    def release(self) -> None:
+        """Free the slot, or leave the queue if it was never granted. Idempotent."""
+        if self._released or self.scheduler is None:
+            return
+        self._released = True
+        if self.granted:
+            self.scheduler.release()
+        else:
+            self.scheduler.cancel(self)
+
+    async def __aenter__(self) -> "Ticket":
+        await self.wait()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.release()
+
+
+class FairScheduler:
+    """Weighted fair queue over *slots* concurrent requests of one kind."""
+
+    def __init__(self, kind: str, slots: int, max_queue: int = settings.ADMISSION_MAX_QUEUE):
+        self.kind = kind
+        self.slots = slots
+        self.max_queue = max_queue
+        self.active = 0
+        self._heap: List[Tuple[float, int, Ticket]] = []
+        self._seq = itertools.count()
+        self._vtime = 0.0                    # finish tag of the last request granted
+        self._finish: Dict[str, float] = {}  # last finish tag per chatbot
+        self._waiting: Dict[str, int] = {}
+
+    def depth(self, chatbot_id: str) -> int:
+        return self._waiting.get(chatbot_id, 0)
+
+    def enqueue(self, chatbot_id: str, weight: float) -> Ticket:
+        if self.depth(chatbot_id) >= self.max_queue:
+            self.throttled(chatbot_id, "queue_full")
+            raise AdmissionRejected(1.0, "Too many requests queued for this chatbot.")
+        ticket = Ticket(self, chatbot_id, weight)
+        tag = max(self._vtime, self._finish.get(chatbot_id, 0.0)) + 1.0 / weight
+        self._finish[chatbot_id] = tag
+        heapq.heappush(self._heap, (tag, next(self._seq), ticket))
+        self._track(chatbot_id, +1)
+        self._dispatch()
+        return ticket
+
+    def release(self) -> None:
+        self.active -= 1
+        self._dispatch()
+
+    def cancel(self, ticket: Ticket) -> None:
+        """*ticket* gave up waiting; it is skipped when it reaches the head."""
+        if not ticket.cancelled:
+            ticket.cancelled = True
+            self._track(ticket.chatbot_id, -1)
+
+    def throttled(self, chatbot_id: str, reason: str) -> None:
+        ADMISSION_THROTTLED.labels(self.kind, reason, chatbot_label(chatbot_id)).inc()
+
+    def _dispatch(self) -> None:
+        while self.active < self.slots and self._heap:
+            tag, _, ticket = heapq.heappop(self._heap)
+            if ticket.cancelled:
+                continue
+            self._track(ticket.chatbot_id, -1)
+            self._vtime = tag
+            self.active += 1
+            ticket._granted.set()
+        if not self._heap:
+            # idle: nobody is behind, so past tags no longer matter
+            self._finish = {cid: t for cid, t in self._finish.items() if t > self._vtime}
+
+    def _track(self, chatbot_id: str, delta: int) -> None:
+        waiting = self._waiting.get(chatbot_id, 0) + delta
+        if waiting:
+            self._waiting[chatbot_id] = waiting
+        else:
+            self._waiting.pop(chatbot_id, None)
+        ADMISSION_QUEUE.labels(self.kind, chatbot_label(chatbot_id)).inc(delta)
+
+
+class AdmissionController:
+    def __init__(self, redis_url: str = settings.REDIS_URL):
+        self._redis = shared_redis(redis_url)
+        client = self._redis.client
+        self._bucket_script = client.register_script(_TOKEN_BUCKET) if client else None
+        self._local: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # key -> (tokens, ts)
+        self._weights: Dict[str, Tuple[float, float]] = {}                    # chatbot -> (weight, expires)
+        self.limits = {
+            "chat": (settings.ADMISSION_CHAT_RATE, settings.ADMISSION_CHAT_BURST),
+            "ingest": (settings.ADMISSION_INGEST_RATE, settings.ADMISSION_INGEST_BURST),
+        }
+        self.schedulers = {
+            "chat": FairScheduler("chat", settings.ADMISSION_CHAT_CONCURRENCY),
+            "ingest": FairScheduler("ingest", settings.ADMISSION_INGEST_CONCURRENCY),
+        }
+
+    async def admit(self, kind: str, chatbot_id: str) -> Ticket:
+        """
+        Rate-limit and queue one *kind* request for *chatbot_id*. Raises
+        AdmissionRejected (429) when the bucket is empty or the queue is full.
+        The returned ticket still has to wait() for its slot.
+        """
+        if not settings.ADMISSION_ENABLED:
+            return Ticket(None, chatbot_id, 1.0)
+        scheduler = self.schedulers[kind]
+        weight = await self.weight(chatbot_id)
+        rate, burst = self.limits[kind]
+        retry_after = await self._take(f"admission:{kind}:{chatbot_id}", rate * weight, burst * weight)
+        if retry_after > 0:
+            scheduler.throttled(chatbot_id, "rate")
+            raise AdmissionRejected(retry_after, "Rate limit exceeded for this chatbot.")
+        return scheduler.enqueue(chatbot_id, weight)
+
+    async def weight(self, chatbot_id: str) -> float:
+        """Plan weight of the chatbot's owner, cached for WEIGHT_TTL_SECONDS."""
+        now = time.monotonic()
+        cached = self._weights.get(chatbot_id)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        try:
+            async with engine.connect() as conn:
+                plan = (await conn.execute(
+                    sa.text(
+                        'SELECT u.plan FROM "Chatbot" c JOIN "User" u ON u.id = c."userId" '
+                        "WHERE c.id = :id"
+                    ),
+                    {"id": chatbot_id},
+                )).scalar()
+        except Exception as exc:
+            logger.warning("Admission: plan lookup failed for %s (%s)", chatbot_id, exc)
+            plan = None
+        weight = settings.ADMISSION_PLAN_WEIGHTS.get(str(plan), 1.0) if plan else 1.0
+        if len(self._weights) >= _LOCAL_BUCKETS:
+            self._weights.clear()
+        self._weights[chatbot_id] = (weight, now + WEIGHT_TTL_SECONDS)
+        return weight
+
+    # ── Token buckets ──────────────────────────────────────────────────────
+
+    async def _take(self, key: str, rate: float, burst: float) -> float:
+        """Take one token; returns 0 if allowed, else seconds until one is available."""
+        if self._bucket_script is not None and self._redis.available() is not None:
+            try:
+                allowed, retry_after = await self._bucket_script(keys=[key], args=[rate, burst, 1])
+                return 0.0 if int(allowed) else float(retry_after)
+            except (RedisError, OSError) as exc:
+                self._redis.mark_down("Admission", exc, "using per-worker buckets")
+        return self._take_local(key, rate, burst)
+
+    def _take_local(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        tokens, ts = self._local.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - ts) * rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        self._local[key] = (tokens, now)
+        while len(self._local) > _LOCAL_BUCKETS:
+            self._local.popitem(last=False)
+        return retry_after
+
+
+_admission: Optional[AdmissionController] = None
+
+
+def get_admission() -> AdmissionController:
+    global _admission
+    if _admission is None:
+        _admission = AdmissionController()
+    return _admission
@@ -1,18 +1,26 @@
 """
 AI Engine – powers all chat responses via Groq (llama-3.3-70b-versatile).
 Drop-in streaming inference layer; used by RAGEngine for context-aware replies.
+Requests go through the LLM router, which falls back to (or hedges with)
+secondary providers when Groq is slow or failing.
 """
-from typing import AsyncIterator, Dict, List
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import logging
 
-from groq import AsyncGroq
-
 from app.config import settings
+from app.services import metrics
+from app.services.llm_router import Completion, get_llm_router
+from app.utils.prompt_builder import Persona, build_context_prompt, build_persona_prompt
+from app.utils.token_counter import count_tokens
 
 logger = logging.getLogger(__name__)
 
-_SYSTEM_TEMPLATE = """You are a customer-support assistant for a specific business. 
-You must ONLY answer questions using the information provided in the Context section below.
+# Static instructions – byte-identical on every request so the provider can
+# cache the prompt prefix. Per-query context is sent last, just before the
+# user's message, and never interpolated here.
+_SYSTEM_INSTRUCTIONS = """You are a customer-support assistant for a specific business.
+You must ONLY answer questions using the information provided in the <context> block that accompanies the user's latest message.
 
 STRICT RULES:
 - ONLY use information from the Context to answer questions.
@@ -23,43 +31,112 @@ STRICT RULES:
 - Be warm, professional, and helpful for business-related queries.
 - Keep answers concise but complete.
 - If users greet you, greet back and ask how you can help with the business services.
-- If users seem frustrated, be empathetic and offer to connect them with a human agent.
+- If users seem frustrated, be empathetic and offer to connect them with a human agent."""
+
+# fallback reply on LLM errors; never stored as a conversation turn
+TECHNICAL_ISSUE = "\n😞 Oops! I ran into a technical issue. Please try again in a moment."
+_NO_CONTEXT = "No context available. You must tell the user you can only answer questions about this business."
+
+
+_SUMMARY_TEMPLATE = "Summary of the earlier conversation with this customer:\n{summary}"
+
+
+@lru_cache(maxsize=1024)
+def _prompt_prefix(persona: Persona) -> Tuple[Dict[str, str], ...]:
+    """Stable prompt prefix (instructions + tenant persona), compiled once per chatbot persona."""
+    prefix = [{"role": "system", "content": _SYSTEM_INSTRUCTIONS}]
+    if persona != Persona():
+        prefix.append({"role": "system", "content": build_persona_prompt(persona)})
+    return tuple(prefix)
+
 
-Context:
-{context}"""
+def _recent_turns(history: List[Dict[str, str]], budget: int) -> List[Dict[str, str]]:
+    """Newest user/assistant turns that fit in *budget* tokens (always at least one)."""
+    kept: List[Dict[str, str]] = []
+    used = 0
+    for turn in reversed(history):
+        if turn.get("role") not in ("user", "assistant"):
+            continue
+        used += count_tokens(turn["content"])
+        if kept and used > budget:
+            break
+        kept.append({"role": turn["role"], "content": turn["content"]})
+    kept.reverse()
+    return kept
 
 
 class AIEngine:
 
     def __init__(self):
-        self.client = AsyncGroq(api_key=settings.GROQ_API_KEY)
+        self.router = get_llm_router()
+
+    @staticmethod
+    def build_messages(
+        message: str,
+        context: str,
+        history: List[Dict[str, str]],
+        persona: Optional[Persona] = None,
+        summary: str = "",
+    ) -> List[Dict[str, str]]:
+        """
+        Layout: static instructions → tenant persona → conversation summary
+        → recent history turns → retrieved context → current message.
+        Everything before the context is stable across a conversation, so
+        provider prompt caching applies. History is cut by token budget
+        rather than turn count; older turns live on in the summary.
+        """
+        messages = list(_prompt_prefix(persona or Persona()))
+        if summary:
+            messages.append({"role": "system", "content": _SUMMARY_TEMPLATE.format(summary=summary)})
+        messages += _recent_turns(history, settings.SUMMARY_TRIGGER_TOKENS)
+        messages.append({"role": "system", "content": build_context_prompt(context or _NO_CONTEXT)})
+        messages.append({"role": "user", "content": message})
+        return messages
+
+    def _prepare(
+        self,
+        message: str,
+        context: str,
+        history: List[Dict[str, str]],
+        persona: Optional[Persona],
+        summary: str,
+    ) -> List[Dict[str, str]]:
+        with metrics.span("prompt"):
+            messages = self.build_messages(message, context, history, persona, summary)
+        if metrics.current_trace() is not None:
+            metrics.record_tokens("prompt", sum(count_tokens(m["content"]) for m in messages))
+        return messages
 
     async def stream(
         self,
         message: str,
         context: str,
         history: List[Dict[str, str]],
+        persona: Optional[Persona] = None,
+        summary: str = "",
+        max_tokens: int = settings.MAX_TOKENS,
     ) -> AsyncIterator[str]:
-        system_prompt = _SYSTEM_TEMPLATE.format(context=context or "No context available. You must tell the user you can only answer questions about this business.")
-
-        # Build messages: system + last 6 history turns + current message
-        messages = [{"role": "system", "content": system_prompt}]
-        for turn in history[-6:]:
-            if turn.get("role") in ("user", "assistant"):
-                messages.append({"role": turn["role"], "content": turn["content"]})
-        messages.append({"role": "user", "content": message})
-
+        messages = self._prepare(message, context, history, persona, summary)
         try:
-            stream = await self.client.chat.completions.create(
-                model=settings.GROQ_MODEL,
-                messages=messages,  # type: ignore[arg-type]
-                max_tokens=settings.MAX_TOKENS,
-                stream=True,
-            )
-            async for chunk in stream:
-                delta = chunk.choices[0].delta.content
-                if delta:
-                    yield delta
+            async for delta in self.router.stream(messages, max_tokens=max_tokens):
+                yield delta
         except Exception as exc:
             logger.exception("Groq API error")
-            yield f"\n😞 Oops! I ran into a technical issue. Please try again in a moment."
+            yield TECHNICAL_ISSUE
+
+    async def complete(
+        self,
+        message: str,
+        context: str,
+        history: List[Dict[str, str]],
+        persona: Optional[Persona] = None,
+        summary: str = "",
+        max_tokens: int = settings.MAX_TOKENS,
+    ) -> Completion:
+        """Whole reply in a single non-streaming call (Telegram, n8n)."""
+        messages = self._prepare(message, context, history, persona, summary)
+        try:
+            return await self.router.complete(messages, max_tokens=max_tokens)
+        except Exception:
+            logger.exception("Groq API error")
+            return Completion(text=TECHNICAL_ISSUE)
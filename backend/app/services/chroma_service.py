@@ -1,23 +1,58 @@
 """
 ChromaDB Service – manages collections per chatbot.
-Each chatbot gets its own ChromaDB collection named `bot_{chatbot_id}`.
+Each chatbot gets its own ChromaDB collection named `bot_{chatbot_id}`,
+whose metadata records the embedding model its vectors were built with.
+
+The model is cached per chatbot for MODEL_CACHE_TTL seconds, and every
+query passing the model its vector was embedded with is checked against
+the collection it actually hits; a mismatch (the collection was swapped
+for a re-embedded one, see scripts/reembed-collections.py) raises
+EmbeddingModelChanged so the caller can re-embed. Reads never create a
+collection, so a swap in progress can't be pre-empted by an empty one.
 """
-from typing import List, Dict, Union
+from dataclasses import dataclass, field
+from typing import Any, List, Dict, Optional, Tuple, Union
+import asyncio
+import time
 import chromadb
 from chromadb.config import Settings as ChromaSettings
+from chromadb.errors import InvalidCollectionException, NotFoundError
 import logging
 
 from app.config import settings
+from app.services.embedding_service import collection_model
+from app.services.metrics import record_retrieved
 
 logger = logging.getLogger(__name__)
 
 # Metadata values must be scalar types supported by ChromaDB
 _MetadataValue = Union[str, int, float, bool, None]
 
+MODEL_CACHE_TTL = 60.0   # seconds a collection's embedding model is trusted without a re-check
+
+
+class EmbeddingModelChanged(Exception):
+    """The collection is now embedded with *model*; re-embed the query and retry."""
+
+    def __init__(self, chatbot_id: str, model: str):
+        super().__init__(f"collection of chatbot {chatbot_id} is embedded with {model}")
+        self.chatbot_id = chatbot_id
+        self.model = model
+
+
+@dataclass
+class RetrievedChunk:
+    id: str
+    text: str
+    score: float                      # cosine similarity, 1.0 = identical
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
 
 class ChromaService:
     def __init__(self):
         self._client: chromadb.HttpClient | None = None  # type: ignore[type-arg]
+        # chatbot_id -> (embedding model of its collection, re-check after)
+        self._models: Dict[str, Tuple[str, float]] = {}
 
     def _get_client(self) -> chromadb.HttpClient:  # type: ignore[type-arg]
         if self._client is None:
@@ -32,23 +67,74 @@ class ChromaService:
         return f"bot_{chatbot_id.replace('-', '_')}"
 
     def _get_or_create_collection(self, chatbot_id: str):
+        # metadata only applies when the collection is created
         return self._get_client().get_or_create_collection(
             name=self._collection_name(chatbot_id),
-            metadata={"hnsw:space": "cosine"},
+            metadata={"hnsw:space": "cosine", "embedding_model": collection_model()},
         )
 
+    def _get_collection(self, chatbot_id: str):
+        """The chatbot's collection, or None if it has none (yet)."""
+        try:
+            return self._get_client().get_collection(self._collection_name(chatbot_id))
+        except (ValueError, InvalidCollectionException, NotFoundError):
+            return None
+
+    async def embedding_model(self, chatbot_id: str) -> str:
+        """
+        Model the chatbot's collection was embedded with. Collections created
+        before this was recorded were built with EMBEDDING_MODEL; a chatbot
+        without a collection gets the model new collections are created with.
+        """
+        cached = self._models.get(chatbot_id)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        try:
+            collection = await asyncio.to_thread(self._get_collection, chatbot_id)
+        except Exception as exc:
+            logger.warning("ChromaDB metadata lookup failed: %s", exc)
+            return cached[0] if cached is not None else settings.EMBEDDING_MODEL
+        if collection is None:
+            return collection_model()
+        return self._remember_model(chatbot_id, collection)
+
+    def _remember_model(self, chatbot_id: str, collection: Any) -> str:
+        model = str((collection.metadata or {}).get("embedding_model") or settings.EMBEDDING_MODEL)
+        self._models[chatbot_id] = (model, time.monotonic() + MODEL_CACHE_TTL)
+        return model
+
+    def set_embedding_model(self, chatbot_id: str, model: str) -> None:
+        """Record *model* on the collection (after a re-embed)."""
+        collection = self._get_or_create_collection(chatbot_id)
+        metadata = {
+            k: v for k, v in (collection.metadata or {}).items() if not k.startswith("hnsw:")
+        }
+        metadata["embedding_model"] = model
+        collection.modify(metadata=metadata)  # hnsw settings live on the index, not here
+        self._models[chatbot_id] = (model, time.monotonic() + MODEL_CACHE_TTL)
+
     async def add_chunks(
         self,
         chatbot_id: str,
         document_id: str,
         chunks: List[str],
         embeddings: List[List[float]],
+        start_index: int = 0,
+        source_urls: Optional[List[str]] = None,
     ) -> None:
+        """
+        Upsert *chunks* as `{document_id}_{i}`. *start_index* lets streaming
+        callers append batches; *source_urls* is stored per chunk as metadata.
+        """
         collection = self._get_or_create_collection(chatbot_id)
-        ids = [f"{document_id}_{i}" for i in range(len(chunks))]
+        indexes = range(start_index, start_index + len(chunks))
+        ids = [f"{document_id}_{i}" for i in indexes]
         metadatas: List[Dict[str, _MetadataValue]] = [
-            {"document_id": document_id, "chunk_index": i} for i in range(len(chunks))
+            {"document_id": document_id, "chunk_index": i} for i in indexes
         ]
+        if source_urls is not None:
+            for meta, source_url in zip(metadatas, source_urls):
+                meta["source_url"] = source_url
         collection.upsert(
             ids=ids,
             documents=chunks,
@@ -61,21 +147,89 @@ class ChromaService:
         chatbot_id: str,
         query_embedding: List[float],
         n_results: int = 5,
+        model: Optional[str] = None,
     ) -> List[str]:
+        """
+        Top chunks for *query_embedding*. With *model* (what the query was
+        embedded with) raises EmbeddingModelChanged if the collection is no
+        longer on it.
+        """
         try:
-            collection = self._get_or_create_collection(chatbot_id)
-            result = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                include=["documents"],  # type: ignore[list-item]
+            result = await asyncio.to_thread(
+                self._query, chatbot_id, [query_embedding], n_results, ["documents"], model
             )
             raw_docs = result.get("documents") or [[]]
             docs = raw_docs[0] if raw_docs else []
+            raw_ids = result.get("ids") or [[]]
+            record_retrieved([str(i) for i in (raw_ids[0] if raw_ids else [])])
             return [str(d) for d in docs if d]
+        except EmbeddingModelChanged:
+            raise
         except Exception as exc:
             logger.warning("ChromaDB query failed: %s", exc)
             return []
 
+    async def query_batch(
+        self,
+        chatbot_id: str,
+        query_embeddings: List[List[float]],
+        n_results: int = 5,
+        model: Optional[str] = None,
+    ) -> List[List[RetrievedChunk]]:
+        """
+        Ranked chunks (with scores and metadata) for several query vectors in
+        one Chroma call. Runs in a worker thread so searches can overlap.
+        *model* is checked as in query().
+        """
+        if not query_embeddings:
+            return []
+        result = await asyncio.to_thread(
+            self._query,
+            chatbot_id,
+            query_embeddings,
+            n_results,
+            ["documents", "metadatas", "distances"],
+            model,
+        )
+        ids = result.get("ids") or []
+        docs = result.get("documents") or []
+        metas = result.get("metadatas") or []
+        dists = result.get("distances") or []
+        ranked: List[List[RetrievedChunk]] = []
+        for i in range(len(query_embeddings)):
+            row_ids = ids[i] if i < len(ids) else []
+            ranked.append([
+                RetrievedChunk(
+                    id=chunk_id,
+                    text=str(docs[i][j]) if docs else "",
+                    score=round(1.0 - float(dists[i][j]), 4) if dists else 0.0,
+                    metadata=dict(metas[i][j] or {}) if metas else {},
+                )
+                for j, chunk_id in enumerate(row_ids)
+            ])
+        return ranked
+
+    def _query(
+        self,
+        chatbot_id: str,
+        query_embeddings: List[List[float]],
+        n_results: int,
+        include: List[str],
+        model: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        collection = self._get_collection(chatbot_id)
+        if collection is None:
+            return {}
+        if model is not None:
+            current = self._remember_model(chatbot_id, collection)
+            if current != model:
+                raise EmbeddingModelChanged(chatbot_id, current)
+        return collection.query(  # type: ignore[return-value]
+            query_embeddings=query_embeddings,  # type: ignore[arg-type]
+            n_results=n_results,
+            include=include,  # type: ignore[arg-type]
+        )
+
     async def delete_document(self, chatbot_id: str, document_id: str) -> None:
         try:
             collection = self._get_or_create_collection(chatbot_id)
@@ -85,7 +239,7 @@ class ChromaService:
 
     async def count_chunks(self, chatbot_id: str) -> int:
         try:
-            collection = self._get_or_create_collection(chatbot_id)
-            return collection.count()
+            collection = self._get_collection(chatbot_id)
+            return collection.count() if collection is not None else 0
         except Exception:
             return 0
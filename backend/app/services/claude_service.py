@@ -5,9 +5,8 @@ Uses llama-3.3-70b-versatile on Groq LPU hardware (fastest free inference).
 from typing import AsyncIterator, Dict, List
 import logging
 
-from groq import AsyncGroq
-
 from app.config import settings
+from app.services.llm_gateway import Priority, get_llm_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +23,7 @@ class AIEngineCompat:
     """Compatibility alias – use ai_engine.AIEngine for new code."""
 
     def __init__(self):
-        self.client = AsyncGroq(api_key=settings.GROQ_API_KEY)
+        self.gateway = get_llm_gateway()
 
     async def stream(
         self,
@@ -42,16 +41,10 @@ class AIEngineCompat:
         messages.append({"role": "user", "content": message})
 
         try:
-            stream = await self.client.chat.completions.create(
-                model=settings.GROQ_MODEL,
-                messages=messages,  # type: ignore[arg-type]
-                max_tokens=settings.MAX_TOKENS,
-                stream=True,
-            )
-            async for chunk in stream:
-                delta = chunk.choices[0].delta.content
-                if delta:
-                    yield delta
+            async for delta in self.gateway.stream(
+                messages, max_tokens=settings.MAX_TOKENS, priority=Priority.INTERACTIVE
+            ):
+                yield delta
         except Exception as exc:
             logger.exception("Groq API error")
             yield f"\n[Error: {exc}]"
@@ -0,0 +1,259 @@
+"""
+Document Status – coalesced "Document" status writes and live ingestion progress.
+
+Ingestion reports every transition and progress tick here instead of
+writing to Postgres itself. Updates are kept per document (last write wins)
+and a background task flushes whatever is pending every DOC_STATUS_FLUSH_MS
+as one `UPDATE "Document" … FROM (VALUES …)` statement, so a crawl that
+reports after each upserted batch costs one row in the next flush rather
+than a transaction per batch. DONE / FAILED are flushed straight away so
+the dashboard never waits on the interval for the final state. Flushes are
+serialized, so an older state can never land after a newer one.
+
+Each update is also published as a progress event on the Redis channel
+`ingest:progress:{document_id}`, with the latest event kept under a key
+for subscribers that join late; GET /ingest/progress/{document_id} relays
+them as SSE so the dashboard doesn't poll Postgres. If Redis is down the
+events are delivered to subscribers in this process only.
+"""
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+import sqlalchemy as sa
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import settings
+from app.database import engine as default_engine
+from app.services.nl2sql_cache import get_nl2sql_cache
+from app.services.redis_client import shared_redis
+
+logger = logging.getLogger(__name__)
+
+TERMINAL = frozenset({"DONE", "FAILED"})
+
+# asyncpg caps a statement at 32767 bind parameters; each row binds three
+_MAX_ROWS = 32767 // 3
+_LOCAL_STATES = 1000   # latest states kept in-process when Redis is down
+
+
+@dataclass
+class DocProgress:
+    document_id: str
+    status: str          # "DocStatus": PENDING | PROCESSING | DONE | FAILED
+    chunks: int = 0
+    pages: int = 0
+
+    @property
+    def terminal(self) -> bool:
+        return self.status in TERMINAL
+
+
+class DocumentStatusService:
+    def __init__(
+        self,
+        redis_url: str = settings.REDIS_URL,
+        flush_interval: float = settings.DOC_STATUS_FLUSH_MS / 1000,
+        progress_ttl: int = settings.DOC_PROGRESS_TTL_SECONDS,
+        engine: Optional[AsyncEngine] = None,
+    ):
+        self.flush_interval = flush_interval
+        self.progress_ttl = progress_ttl
+        self.engine = engine or default_engine
+        self._redis = shared_redis(redis_url)
+        self._pending: Dict[str, DocProgress] = {}
+        self._flush_lock = asyncio.Lock()
+        self._dirty = asyncio.Event()
+        self._stopping = False
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._local_subs: Dict[str, Set["asyncio.Queue[DocProgress]"]] = {}
+        self._local_last: "OrderedDict[str, DocProgress]" = OrderedDict()
+
+    # ── Writers ────────────────────────────────────────────────────────────
+
+    async def update(self, document_id: str, status: str, chunks: int = 0, pages: int = 0) -> None:
+        """Record a transition or progress tick; only DONE / FAILED wait for the write."""
+        state = DocProgress(document_id, status, chunks, pages)
+        self._pending[document_id] = state
+        await self._publish(state)
+        if state.terminal:
+            await self.flush()
+        else:
+            self._dirty.set()
+
+    async def flush(self) -> int:
+        """Write every pending state in one statement; returns the number of rows written."""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = list(self._pending.values()), {}
+            try:
+                for start in range(0, len(batch), _MAX_ROWS):
+                    await self._write(batch[start : start + _MAX_ROWS])
+            except asyncio.CancelledError:
+                self._requeue(batch)
+                raise
+            except Exception:
+                logger.exception("Failed to write status for %d documents; will retry", len(batch))
+                self._requeue(batch)
+                return 0
+        get_nl2sql_cache().invalidate("Document")
+        logger.info(
+            "Document status: %s",
+            ", ".join(f"{s.document_id} → {s.status} (chunks={s.chunks})" for s in batch),
+        )
+        return len(batch)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        while not self._stopping:
+            await self._dirty.wait()
+            await asyncio.sleep(self.flush_interval)
+            self._dirty.clear()
+            await self.flush()
+
+    async def close(self) -> None:
+        """Stop the flush loop and write what is pending."""
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        await self.flush()
+
+    # ── Progress channel ───────────────────────────────────────────────────
+
+    async def subscribe(
+        self, document_id: str, heartbeat: float = settings.SSE_HEARTBEAT_SECONDS
+    ) -> AsyncIterator[Optional[DocProgress]]:
+        """
+        Yield the document's current state, then each update until DONE / FAILED.
+        None is yielded after *heartbeat* idle seconds so callers can keep the
+        connection alive. Unknown documents yield nothing.
+        """
+        r = self._redis.available()
+        if r is not None:
+            try:
+                async with r.pubsub() as pubsub:
+                    await pubsub.subscribe(self._channel(document_id))
+                    raw = await r.get(self._state_key(document_id))
+                    state = _decode(raw) if raw else await self._load(document_id)
+                    if state is None:
+                        return
+                    yield state
+                    while not state.terminal:
+                        message = await pubsub.get_message(
+                            ignore_subscribe_messages=True, timeout=heartbeat
+                        )
+                        if message is None:
+                            yield None
+                            continue
+                        state = _decode(message["data"])
+                        yield state
+                return
+            except (RedisError, OSError) as exc:
+                self._redis.mark_down("Document status", exc, "progress stays in-process")
+                return  # the client reconnects and lands on the in-process channel
+
+        queue: "asyncio.Queue[DocProgress]" = asyncio.Queue()
+        self._local_subs.setdefault(document_id, set()).add(queue)
+        try:
+            state = self._local_last.get(document_id) or await self._load(document_id)
+            if state is None:
+                return
+            yield state
+            while not state.terminal:
+                try:
+                    state = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield state
+        finally:
+            subs = self._local_subs.get(document_id)
+            if subs is not None:
+                subs.discard(queue)
+                if not subs:
+                    del self._local_subs[document_id]
+
+    # ── Internals ──────────────────────────────────────────────────────────
+
+    async def _write(self, batch: List[DocProgress]) -> None:
+        rows, params = [], {}
+        for i, state in enumerate(batch):
+            rows.append(f"(:id_{i}, :status_{i}, CAST(:chunks_{i} AS integer))")
+            params.update({f"id_{i}": state.document_id, f"status_{i}": state.status, f"chunks_{i}": state.chunks})
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                sa.text(
+                    'UPDATE "Document" AS d SET status = CAST(v.status AS "DocStatus"), '
+                    '"chunkCount" = v.chunk_count, "updatedAt" = now() '
+                    f'FROM (VALUES {", ".join(rows)}) AS v(id, status, chunk_count) '
+                    "WHERE d.id = v.id"
+                ),
+                params,
+            )
+
+    def _requeue(self, batch: List[DocProgress]) -> None:
+        for state in batch:
+            self._pending.setdefault(state.document_id, state)  # newer updates win
+        self._dirty.set()
+
+    async def _load(self, document_id: str) -> Optional[DocProgress]:
+        """Current state from Postgres, for subscribers that join before any event."""
+        pending = self._pending.get(document_id)
+        if pending is not None:
+            return pending
+        async with self.engine.connect() as conn:
+            row = (await conn.execute(
+                sa.text('SELECT status, "chunkCount" FROM "Document" WHERE id = :id'),
+                {"id": document_id},
+            )).first()
+        return None if row is None else DocProgress(document_id, str(row[0]), row[1])
+
+    async def _publish(self, state: DocProgress) -> None:
+        r = self._redis.available()
+        if r is not None:
+            payload = json.dumps(asdict(state))
+            try:
+                async with r.pipeline(transaction=False) as pipe:
+                    pipe.set(self._state_key(state.document_id), payload, ex=self.progress_ttl)
+                    pipe.publish(self._channel(state.document_id), payload)
+                    await pipe.execute()
+            except (RedisError, OSError) as exc:
+                self._redis.mark_down("Document status", exc, "progress stays in-process")
+
+        self._local_last[state.document_id] = state
+        self._local_last.move_to_end(state.document_id)
+        while len(self._local_last) > _LOCAL_STATES:
+            self._local_last.popitem(last=False)
+        for queue in self._local_subs.get(state.document_id, ()):
+            queue.put_nowait(state)
+
+    @staticmethod
+    def _channel(document_id: str) -> str:
+        return f"ingest:progress:{document_id}"
+
+    @staticmethod
+    def _state_key(document_id: str) -> str:
+        return f"ingest:progress:{document_id}:last"
+
+
+def _decode(raw: str) -> DocProgress:
+    return DocProgress(**json.loads(raw))
+
+
+_doc_status_service: Optional[DocumentStatusService] = None
+
+
+def get_doc_status_service() -> DocumentStatusService:
+    global _doc_status_service
+    if _doc_status_service is None:
+        _doc_status_service = DocumentStatusService()
+    return _doc_status_service
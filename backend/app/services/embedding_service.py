@@ -1,8 +1,10 @@
 """
 Embedding Service – generates dense embeddings using sentence-transformers.
-The model is loaded once at startup and reused for all requests.
+Models are loaded once on first use and reused for all requests. Each
+Chroma collection records the model it was embedded with, so callers pass
+that model name; new collections use collection_model().
 """
-from typing import List
+from typing import Dict, List, Optional
 import asyncio
 import logging
 
@@ -13,29 +15,43 @@ from app.config import settings
 logger = logging.getLogger(__name__)
 
 
-class EmbeddingService:
-    _model: SentenceTransformer | None = None
+def collection_model() -> str:
+    """Embedding model for newly created collections (see EMBEDDING_MODE)."""
+    if settings.EMBEDDING_MODE == "multilingual":
+        return settings.MULTILINGUAL_EMBEDDING_MODEL
+    return settings.EMBEDDING_MODEL
+
 
-    def _get_model(self) -> SentenceTransformer:
-        if self._model is None:
-            logger.info("Loading embedding model: %s …", settings.EMBEDDING_MODEL)
-            EmbeddingService._model = SentenceTransformer(settings.EMBEDDING_MODEL)
+class EmbeddingService:
+    _models: Dict[str, SentenceTransformer] = {}
+
+    def _get_model(self, name: Optional[str] = None) -> SentenceTransformer:
+        name = name or settings.EMBEDDING_MODEL
+        model = EmbeddingService._models.get(name)
+        if model is None:
+            logger.info("Loading embedding model: %s …", name)
+            model = EmbeddingService._models[name] = SentenceTransformer(name)
             logger.info("Embedding model loaded.")
-        assert EmbeddingService._model is not None
-        return EmbeddingService._model
+        return model
 
-    async def embed_text(self, text: str) -> List[float]:
+    async def embed_text(self, text: str, model: Optional[str] = None) -> List[float]:
         loop = asyncio.get_event_loop()
-        model = self._get_model()
+        encoder = self._get_model(model)
         result: List[float] = await loop.run_in_executor(
-            None, lambda: model.encode(text, convert_to_numpy=True).tolist()  # type: ignore[union-attr]
+            None, lambda: encoder.encode(text, convert_to_numpy=True).tolist()  # type: ignore[union-attr]
         )
         return result
 
-    async def embed_chunks(self, chunks: List[str]) -> List[List[float]]:
+    async def embed_chunks(self, chunks: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """Embed many texts in one batched encode() pass (chunks or queries)."""
+        if not chunks:
+            return []
         loop = asyncio.get_event_loop()
-        model = self._get_model()
+        encoder = self._get_model(model)
         result: List[List[float]] = await loop.run_in_executor(
-            None, lambda: [model.encode(c, convert_to_numpy=True).tolist() for c in chunks]  # type: ignore[union-attr]
+            None,
+            lambda: encoder.encode(  # type: ignore[union-attr]
+                chunks, batch_size=settings.EMBED_BATCH_SIZE, convert_to_numpy=True
+            ).tolist(),
         )
         return result
@@ -0,0 +1,64 @@
+"""
+HTTP Clients – application-scoped, pooled httpx clients.
+
+One client per named profile is created lazily and shared for the life of
+the process, so the scraper, the Telegram bridge and startup checks reuse
+keep-alive connections (and TLS sessions) instead of opening a fresh
+client per call. main.lifespan closes them all on shutdown.
+"""
+from typing import Any, Dict
+import importlib.util
+import logging
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 needs the optional `h2` package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=30.0,
+)
+_TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+
+
+class HTTPClientRegistry:
+    """
+    Usage::
+
+        client = http_clients.get("scraper", headers=..., follow_redirects=True)
+        resp = await client.get(url)
+
+    Keyword arguments only apply when the named client is first created.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def get(self, name: str = "default", **kwargs: Any) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            options: Dict[str, Any] = {
+                "limits": _LIMITS,
+                "timeout": _TIMEOUT,
+                "http2": HTTP2_AVAILABLE,
+            }
+            options.update(kwargs)
+            client = httpx.AsyncClient(**options)
+            self._clients[name] = client
+            logger.debug("Created pooled HTTP client '%s' (http2=%s)", name, options["http2"])
+        return client
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        for name, client in clients.items():
+            try:
+                await client.aclose()
+            except Exception:
+                logger.exception("Error closing HTTP client '%s'", name)
+
+
+http_clients = HTTPClientRegistry()
@@ -0,0 +1,195 @@
+"""
+Ingest Pipeline – streams a website crawl straight into ChromaDB.
+
+    fetch → extract → split → embed → upsert
+
+Each stage runs as its own task connected by bounded queues, so chunks
+become searchable while the crawl is still running and a slow stage
+(usually embedding) applies back-pressure instead of buffering the site.
+An optional *on_progress* callback is awaited after every upserted batch.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from app.config import settings
+from app.services.chroma_service import ChromaService
+from app.services.embedding_service import EmbeddingService
+from app.services.url_scraper import CrawlReport, CrawledPage, URLScraper, MAX_JS_RENDERS
+from app.utils.simhash import DedupStats, SimHashIndex
+from app.utils.text_splitter import TextSplitter
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE  = 8    # max items waiting between two stages
+EMBED_BATCH = 32   # max chunks per embedding / upsert call
+
+_DONE = object()   # end-of-stream sentinel passed down every queue
+
+ProgressCallback = Callable[["PipelineResult"], Awaitable[None]]
+
+
+@dataclass
+class PipelineResult:
+    pages:  int = 0
+    chunks: int = 0
+    dedup:  DedupStats  = field(default_factory=DedupStats)
+    report: CrawlReport = field(default_factory=CrawlReport)
+
+
+class URLIngestPipeline:
+    """
+    Usage::
+
+        pipeline = URLIngestPipeline(scraper, embedding_service, chroma_service)
+        result = await pipeline.run(chatbot_id, document_id, url, max_pages=50)
+    """
+
+    def __init__(
+        self,
+        scraper: URLScraper,
+        embedding_svc: EmbeddingService,
+        chroma_svc: ChromaService,
+        splitter: Optional[TextSplitter] = None,
+    ):
+        self.scraper = scraper
+        self.embedding_svc = embedding_svc
+        self.chroma_svc = chroma_svc
+        self.splitter = splitter or TextSplitter()
+
+    async def run(
+        self,
+        chatbot_id: str,
+        document_id: str,
+        url: str,
+        max_pages: int = 50,
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> PipelineResult:
+        result = PipelineResult()
+        model = await self.chroma_svc.embedding_model(chatbot_id)
+        pages_q: asyncio.Queue[Any] = asyncio.Queue(QUEUE_SIZE)
+        texts_q: asyncio.Queue[Any] = asyncio.Queue(QUEUE_SIZE)
+        chunks_q: asyncio.Queue[Any] = asyncio.Queue(QUEUE_SIZE * EMBED_BATCH)
+        vectors_q: asyncio.Queue[Any] = asyncio.Queue(QUEUE_SIZE)
+
+        tasks = [
+            asyncio.create_task(self._fetch(url, max_pages, result, pages_q)),
+            asyncio.create_task(self._extract(result, pages_q, texts_q)),
+            asyncio.create_task(self._split(result, texts_q, chunks_q)),
+            asyncio.create_task(self._embed(model, chunks_q, vectors_q)),
+            asyncio.create_task(
+                self._upsert(chatbot_id, document_id, result, vectors_q, on_progress)
+            ),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        return result
+
+    # ── Stages ──────────────────────────────────────────────────────────────
+
+    async def _fetch(
+        self,
+        url: str,
+        max_pages: int,
+        result: PipelineResult,
+        out: asyncio.Queue[Any],
+    ) -> None:
+        async for page in self.scraper.iter_pages(url, max_pages, result.report):
+            await out.put(page)
+        await out.put(_DONE)
+
+    async def _extract(
+        self,
+        result: PipelineResult,
+        inp: asyncio.Queue[Any],
+        out: asyncio.Queue[Any],
+    ) -> None:
+        """Pass static text through; render JS-dependent pages with Playwright."""
+        while (page := await inp.get()) is not _DONE:
+            assert isinstance(page, CrawledPage)
+            if page.text:
+                result.pages += 1
+                await out.put((page.url, page.text))
+            if page.needs_js and result.report.js_rendered < MAX_JS_RENDERS:
+                js_text = await self.scraper.render_js_page(page.url, result.report)
+                if js_text:
+                    await out.put((page.url, js_text))
+        await out.put(_DONE)
+
+    async def _split(
+        self,
+        result: PipelineResult,
+        inp: asyncio.Queue[Any],
+        out: asyncio.Queue[Any],
+    ) -> None:
+        """Split each page and drop chunks that are near-duplicates of earlier ones."""
+        index = SimHashIndex(settings.NEAR_DUPLICATE_THRESHOLD)
+        while (item := await inp.get()) is not _DONE:
+            source_url, text = item
+            for chunk in self.splitter.split(text):
+                if index.add_if_new(chunk):
+                    await out.put((chunk, source_url))
+                else:
+                    result.dedup.dropped += 1
+                    result.dedup.chars_dropped += len(chunk)
+        await out.put(_DONE)
+
+    async def _embed(
+        self,
+        model: str,
+        inp: asyncio.Queue[Any],
+        out: asyncio.Queue[Any],
+    ) -> None:
+        """Embed whatever is waiting (up to EMBED_BATCH) in one model call."""
+        done = False
+        while not done:
+            batch: List[Tuple[str, str]] = []
+            item = await inp.get()
+            while item is not _DONE:
+                batch.append(item)
+                if len(batch) >= EMBED_BATCH or inp.empty():
+                    break
+                item = inp.get_nowait()
+            done = item is _DONE
+
+            if batch:
+                chunks = [c for c, _ in batch]
+                embeddings = await self.embedding_svc.embed_chunks(chunks, model=model)
+                await out.put((chunks, [u for _, u in batch], embeddings))
+        await out.put(_DONE)
+
+    async def _upsert(
+        self,
+        chatbot_id: str,
+        document_id: str,
+        result: PipelineResult,
+        inp: asyncio.Queue[Any],
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> None:
+        while (item := await inp.get()) is not _DONE:
+            chunks, source_urls, embeddings = item
+            await self.chroma_svc.add_chunks(
+                chatbot_id=chatbot_id,
+                document_id=document_id,
+                chunks=chunks,
+                embeddings=embeddings,
+                start_index=result.chunks,
+                source_urls=source_urls,
+            )
+            result.chunks += len(chunks)
+            logger.debug(
+                "Indexed %d chunks for document %s (total %d)",
+                len(chunks), document_id, result.chunks,
+            )
+            if on_progress is not None:
+                await on_progress(result)
+        result.dedup.kept = result.chunks
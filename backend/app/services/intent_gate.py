@@ -0,0 +1,146 @@
+"""
+Intent Gate – decides before retrieval whether a message needs the
+knowledge base at all.
+
+Greetings, thanks, acknowledgements and goodbyes ("hi", "thanks!", "ok")
+are answered from the conversation alone, skipping the embedding and the
+Chroma query. Two tiers:
+  1. Rules – a normalized match against small multilingual phrase lists;
+     no embedding is computed.
+  2. Nearest centroid – short messages the rules don't recognise are
+     compared (on the query embedding retrieval needs anyway) with
+     centroids of chit-chat and of real support questions; a clear
+     chit-chat winner skips the Chroma query.
+An acknowledgement that answers a question the assistant just asked
+("yes" to "Shall I book it?") is a follow-up and goes through retrieval.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.embedding_service import EmbeddingService
+
+logger = logging.getLogger(__name__)
+
+MAX_CHITCHAT_WORDS = 5    # longer messages always go through retrieval
+CENTROID_MARGIN    = 0.05  # cosine lead chit-chat needs over the question centroid
+
+_PHRASES: Dict[str, List[str]] = {
+    "greeting": [
+        "hi", "hii", "hey", "hello", "hello there", "hey there", "hi there", "yo",
+        "good morning", "good afternoon", "good evening", "greetings",
+        "hola", "bonjour", "salut", "hallo", "ciao", "namaste", "vanakkam", "olá", "ola",
+    ],
+    "thanks": [
+        "thanks", "thank you", "thanks a lot", "thank you so much", "thx", "ty",
+        "many thanks", "cheers", "great thanks", "ok thanks", "ok thank you",
+        "gracias", "merci", "danke", "grazie", "obrigado", "dhanyavad", "nandri",
+    ],
+    "ack": [
+        "ok", "okay", "k", "kk", "ok cool", "cool", "great", "nice", "perfect",
+        "got it", "sure", "alright", "fine", "yes", "yeah", "yep", "no", "nope",
+        "awesome", "sounds good", "i see", "understood",
+    ],
+    "goodbye": [
+        "bye", "goodbye", "bye bye", "see you", "see ya", "good night", "take care",
+        "adios", "au revoir", "tschüss", "ciao for now",
+    ],
+}
+_LOOKUP: Dict[str, str] = {p: kind for kind, phrases in _PHRASES.items() for p in phrases}
+
+_CHITCHAT_SEEDS = [
+    "hi", "hello there", "good morning", "how are you", "thanks a lot",
+    "thank you so much", "ok cool", "great", "bye", "see you later",
+    "you are awesome", "lol", "nice to meet you", "have a nice day",
+]
+_QUESTION_SEEDS = [
+    "what are your opening hours", "how much does it cost", "do you deliver",
+    "can I get a refund", "where are you located", "what services do you offer",
+    "how do I book an appointment", "is this in stock", "my order has not arrived",
+    "do you have parking", "price list", "contact number",
+]
+
+_NON_WORD = re.compile(r"[^\w\s']+", re.UNICODE)
+
+# Sent in place of retrieved context for chit-chat turns
+CHITCHAT_CONTEXT = (
+    "No documents are needed for this message: it is a conversational turn "
+    "(greeting, thanks, acknowledgement or goodbye). Reply briefly and warmly "
+    "in the user's language and offer help with the business's services."
+)
+
+
+@dataclass
+class GateDecision:
+    retrieve: bool
+    kind: str = "question"   # greeting | thanks | ack | goodbye | smalltalk | short | question
+    by: str = "rules"        # rules | centroid
+
+    @property
+    def ambiguous(self) -> bool:
+        """Retrieval is planned but the message is short enough to re-check on its embedding."""
+        return self.retrieve and self.kind == "short"
+
+
+def _normalize(text: str) -> str:
+    text = _NON_WORD.sub(" ", text.lower())
+    return " ".join(text.split())
+
+
+class IntentGate:
+    def __init__(self, embedding_svc: Optional[EmbeddingService] = None):
+        self.embedding_svc = embedding_svc or EmbeddingService()
+        self._centroids: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}  # model -> (chit-chat, question)
+
+    def classify(self, message: str, history: List[Dict[str, str]]) -> GateDecision:
+        """Rule tier – no embedding needed."""
+        if "?" in message:
+            return GateDecision(retrieve=True)
+        text = _normalize(message)
+        words = text.split()
+        if not words:
+            return GateDecision(retrieve=False, kind="smalltalk")  # emoji / punctuation only
+        if len(words) > MAX_CHITCHAT_WORDS:
+            return GateDecision(retrieve=True)
+
+        kind = _LOOKUP.get(text)
+        if kind is None:
+            return GateDecision(retrieve=True, kind="short")
+        if kind == "ack" and _assistant_asked(history):
+            return GateDecision(retrieve=True)  # answering our question – a follow-up
+        return GateDecision(retrieve=False, kind=kind)
+
+    async def is_chitchat(self, embedding: List[float], model: Optional[str] = None) -> bool:
+        """Centroid tier for short messages the rules didn't recognise."""
+        centroids = self._centroids.get(model or "")
+        if centroids is None:
+            centroids = await self._build_centroids(model)
+        chitchat, question = centroids
+        vec = _unit(np.asarray(embedding, dtype=np.float32))
+        return float(vec @ chitchat) - float(vec @ question) > CENTROID_MARGIN
+
+    async def _build_centroids(self, model: Optional[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Centroids live in the embedding space of *model*, so they are built per model."""
+        embeddings = await self.embedding_svc.embed_chunks(
+            _CHITCHAT_SEEDS + _QUESTION_SEEDS, model=model
+        )
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        split = len(_CHITCHAT_SEEDS)
+        centroids = (_unit(vectors[:split].mean(axis=0)), _unit(vectors[split:].mean(axis=0)))
+        self._centroids[model or ""] = centroids
+        logger.info("Intent gate centroids ready (model=%s)", model or "default")
+        return centroids
+
+
+def _unit(vec: np.ndarray) -> np.ndarray:
+    return vec / (float(np.linalg.norm(vec)) or 1.0)
+
+
+def _assistant_asked(history: List[Dict[str, str]]) -> bool:
+    for turn in reversed(history):
+        if turn.get("role") == "assistant":
+            return turn.get("content", "").rstrip().endswith("?")
+    return False
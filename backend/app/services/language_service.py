@@ -1,39 +1,85 @@
 """
 Language Service – detects the language of a message and optionally
 translates it to English for processing, then translates the reply back.
+
+Detection is local and deterministic (app.utils.lang_id); low-confidence
+results on short messages fall back to the language last detected for the
+session. Translation skips the Groq call when source and target match and
+keeps a bounded LRU of recent translations.
 """
 import logging
-
-from groq import AsyncGroq
-from langdetect import detect, LangDetectException  # type: ignore[import-untyped]
+from collections import OrderedDict
+from typing import Optional, Tuple
 
 from app.config import settings
+from app.services.llm_gateway import Priority, get_llm_gateway
+from app.services.session_store import get_session_store
+from app.utils.lang_id import Detection, detect
 
 logger = logging.getLogger(__name__)
 
 
 class LanguageService:
-    def __init__(self):
-        self.client = AsyncGroq(api_key=settings.GROQ_API_KEY)
-
-    def detect_language(self, text: str) -> str:
-        """Returns ISO 639-1 language code, e.g. 'en', 'fr', 'de'. Defaults to 'en'."""
-        try:
-            return detect(text)
-        except LangDetectException:
-            return "en"
-
-    async def translate(self, text: str, target_lang: str = "en") -> str:
-        """Translate *text* to *target_lang* using Groq."""
+    def __init__(
+        self,
+        min_confidence: float = settings.LANG_MIN_CONFIDENCE,
+        cache_size: int = settings.TRANSLATION_CACHE_SIZE,
+    ):
+        self.gateway = get_llm_gateway()
+        self.min_confidence = min_confidence
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+
+    def detect(self, text: str) -> Detection:
+        return detect(text)
+
+    def detect_language(self, text: str, fallback: str = "en") -> str:
+        """Returns ISO 639-1 language code, e.g. 'en', 'fr', 'de'. Defaults to *fallback*."""
+        result = detect(text)
+        return result.lang if result.confidence >= self.min_confidence else fallback
+
+    async def detect_for_session(
+        self, chatbot_id: str, session_id: str, text: str, default: str = "en"
+    ) -> str:
+        """
+        Language of *text*, falling back to the session's last confident
+        language (then *default*) when the message is too short to tell.
+        """
+        store = get_session_store()
+        result = detect(text)
+        if result.confidence >= self.min_confidence:
+            await store.set_meta(chatbot_id, session_id, language=result.lang)
+            return result.lang
+        stored = (await store.load(chatbot_id, session_id)).meta.get("language")
+        return stored or default
+
+    async def translate(
+        self, text: str, target_lang: str = "en", source_lang: Optional[str] = None
+    ) -> str:
+        """Translate *text* to *target_lang* using Groq (no-op if already in it)."""
         if not text.strip():
             return text
+        source = source_lang or self.detect_language(text, fallback="")
+        if source == target_lang:
+            return text
+
+        key = (target_lang, text)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
         prompt = (
             f"Translate the following text to {target_lang}. "
             f"Return ONLY the translated text, no explanation.\n\n{text}"
         )
-        response = await self.client.chat.completions.create(
-            model=settings.GROQ_MODEL,
+        response = await self.gateway.complete(
+            [{"role": "user", "content": prompt}],
             max_tokens=1024,
-            messages=[{"role": "user", "content": prompt}],
+            priority=Priority.BACKGROUND,
         )
-        return (response.choices[0].message.content or text).strip()
+        translated = (response.choices[0].message.content or text).strip()
+        self._cache[key] = translated
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return translated
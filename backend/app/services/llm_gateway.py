@@ -0,0 +1,282 @@
+"""
+LLM Gateway – the single entry point for every Groq call in the backend.
+
+- One pooled AsyncGroq client (keep-alive connections via http_clients).
+- Token buckets sized to the Groq quota (GROQ_RPM / GROQ_TPM) so bursts
+  queue locally instead of coming back as 429s.
+- A priority gate: interactive chat is admitted ahead of background work
+  such as translation or analytics.
+- Retries with jittered exponential back-off on 429 / 5xx / connection
+  errors, honouring the server's retry-after header.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+from groq import APIConnectionError, APIStatusError, AsyncGroq
+
+from app.config import settings
+from app.services import metrics
+from app.services.http_clients import http_clients
+from app.utils.token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+RETRY_BACKOFF   = 1.0   # base seconds for exponential back-off
+MAX_BACKOFF     = 30.0  # never sleep longer than this between attempts
+COMPLETION_GUESS = 256  # completion tokens reserved up-front, settled after the call
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # visitor-facing chat
+    BACKGROUND  = 1  # translation, analytics, summaries
+
+
+class _TokenBucket:
+    """
+    Continuously refilling bucket holding at most *capacity* tokens per
+    *period* seconds. settle() may push the level negative so actual usage
+    reported after a call is paid back before the next admission.
+    """
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = max(capacity, 1.0)
+        self.rate = self.capacity / period
+        self.level = self.capacity
+        self._stamp = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until *amount* tokens are available (0 if available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def settle(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        rpm: int = settings.GROQ_RPM,
+        tpm: int = settings.GROQ_TPM,
+        max_concurrency: int = settings.GROQ_MAX_CONCURRENCY,
+        max_retries: int = settings.GROQ_MAX_RETRIES,
+    ):
+        self._client: Optional[AsyncGroq] = None
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self._requests = _TokenBucket(rpm)
+        self._tokens = _TokenBucket(tpm)
+        self._in_flight = 0
+        self._waiters: List[Tuple[int, int, int, asyncio.Future[None]]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def client(self) -> AsyncGroq:
+        if self._client is None:
+            self._client = AsyncGroq(
+                api_key=settings.GROQ_API_KEY,
+                max_retries=0,  # retries are handled here, with rate-limit awareness
+                http_client=http_clients.get(
+                    "groq", timeout=httpx.Timeout(60.0, connect=5.0)
+                ),
+            )
+        return self._client
+
+    # ── Public API ─────────────────────────────────────────────────────────
+
+    async def complete(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        priority: Priority = Priority.INTERACTIVE,
+        model: Optional[str] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """Non-streaming chat completion; returns the Groq ChatCompletion."""
+        estimate = self._estimate(messages, max_tokens)
+        for attempt in range(self.max_retries + 1):
+            async with self._slot(priority, estimate):
+                try:
+                    response = await self.client.chat.completions.create(
+                        model=model or settings.GROQ_MODEL,
+                        messages=messages,  # type: ignore[arg-type]
+                        max_tokens=max_tokens,
+                        **kwargs,
+                    )
+                except Exception as exc:
+                    delay = self._retry_delay(exc, attempt)
+                    if delay is None:
+                        raise
+                else:
+                    usage = getattr(response, "usage", None)
+                    if usage is not None and usage.total_tokens:
+                        self._tokens.settle(usage.total_tokens - estimate)
+                    return response
+            await asyncio.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    async def stream(
+        self,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        priority: Priority = Priority.INTERACTIVE,
+        model: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream completion deltas. Failures before the first token are
+        retried; once output has been yielded the error is raised.
+        """
+        estimate = self._estimate(messages, max_tokens)
+        for attempt in range(self.max_retries + 1):
+            parts: List[str] = []
+            async with self._slot(priority, estimate):
+                try:
+                    stream = await self.client.chat.completions.create(
+                        model=model or settings.GROQ_MODEL,
+                        messages=messages,  # type: ignore[arg-type]
+                        max_tokens=max_tokens,
+                        stream=True,
+                    )
+                    try:
+                        async for chunk in stream:
+                            if not chunk.choices:
+                                continue
+                            delta = chunk.choices[0].delta.content
+                            if delta:
+                                parts.append(delta)
+                                yield delta
+                    finally:
+                        await stream.close()
+                except Exception as exc:
+                    delay = None if parts else self._retry_delay(exc, attempt)
+                    if delay is None:
+                        raise
+                else:
+                    self._tokens.settle(count_tokens("".join(parts)) - COMPLETION_GUESS)
+                    return
+            await asyncio.sleep(delay)
+
+    # ── Admission ──────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _estimate(messages: List[Dict[str, str]], max_tokens: int) -> int:
+        prompt = sum(count_tokens(m.get("content") or "") for m in messages)
+        return prompt + min(max_tokens, COMPLETION_GUESS)
+
+    @asynccontextmanager
+    async def _slot(self, priority: Priority, tokens: int) -> AsyncIterator[None]:
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future[None] = loop.create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), tokens, fut))
+        queued = time.perf_counter()
+        self._dispatch()
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release()  # admitted just as we were cancelled
+            raise
+        metrics.observe("llm_queue", time.perf_counter() - queued)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Admit waiters in priority order while slots and quota allow."""
+        while self._waiters and self._in_flight < self.max_concurrency:
+            _, _, tokens, fut = self._waiters[0]
+            if fut.done():  # cancelled while queued
+                heapq.heappop(self._waiters)
+                continue
+            wait = max(self._requests.wait_time(1), self._tokens.wait_time(tokens))
+            if wait > 0:
+                self._schedule(wait)
+                return
+            heapq.heappop(self._waiters)
+            self._requests.consume(1)
+            self._tokens.consume(tokens)
+            self._in_flight += 1
+            fut.set_result(None)
+
+    def _schedule(self, delay: float) -> None:
+        if self._timer is not None and not self._timer.cancelled():
+            self._timer.cancel()
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(delay, self._dispatch)
+
+    # ── Retries ────────────────────────────────────────────────────────────
+
+    def _retry_delay(self, exc: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying *exc*, or None if it is not retryable."""
+        if attempt >= self.max_retries:
+            return None
+        if isinstance(exc, APIStatusError):
+            status = exc.status_code
+            if status != 429 and status < 500:
+                return None
+            retry_after = _parse_retry_after(exc.response.headers)
+        elif isinstance(exc, APIConnectionError):  # includes timeouts
+            status, retry_after = 0, None
+        else:
+            return None
+
+        backoff = min(MAX_BACKOFF, RETRY_BACKOFF * 2 ** attempt)
+        delay = retry_after if retry_after is not None else backoff
+        delay = min(MAX_BACKOFF, delay + random.uniform(0, backoff / 2))
+        logger.warning(
+            "Groq call failed (%s) – retrying in %.1fs (attempt %d/%d)",
+            status or type(exc).__name__, delay, attempt + 1, self.max_retries,
+        )
+        if status == 429:
+            # the quota is exhausted for everyone – hold back all waiters too
+            self._requests.settle(self._requests.capacity * delay / 60.0)
+        return delay
+
+
+def _parse_retry_after(headers: httpx.Headers) -> Optional[float]:
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                continue
+    return None
+
+
+_gateway: Optional[LLMGateway] = None
+
+
+def get_llm_gateway() -> LLMGateway:
+    """Process-wide gateway shared by every service that talks to Groq."""
+    global _gateway
+    if _gateway is None:
+        _gateway = LLMGateway()
+    return _gateway
@@ -0,0 +1,351 @@
+"""
+LLM Router – provider-abstracted streaming with fallback and hedging.
+
+Providers are tried in order of health and measured time-to-first-token
+(TTFT). A provider that errors before producing output is put in a short
+cooldown and the next one is tried. With hedging enabled
+(LLM_HEDGE_AFTER_MS > 0), a second provider is started if the first has
+not produced a token in time; whichever answers first wins and the other
+request is cancelled. The loser's TTFT is recorded as at least the time it
+was waited on, so a provider that turned slow stops being tried first.
+
+Configured providers:
+  1. Groq GROQ_MODEL                     (primary, via the LLM gateway)
+  2. Groq LLM_FALLBACK_MODEL             (if set)
+  3. OpenAI-compatible LLM_FALLBACK_BASE_URL (if set – vLLM, Ollama, a stub …)
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from app.config import settings
+from app.services.http_clients import http_clients
+from app.services.llm_gateway import Priority, get_llm_gateway
+from app.utils.token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+FAILURE_COOLDOWN = 30.0  # seconds a failed provider is ranked last
+TTFT_ALPHA       = 0.3   # EWMA weight of the newest TTFT sample
+UNKNOWN_TTFT     = 1.0   # assumed TTFT (s) for providers with no samples yet
+
+
+# ---------------------------------------------------------------------------
+# Providers
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Completion:
+    """A whole (non-streamed) reply and its token usage."""
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class LLMProvider(ABC):
+    """Base class – subclasses stream completion deltas for *messages*."""
+
+    name: str = "provider"
+
+    @abstractmethod
+    def stream(
+        self, messages: List[Dict[str, str]], max_tokens: int
+    ) -> AsyncIterator[str]:
+        """Completion deltas as they arrive."""
+
+    async def complete(
+        self, messages: List[Dict[str, str]], max_tokens: int
+    ) -> Completion:
+        """One whole reply. The default drains stream(); usage is estimated."""
+        text = "".join([delta async for delta in self.stream(messages, max_tokens)])
+        return Completion(
+            text=text,
+            prompt_tokens=sum(count_tokens(m["content"]) for m in messages),
+            completion_tokens=count_tokens(text),
+        )
+
+
+class GroqProvider(LLMProvider):
+    def __init__(self, model: str):
+        self.name = f"groq:{model}"
+        self.model = model
+
+    def stream(
+        self, messages: List[Dict[str, str]], max_tokens: int
+    ) -> AsyncIterator[str]:
+        return get_llm_gateway().stream(
+            messages, max_tokens=max_tokens, priority=Priority.INTERACTIVE, model=self.model
+        )
+
+    async def complete(
+        self, messages: List[Dict[str, str]], max_tokens: int
+    ) -> Completion:
+        response = await get_llm_gateway().complete(
+            messages, max_tokens=max_tokens, priority=Priority.INTERACTIVE, model=self.model
+        )
+        usage = response.usage
+        return Completion(
+            text=response.choices[0].message.content or "",
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+        )
+
+
+class OpenAICompatProvider(LLMProvider):
+    """Any server speaking the OpenAI /chat/completions streaming protocol."""
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        api_key: str = "",
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.name = f"openai:{model}@{base_url}"
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.api_key = api_key
+        self._client = client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or http_clients.get(
+            f"llm:{self.base_url}", timeout=httpx.Timeout(60.0, connect=5.0)
+        )
+
+    async def stream(
+        self, messages: List[Dict[str, str]], max_tokens: int
+    ) -> AsyncIterator[str]:
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        async with self.client.stream(
+            "POST",
+            f"{self.base_url}/chat/completions",
+            json={
+                "model": self.model,
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "stream": True,
+            },
+            headers=headers,
+        ) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == "[DONE]":
+                    return
+                choices = json.loads(payload).get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+
+
+# ---------------------------------------------------------------------------
+# Router
+# ---------------------------------------------------------------------------
+
+@dataclass
+class _ProviderStats:
+    ttft_ewma:    Optional[float] = None
+    samples:      int   = 0
+    failures:     int   = 0
+    failed_at:    float = 0.0
+
+    def record_ttft(self, seconds: float) -> None:
+        self.samples += 1
+        self.ttft_ewma = (
+            seconds if self.ttft_ewma is None
+            else TTFT_ALPHA * seconds + (1 - TTFT_ALPHA) * self.ttft_ewma
+        )
+
+    def record_censored(self, seconds: float) -> None:
+        """A request cancelled after *seconds* with no token: its TTFT is at least that."""
+        self.record_ttft(seconds)
+        self.ttft_ewma = max(self.ttft_ewma or 0.0, seconds)
+
+    @property
+    def cooling_down(self) -> bool:
+        return time.monotonic() - self.failed_at < FAILURE_COOLDOWN
+
+
+class LLMRouter:
+    def __init__(self, providers: List[LLMProvider], hedge_after_ms: int = 0):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self.providers = providers
+        self.hedge_after = hedge_after_ms / 1000 if hedge_after_ms > 0 else None
+        self.stats: Dict[str, _ProviderStats] = {p.name: _ProviderStats() for p in providers}
+
+    def ranked(self) -> List[LLMProvider]:
+        """Healthy providers first, then by measured TTFT (config order breaks ties)."""
+        def key(item: tuple[int, LLMProvider]):
+            index, provider = item
+            stats = self.stats[provider.name]
+            expected = stats.ttft_ewma if stats.ttft_ewma is not None else UNKNOWN_TTFT
+            return (stats.cooling_down, expected, index)
+
+        return [p for _, p in sorted(enumerate(self.providers), key=key)]
+
+    async def stream(
+        self, messages: List[Dict[str, str]], max_tokens: int
+    ) -> AsyncIterator[str]:
+        """
+        Stream from the best available provider. Falls back to the next one
+        only if a provider fails before yielding any output.
+        """
+        candidates = self.ranked()
+        last_exc: Optional[BaseException] = None
+
+        while candidates:
+            try:
+                winner, it, token = await self._first_token(candidates, messages, max_tokens)
+            except Exception as exc:
+                last_exc = exc
+                continue
+
+            try:
+                if token is None:
+                    return
+                yield token
+                async for delta in it:
+                    yield delta
+            except Exception:
+                self._record_failure(winner)
+                raise
+            finally:
+                await _aclose(it)
+            return
+
+        raise last_exc or RuntimeError("No LLM provider available")
+
+    async def complete(
+        self, messages: List[Dict[str, str]], max_tokens: int
+    ) -> Completion:
+        """One whole reply from the best available provider, falling back on failure."""
+        last_exc: Optional[BaseException] = None
+        for provider in self.ranked():
+            try:
+                return await provider.complete(messages, max_tokens)
+            except Exception as exc:
+                logger.warning("LLM provider %s failed: %s", provider.name, exc)
+                self._record_failure(provider)
+                last_exc = exc
+        raise last_exc or RuntimeError("No LLM provider available")
+
+    async def _first_token(
+        self,
+        candidates: List[LLMProvider],
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+    ) -> tuple[LLMProvider, AsyncIterator[str], Optional[str]]:
+        """
+        Start the next candidate (and hedge with the one after it if the first
+        is slow) and return the provider that produced a first token, its
+        iterator and that token (None if it finished empty). Every provider
+        started is removed from *candidates*.
+        """
+        racers: Dict[asyncio.Task[str], tuple[LLMProvider, AsyncIterator[str], float]] = {}
+
+        def _start(provider: LLMProvider) -> None:
+            it = provider.stream(messages, max_tokens).__aiter__()
+            task = asyncio.ensure_future(it.__anext__())
+            racers[task] = (provider, it, time.monotonic())
+
+        first = candidates.pop(0)
+        _start(first)
+        if self.hedge_after and candidates:
+            done, _ = await asyncio.wait(set(racers), timeout=self.hedge_after)
+            if not done:
+                hedge = candidates.pop(0)
+                logger.info(
+                    "No first token from %s after %.0fms – hedging with %s",
+                    first.name, self.hedge_after * 1000, hedge.name,
+                )
+                _start(hedge)
+
+        last_exc: Optional[BaseException] = None
+        pending = set(racers)
+        winner: Optional[asyncio.Task[str]] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider, it, started = racers[task]
+                    try:
+                        token: Optional[str] = task.result()
+                    except StopAsyncIteration:
+                        token = None
+                    except Exception as exc:
+                        logger.warning("LLM provider %s failed: %s", provider.name, exc)
+                        self._record_failure(provider)
+                        last_exc = exc
+                        continue
+                    self.stats[provider.name].record_ttft(time.monotonic() - started)
+                    winner = task
+                    return provider, it, token
+        finally:
+            # cancel the loser(s) and close their upstream streams
+            now = time.monotonic()
+            for task, (provider, it, started) in racers.items():
+                if task is winner:
+                    continue
+                if winner is not None and not task.done():
+                    # lost the race, so a primary that turned slow stops ranking first
+                    self.stats[provider.name].record_censored(now - started)
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                await _aclose(it)
+
+        raise last_exc or RuntimeError("No LLM provider produced output")
+
+    def _record_failure(self, provider: LLMProvider) -> None:
+        stats = self.stats[provider.name]
+        stats.failures += 1
+        stats.failed_at = time.monotonic()
+
+
+async def _aclose(it: AsyncIterator[str]) -> None:
+    aclose = getattr(it, "aclose", None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except Exception:
+            pass
+
+
+def build_default_router() -> LLMRouter:
+    providers: List[LLMProvider] = [GroqProvider(settings.GROQ_MODEL)]
+    if settings.LLM_FALLBACK_MODEL and settings.LLM_FALLBACK_MODEL != settings.GROQ_MODEL:
+        providers.append(GroqProvider(settings.LLM_FALLBACK_MODEL))
+    if settings.LLM_FALLBACK_BASE_URL:
+        providers.append(
+            OpenAICompatProvider(
+                base_url=settings.LLM_FALLBACK_BASE_URL,
+                model=settings.LLM_FALLBACK_API_MODEL or settings.GROQ_MODEL,
+                api_key=settings.LLM_FALLBACK_API_KEY,
+            )
+        )
+    return LLMRouter(providers, hedge_after_ms=settings.LLM_HEDGE_AFTER_MS)
+
+
+_router: Optional[LLMRouter] = None
+
+
+def get_llm_router() -> LLMRouter:
+    global _router
+    if _router is None:
+        _router = build_default_router()
+    return _router
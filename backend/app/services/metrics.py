@@ -0,0 +1,214 @@
+"""
+Metrics – per-request latency spans for the RAG pipeline.
+
+A RequestTrace is activated for the duration of a chat request; any code
+running inside it (embedding, retrieval, prompt building, the LLM gateway)
+records spans through the module helpers without the trace being passed
+around explicitly. Spans are exported as Prometheus histograms on /metrics
+and, when OTEL_TRACES_ENABLED is set, as OpenTelemetry spans.
+
+chatbot_id labels are capped at METRICS_MAX_CHATBOTS distinct values per
+process; later chatbots are reported as "other" to bound cardinality.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # optional dependency
+    otel_trace = None  # type: ignore[assignment]
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+_TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds",
+    "Latency of each RAG pipeline stage",
+    ["stage", "chatbot"],
+    buckets=_LATENCY_BUCKETS,
+)
+TOKENS = Histogram(
+    "rag_tokens",
+    "Prompt / completion tokens per chat request",
+    ["kind", "chatbot"],
+    buckets=_TOKEN_BUCKETS,
+)
+REQUESTS = Counter("rag_requests_total", "Chat requests handled", ["chatbot"])
+STREAMS_CANCELLED = Counter(
+    "chat_streams_cancelled_total",
+    "Chat streams stopped before the model finished",
+    ["reason", "chatbot"],
+)
+RETRIEVAL_GATE = Counter(
+    "rag_retrieval_gate_total",
+    "Intent gate decisions (retrieved / skipped_rules / skipped_centroid)",
+    ["decision", "chatbot"],
+)
+RETRIEVAL_SECONDS_SAVED = Counter(
+    "rag_retrieval_seconds_saved_total",
+    "Estimated embedding + vector search time avoided by the intent gate",
+    ["chatbot"],
+)
+TELEMETRY_EVENTS = Counter(
+    "telemetry_events_total",
+    "Usage records by outcome (written / dropped_full / dropped_error)",
+    ["outcome"],
+)
+TELEMETRY_QUEUE = Gauge("telemetry_queue_depth", "Usage records waiting to be written")
+ADMISSION_QUEUE = Gauge(
+    "admission_queue_depth",
+    "Requests waiting for a slot, per entry point (chat / ingest)",
+    ["kind", "chatbot"],
+)
+ADMISSION_THROTTLED = Counter(
+    "admission_throttled_total",
+    "Requests answered 429 (rate / queue_full / timeout)",
+    ["kind", "reason", "chatbot"],
+)
+TELEGRAM_MESSAGES = Counter(
+    "telegram_messages_total",
+    "Telegram messages by outcome (answered / coalesced / dropped)",
+    ["outcome"],
+)
+TELEGRAM_REPLIES_ACTIVE = Gauge("telegram_replies_active", "Telegram replies being generated")
+TELEGRAM_CHATS_WAITING = Gauge("telegram_chats_waiting", "Telegram chats waiting for a reply slot")
+
+_known_chatbots: Set[str] = set()
+_known_lock = threading.Lock()
+_current: ContextVar[Optional["RequestTrace"]] = ContextVar("rag_trace", default=None)
+
+
+def chatbot_label(chatbot_id: str) -> str:
+    """Bounded-cardinality label value for *chatbot_id*."""
+    if chatbot_id in _known_chatbots:
+        return chatbot_id
+    with _known_lock:
+        if len(_known_chatbots) < settings.METRICS_MAX_CHATBOTS:
+            _known_chatbots.add(chatbot_id)
+            return chatbot_id
+    return "other"
+
+
+class RequestTrace:
+    """Collects the spans of one chat request."""
+
+    def __init__(self, chatbot_id: str, session_id: str = ""):
+        self.chatbot_id = chatbot_id
+        self.session_id = session_id
+        self.label = chatbot_label(chatbot_id)
+        self.started = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+        self.tokens: Dict[str, int] = {}
+        self.retrieved: List[str] = []   # chunk ids returned by the vector search
+        self.retrieval = ""              # intent-gate outcome: retrieved / skipped_rules / …
+        self._otel_root: Any = None
+        if settings.OTEL_TRACES_ENABLED and otel_trace is not None:
+            self._otel_root = otel_trace.get_tracer(__name__).start_span(
+                "rag.request",
+                attributes={"chatbot_id": chatbot_id, "session_id": session_id},
+            )
+        REQUESTS.labels(self.label).inc()
+
+    @contextmanager
+    def activate(self) -> Iterator["RequestTrace"]:
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            try:
+                _current.reset(token)
+            except ValueError:  # resumed in a different context (async generator)
+                _current.set(None)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        otel_span = self._start_otel(stage)
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+            if otel_span is not None:
+                otel_span.end()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+        STAGE_SECONDS.labels(stage, self.label).observe(seconds)
+
+    def since_start(self) -> float:
+        return time.perf_counter() - self.started
+
+    def record_tokens(self, kind: str, count: int) -> None:
+        self.tokens[kind] = self.tokens.get(kind, 0) + count
+        TOKENS.labels(kind, self.label).observe(count)
+
+    def record_retrieved(self, chunk_ids: List[str]) -> None:
+        self.retrieved.extend(chunk_ids)
+
+    def finish(self) -> None:
+        self.observe("total", self.since_start())
+        if self._otel_root is not None:
+            for kind, count in self.tokens.items():
+                self._otel_root.set_attribute(f"tokens.{kind}", count)
+            self._otel_root.end()
+        logger.info(
+            "rag_trace chatbot=%s session=%s %s %s",
+            self.chatbot_id,
+            self.session_id,
+            " ".join(f"{k}={v * 1000:.0f}ms" for k, v in self.spans.items()),
+            " ".join(f"{k}_tokens={v}" for k, v in self.tokens.items()),
+        )
+
+    def _start_otel(self, stage: str) -> Any:
+        if self._otel_root is None or otel_trace is None:
+            return None
+        ctx = otel_trace.set_span_in_context(self._otel_root)
+        return otel_trace.get_tracer(__name__).start_span(f"rag.{stage}", context=ctx)
+
+
+# ── Helpers for code running inside an active trace ─────────────────────────
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current.get()
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time *stage* on the active trace; no-op outside a chat request."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(stage):
+        yield
+
+
+def observe(stage: str, seconds: float) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.observe(stage, seconds)
+
+
+def record_tokens(kind: str, count: int) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.record_tokens(kind, count)
+
+
+def record_retrieved(chunk_ids: List[str]) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.record_retrieved(chunk_ids)
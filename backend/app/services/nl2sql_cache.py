@@ -0,0 +1,118 @@
+"""
+NL2SQL Cache – skips the LLM (and often the database) for analytics
+questions the dashboard asks again and again.
+
+  Plan cache    normalized question -> guarded SQL template. Templates
+                never contain the user id (it is bound as :user_id), so one
+                plan serves every user asking the same question.
+  Result cache  (SQL, params) -> result for NL2SQL_RESULT_TTL_SECONDS.
+
+Each result entry remembers the version of every table its SQL reads;
+invalidate("Document") bumps that table's version so entries built on the
+old data miss. Writes made outside this process (the Next.js app writes
+through Prisma) are not seen here and are bounded by the TTL instead.
+"""
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Hashable, Optional, Tuple
+
+from app.config import settings
+from app.utils.sql_guard import GuardedSQL
+
+_NON_WORD = re.compile(r"[^\w\s]+", re.UNICODE)
+
+
+@dataclass
+class _Result:
+    value: Any
+    versions: Tuple[Tuple[str, int], ...]
+    expires_at: float
+
+
+def normalize_question(question: str) -> str:
+    """Case, punctuation and whitespace don't change the query a question needs."""
+    return " ".join(_NON_WORD.sub(" ", question.lower()).split())
+
+
+class NL2SQLCache:
+    def __init__(
+        self,
+        max_plans: int = settings.NL2SQL_PLAN_CACHE_SIZE,
+        max_results: int = settings.NL2SQL_RESULT_CACHE_SIZE,
+        result_ttl: float = settings.NL2SQL_RESULT_TTL_SECONDS,
+    ):
+        self.max_plans = max_plans
+        self.max_results = max_results
+        self.result_ttl = result_ttl
+        self._plans: "OrderedDict[str, GuardedSQL]" = OrderedDict()
+        self._results: "OrderedDict[Hashable, _Result]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+
+    # ── Plans ──────────────────────────────────────────────────────────────
+
+    def get_plan(self, question: str) -> Optional[GuardedSQL]:
+        key = normalize_question(question)
+        plan = self._plans.get(key)
+        if plan is not None:
+            self._plans.move_to_end(key)
+        return plan
+
+    def put_plan(self, question: str, plan: GuardedSQL) -> None:
+        self._plans[normalize_question(question)] = plan
+        _trim(self._plans, self.max_plans)
+
+    def drop_plan(self, question: str) -> None:
+        """Forget a plan whose SQL failed to execute, so the next ask regenerates it."""
+        self._plans.pop(normalize_question(question), None)
+
+    # ── Results ────────────────────────────────────────────────────────────
+
+    def get_result(self, plan: GuardedSQL, params: Dict[str, Any]) -> Optional[Any]:
+        key = _result_key(plan.sql, params)
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic() or entry.versions != self._snapshot(plan.tables):
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return entry.value
+
+    def put_result(self, plan: GuardedSQL, params: Dict[str, Any], value: Any) -> None:
+        if self.result_ttl <= 0:
+            return
+        self._results[_result_key(plan.sql, params)] = _Result(
+            value, self._snapshot(plan.tables), time.monotonic() + self.result_ttl
+        )
+        _trim(self._results, self.max_results)
+
+    def invalidate(self, *tables: str) -> None:
+        """A write touched *tables*: cached results that read any of them are stale."""
+        for table in tables:
+            name = table.strip('"').lower()
+            self._versions[name] = self._versions.get(name, 0) + 1
+
+    def _snapshot(self, tables: FrozenSet[str]) -> Tuple[Tuple[str, int], ...]:
+        return tuple(sorted((t, self._versions.get(t, 0)) for t in tables))
+
+
+def _result_key(sql: str, params: Dict[str, Any]) -> Hashable:
+    return sql, tuple(sorted(params.items()))
+
+
+def _trim(cache: "OrderedDict[Any, Any]", limit: int) -> None:
+    while len(cache) > limit:
+        cache.popitem(last=False)
+
+
+_nl2sql_cache: Optional[NL2SQLCache] = None
+
+
+def get_nl2sql_cache() -> NL2SQLCache:
+    """Process-wide cache shared by the analytics endpoint and the write paths that invalidate it."""
+    global _nl2sql_cache
+    if _nl2sql_cache is None:
+        _nl2sql_cache = NL2SQLCache()
+    return _nl2sql_cache
@@ -1,30 +1,114 @@
 """
 NL2SQL Service – converts a natural-language question to SQL using Groq,
 executes it against PostgreSQL, and returns structured results.
+
+The generated SQL never names a user: the caller's id is bound as :user_id
+only inside the scope CTEs below, so a plan is cached per normalized
+question and is safe to reuse across users; results are cached briefly per
+(SQL, params). See nl2sql_cache.py.
+
+Scoping is structural: every table the model may read is shadowed by a CTE
+of the same name that holds only the caller's rows and only the columns
+listed in _SCOPED (no telegramToken, systemPrompt, document content or
+other tenants' users). The guard rejects schema-qualified names, so the
+generated SQL can't reach the real tables around them. Queries also run as
+NL2SQL_DB_ROLE, a role that can only read those columns (see
+scripts/nl2sql-role.sql); without it questions are refused rather than run
+as the app's own read/write role.
+
+Execution is bounded: app.utils.sql_guard checks the statement (read-only,
+allowed tables and functions) and caps it at NL2SQL_MAX_ROWS; it then runs in a READ ONLY
+transaction on the read replica if configured, with a statement_timeout,
+after an EXPLAIN whose estimated cost must stay under NL2SQL_MAX_PLAN_COST.
+Rows are fetched from a server-side cursor and handed out page by page.
+Counts over time are steered to the rollup tables (see rollups.py).
 """
-from typing import Any, Dict
+from contextlib import aclosing
+from dataclasses import replace
+from typing import Any, AsyncIterator, Dict, List, Optional
+import json
 import re
 import logging
 
-from groq import AsyncGroq
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
 
 from app.config import settings
+from app.database import read_engine
+from app.services.llm_gateway import Priority, get_llm_gateway
+from app.services.nl2sql_cache import NL2SQLCache, get_nl2sql_cache
+from app.services.rollups import ROLLUP_TABLES
+from app.services.telemetry import ChatUsage
+from app.utils.sql_guard import GuardedSQL, SQLRejected, guard_sql
 
 logger = logging.getLogger(__name__)
 
+# name -> body of the CTE that stands in for the table; MATERIALIZED only for
+# the small ones the others join against
+_SCOPED: Dict[str, str] = {
+    '"User"': (
+        'MATERIALIZED (SELECT id, name, email, plan, "createdAt" FROM public."User" '
+        "WHERE id = :user_id)"
+    ),
+    '"Chatbot"': (
+        'MATERIALIZED (SELECT id, "userId", name, "businessName", language, "isActive", '
+        '"createdAt" FROM public."Chatbot" WHERE "userId" = :user_id)'
+    ),
+    '"ChatSession"': (
+        'NOT MATERIALIZED (SELECT s.id, s."chatbotId", s."visitorId", s.language, s."createdAt" '
+        'FROM public."ChatSession" s JOIN "Chatbot" c ON c.id = s."chatbotId")'
+    ),
+    '"Message"': (
+        'NOT MATERIALIZED (SELECT m.id, m."sessionId", m.role, m.content, m.tokens, '
+        'm.confidence, m."createdAt" FROM public."Message" m '
+        'JOIN "ChatSession" s ON s.id = m."sessionId")'
+    ),
+    '"Document"': (
+        'NOT MATERIALIZED (SELECT d.id, d."chatbotId", d.name, d.type, d.status, '
+        'd."chunkCount", d."createdAt" FROM public."Document" d '
+        'JOIN "Chatbot" c ON c.id = d."chatbotId")'
+    ),
+    **{
+        table: (
+            f"NOT MATERIALIZED (SELECT r.* FROM public.{table} r "
+            'JOIN "Chatbot" c ON c.id = r.chatbot_id)'
+        )
+        for table in (ChatUsage.__tablename__,) + ROLLUP_TABLES
+    },
+}
+_SCOPE = "WITH " + ",\n".join(f"{name} AS {body}" for name, body in _SCOPED.items())
+
+ALLOWED_TABLES = tuple(name.strip('"') for name in _SCOPED)
+
 _SCHEMA_HINT = """
-Tables available:
-  users(id, name, email, plan, created_at)
-  chatbots(id, user_id, name, is_active, created_at)
-  chat_sessions(id, chatbot_id, visitor_id, language, started_at)
-  messages(id, session_id, role, content, tokens, confidence, created_at)
-  documents(id, chatbot_id, name, type, status, chunk_count, created_at)
+Tables available (PostgreSQL, quote every identifier exactly as shown; never
+prefix a schema). Only the columns listed exist:
+  "User"(id, name, email, plan, "createdAt")
+  "Chatbot"(id, "userId", name, "businessName", language, "isActive", "createdAt")
+  "ChatSession"(id, "chatbotId", "visitorId", language, "createdAt")
+  "Message"(id, "sessionId", role, content, tokens, confidence, "createdAt")
+  "Document"(id, "chatbotId", name, type, status, "chunkCount", "createdAt")
+
+Pre-aggregated rollups (UTC, refreshed every few minutes; chatbot_id = "Chatbot".id):
+  analytics_rollup_daily(chatbot_id, day, sessions, messages, user_messages, tokens,
+                         confidence_sum, confidence_count, unanswered)
+  analytics_rollup_hourly(chatbot_id, bucket, <same metrics as daily>)
+  analytics_rollup_language_daily(chatbot_id, day, language, sessions)
+  Average confidence = sum(confidence_sum) / NULLIF(sum(confidence_count), 0);
+  unanswered = low-confidence assistant replies.
+
+Per-reply usage (UTC; one row per AI reply):
+  chat_usage(chatbot_id, session_id, created_at, mode, retrieval, retrieved_chunks text[],
+             prompt_tokens, completion_tokens, ttft_ms, total_ms)
 
 Rules:
 - Only SELECT statements are allowed.
-- Always filter by the provided user_id for security.
+- The tables already contain only the current user's data; don't filter by user.
+- For counts, totals, tokens, languages or confidence over time, query the
+  rollups instead of "Message" / "ChatSession".
+- Use only common functions: aggregates, window, date/time, string, math,
+  coalesce / nullif / greatest / least and casts.
+- Prefer aggregates; return at most a few hundred rows.
 - Return only the SQL query, nothing else.
 """
 
@@ -34,43 +118,119 @@ Schema:
 {schema}
 
 User's question: {question}
-User's user_id (use in WHERE clause for ownership): {user_id}
 
 Respond with ONLY the SQL query, no explanation, no markdown."""
 
-
 class NL2SQLService:
-    def __init__(self):
-        self.client = AsyncGroq(api_key=settings.GROQ_API_KEY)
-
-    async def query(
-        self, question: str, user_id: str, db: AsyncSession
-    ) -> Dict[str, Any]:
-        # 1. Generate SQL via Groq
-        prompt = _PROMPT.format(
-            schema=_SCHEMA_HINT, question=question, user_id=user_id
-        )
-        response = await self.client.chat.completions.create(
-            model=settings.GROQ_MODEL,
+    def __init__(self, cache: Optional[NL2SQLCache] = None, engine: Optional[AsyncEngine] = None):
+        self.gateway = get_llm_gateway()
+        self.cache = cache or get_nl2sql_cache()
+        self.engine = engine or read_engine()
+        self.max_rows = settings.NL2SQL_MAX_ROWS
+        self.page_size = settings.NL2SQL_PAGE_SIZE
+
+    async def query(self, question: str, user_id: str) -> Dict[str, Any]:
+        """Whole result in one dict: sql, rows, count, truncated, cached (or error)."""
+        result: Dict[str, Any] = {"sql": "", "rows": []}
+        async for event in self.stream(question, user_id):
+            if "rows" in event:
+                result["rows"].extend(event["rows"])
+            else:
+                result.update(event)
+        result["count"] = len(result["rows"])
+        return result
+
+    async def stream(self, question: str, user_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Events in order: {"sql"}, then {"rows": [...]} per page, then
+        {"count", "truncated", "cached"} – or {"error"} as the last event.
+        """
+        if not settings.NL2SQL_DB_ROLE:
+            yield {"error": "Analytics questions are disabled until NL2SQL_DB_ROLE is configured."}
+            return
+
+        # 1. SQL template – cached per normalized question, else generated via Groq
+        plan = self.cache.get_plan(question)
+        if plan is None:
+            sql = await self._generate(question)
+            try:
+                plan = self._guard(sql)
+            except SQLRejected as exc:
+                yield {"sql": sql}
+                yield {"error": str(exc)}
+                return
+            self.cache.put_plan(question, plan)
+        yield {"sql": plan.sql}
+
+        # 2. Execute – results cached briefly per (SQL, params)
+        params = {"user_id": user_id}
+        cached = self.cache.get_result(plan, params)
+        if cached is not None:
+            rows, truncated = cached
+            for start in range(0, len(rows), self.page_size):
+                yield {"rows": rows[start : start + self.page_size]}
+            yield {"count": len(rows), "truncated": truncated, "cached": True}
+            return
+
+        rows: List[Dict[str, Any]] = []
+        truncated = False
+        try:
+            async with aclosing(self._pages(plan, params)) as pages:
+                async for page in pages:
+                    room = plan.max_rows - len(rows)
+                    if len(page) > room:
+                        page, truncated = page[:room], True
+                    rows.extend(page)
+                    if page:
+                        yield {"rows": page}
+                    if truncated:
+                        break
+        except Exception as exc:
+            if not isinstance(exc, SQLRejected):
+                logger.exception("NL2SQL execution error")
+            self.cache.drop_plan(question)
+            yield {"error": str(exc)}
+            return
+        self.cache.put_result(plan, params, (rows, truncated))
+        yield {"count": len(rows), "truncated": truncated, "cached": False}
+
+    def _guard(self, sql: str) -> GuardedSQL:
+        guarded = guard_sql(sql, ALLOWED_TABLES, self.max_rows)
+        return replace(guarded, sql=f"{_SCOPE}\n{guarded.sql}")
+
+    async def _generate(self, question: str) -> str:
+        prompt = _PROMPT.format(schema=_SCHEMA_HINT, question=question)
+        response = await self.gateway.complete(
+            [{"role": "user", "content": prompt}],
             max_tokens=512,
-            messages=[{"role": "user", "content": prompt}],
+            priority=Priority.BACKGROUND,
         )
         raw_sql = response.choices[0].message.content or ""
         raw_sql = raw_sql.strip()
 
         # Strip markdown code fences if present
         sql = re.sub(r"^```[a-z]*\n?", "", raw_sql, flags=re.IGNORECASE)
-        sql = re.sub(r"\n?```$", "", sql).strip()
+        return re.sub(r"\n?```$", "", sql).strip()
 
-        # Safety check – allow SELECT only
-        if not sql.lower().lstrip().startswith("select"):
-            return {"error": "Only SELECT queries are allowed.", "sql": sql, "rows": []}
+    async def _pages(self, plan: GuardedSQL, params: Dict[str, Any]) -> AsyncIterator[List[Dict[str, Any]]]:
+        async with self.engine.connect() as conn:
+            async with conn.begin():
+                await conn.execute(text("SET TRANSACTION READ ONLY"))
+                role = settings.NL2SQL_DB_ROLE.replace('"', '""')
+                await conn.execute(text(f'SET LOCAL ROLE "{role}"'))
+                await conn.execute(
+                    text(f"SET LOCAL statement_timeout = {int(settings.NL2SQL_STATEMENT_TIMEOUT_MS)}")
+                )
+                cost = await self._plan_cost(conn, plan, params)
+                if cost > settings.NL2SQL_MAX_PLAN_COST:
+                    logger.info("NL2SQL plan rejected: cost %.0f > %.0f", cost, settings.NL2SQL_MAX_PLAN_COST)
+                    raise SQLRejected("This question is too expensive to answer; try narrowing it down.")
+                result = await conn.stream(text(plan.sql), params)
+                async for page in result.mappings().partitions(self.page_size):
+                    yield [dict(row) for row in page]
 
-        # 2. Execute SQL
-        try:
-            result = await db.execute(text(sql))
-            rows = [dict(zip(result.keys(), row)) for row in result.fetchall()]
-            return {"sql": sql, "rows": rows, "count": len(rows)}
-        except Exception as exc:
-            logger.exception("NL2SQL execution error")
-            return {"error": str(exc), "sql": sql, "rows": []}
+    @staticmethod
+    async def _plan_cost(conn: AsyncConnection, plan: GuardedSQL, params: Dict[str, Any]) -> float:
+        raw = (await conn.execute(text(f"EXPLAIN (FORMAT JSON) {plan.sql}"), params)).scalar()
+        explained = json.loads(raw) if isinstance(raw, str) else raw
+        return float(explained[0]["Plan"]["Total Cost"])
@@ -1,16 +1,38 @@
 """
 RAG Service – orchestrates retrieval-augmented generation.
-1. Embed the incoming question.
-2. Query ChromaDB for relevant chunks.
-3. Stream the AI response via Groq.
+0. Load the session's history (and running summary) if the client sent none,
+   concurrently with step 1.
+1. Embed the incoming question – unless the intent gate sees chit-chat.
+2. Query ChromaDB for relevant chunks (same exception).
+3. Stream the AI response via Groq (or, for integrations, return it whole).
+After the reply the exchange is stored, long sessions are summarized in
+the background and a usage record (chunks, tokens, latency) is queued
+for the telemetry writer. Each request is traced (embed / retrieve / prompt /
+LLM queue, TTFT, total) into the Prometheus histograms served on /metrics.
 """
-from typing import AsyncIterator, List, Dict
+from typing import AsyncIterator, Awaitable, List, Dict, Optional, Set, Tuple
+import asyncio
 import logging
+import time
+from dataclasses import replace
 
 from app.config import settings
 from app.services.embedding_service import EmbeddingService
-from app.services.chroma_service import ChromaService
-from app.services.ai_engine import AIEngine
+from app.services.chroma_service import ChromaService, EmbeddingModelChanged
+from app.services.ai_engine import TECHNICAL_ISSUE, AIEngine
+from app.services.llm_router import Completion
+from app.services.intent_gate import CHITCHAT_CONTEXT, IntentGate
+from app.services.metrics import (
+    RETRIEVAL_GATE,
+    RETRIEVAL_SECONDS_SAVED,
+    RequestTrace,
+    chatbot_label,
+)
+from app.services.session_store import get_session_store
+from app.services.summarizer import ConversationSummarizer
+from app.services.telemetry import UsageEvent, get_telemetry_writer
+from app.utils.prompt_builder import Persona
+from app.utils.token_counter import count_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -20,35 +42,265 @@ class RagService:
         self.embedding_svc = EmbeddingService()
         self.chroma_svc = ChromaService()
         self.ai_engine = AIEngine()
+        self.session_store = get_session_store()
+        self.summarizer = ConversationSummarizer(self.session_store)
+        self.intent_gate = IntentGate(self.embedding_svc)
+        # running averages of embed / vector-search latency, to price skipped retrievals
+        self._embed_avg = 0.0
+        self._search_avg = 0.0
+        self._background: Set["asyncio.Task[None]"] = set()
+        # identical history-less questions to the same bot share one completion
+        self._inflight: Dict[Tuple, "asyncio.Future[Completion]"] = {}
 
-    async def stream_response(
+    async def _history(
+        self, chatbot_id: str, session_id: str, history: List[Dict[str, str]]
+    ) -> Tuple[List[Dict[str, str]], str]:
+        """
+        (turns, summary) for the prompt. Client-supplied history wins;
+        otherwise use the server-side session and its running summary.
+        """
+        if history:
+            return history, ""
+        stored = await self.session_store.load(chatbot_id, session_id)
+        return stored.messages(), stored.summary
+
+    def _remember(self, chatbot_id: str, session_id: str, message: str, reply: str) -> None:
+        """Record the exchange (and maybe summarize) after the response, off the request path."""
+        if not reply or reply.endswith(TECHNICAL_ISSUE):
+            return  # a failed reply would teach the next prompt to apologise again
+        task = asyncio.ensure_future(self._record(chatbot_id, session_id, message, reply))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _record(self, chatbot_id: str, session_id: str, message: str, reply: str) -> None:
+        await self.session_store.append(chatbot_id, session_id, [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": reply},
+        ])
+        await self.summarizer.maybe_summarize(chatbot_id, session_id)
+
+    async def _retrieve(
         self,
+        trace: RequestTrace,
         chatbot_id: str,
-        session_id: str,
         message: str,
-        history: List[Dict[str, str]],
-        visitor_id: str = "",
-    ) -> AsyncIterator[str]:
-        # 1. Retrieve relevant context
-        query_embedding = await self.embedding_svc.embed_text(message)
-        chunks = await self.chroma_svc.query(
-            chatbot_id=chatbot_id,
-            query_embedding=query_embedding,
-            n_results=settings.CONTEXT_CHUNKS,
-        )
-        context = "\n\n---\n\n".join(chunks) if chunks else ""
+        history: Awaitable[Tuple[List[Dict[str, str]], str]],
+    ) -> Optional[str]:
+        """
+        Retrieved context, or None when the intent gate decides none is needed.
+        *history* is the (turns, summary) still loading; only an acknowledgement
+        ("yes", "ok") waits for it, to see whether it answers our own question.
+        """
+        label = chatbot_label(chatbot_id)
+        decision = self.intent_gate.classify(message, [])
+        if decision.kind == "ack" and not decision.retrieve:
+            turns, _ = await history
+            decision = self.intent_gate.classify(message, turns)
+        if settings.INTENT_GATE_ENABLED and not decision.retrieve:
+            trace.retrieval = "skipped_rules"
+            self._skipped(label, "skipped_rules", self._embed_avg + self._search_avg)
+            logger.info("Intent gate: %s for chatbot=%s – no retrieval", decision.kind, chatbot_id)
+            return None
+
+        started = time.perf_counter()
+        with trace.span("embed"):
+            model = await self.chroma_svc.embedding_model(chatbot_id)
+            query_embedding = await self.embedding_svc.embed_text(message, model=model)
+        self._embed_avg = _ewma(self._embed_avg, time.perf_counter() - started)
+
+        if (
+            settings.INTENT_GATE_ENABLED
+            and decision.ambiguous
+            and await self.intent_gate.is_chitchat(query_embedding, model)
+        ):
+            trace.retrieval = "skipped_centroid"
+            self._skipped(label, "skipped_centroid", self._search_avg)
+            logger.info("Intent gate: chit-chat (centroid) for chatbot=%s – no retrieval", chatbot_id)
+            return None
+
+        started = time.perf_counter()
+        with trace.span("retrieve"):
+            try:
+                chunks = await self.chroma_svc.query(
+                    chatbot_id=chatbot_id,
+                    query_embedding=query_embedding,
+                    n_results=settings.CONTEXT_CHUNKS,
+                    model=model,
+                )
+            except EmbeddingModelChanged as changed:
+                # the collection was re-embedded since its model was cached
+                chunks = await self.chroma_svc.query(
+                    chatbot_id=chatbot_id,
+                    query_embedding=await self.embedding_svc.embed_text(message, model=changed.model),
+                    n_results=settings.CONTEXT_CHUNKS,
+                )
+        self._search_avg = _ewma(self._search_avg, time.perf_counter() - started)
+        trace.retrieval = "retrieved"
+        RETRIEVAL_GATE.labels("retrieved", label).inc()
 
         logger.info(
             "RAG query for chatbot=%s session=%s  chunks_retrieved=%d",
             chatbot_id,
-            session_id,
+            trace.session_id,
             len(chunks),
         )
+        return "\n\n---\n\n".join(chunks) if chunks else ""
 
-        # 2. Stream AI response
-        async for chunk in self.ai_engine.stream(
-            message=message,
-            context=context,
-            history=history,
-        ):
-            yield chunk
+    @staticmethod
+    def _skipped(label: str, decision: str, seconds_saved: float) -> None:
+        RETRIEVAL_GATE.labels(decision, label).inc()
+        RETRIEVAL_SECONDS_SAVED.labels(label).inc(seconds_saved)
+
+    async def stream_response(
+        self,
+        chatbot_id: str,
+        session_id: str,
+        message: str,
+        history: List[Dict[str, str]],
+        visitor_id: str = "",
+        persona: Optional[Persona] = None,
+    ) -> AsyncIterator[str]:
+        trace = RequestTrace(chatbot_id, session_id)
+        with trace.activate():
+            # 1. Load the session so far while retrieving context if the message needs it
+            loading = asyncio.ensure_future(self._history(chatbot_id, session_id, history))
+            try:
+                context = await self._retrieve(trace, chatbot_id, message, loading)
+                history, summary = await loading
+            finally:
+                loading.cancel()
+            max_tokens = settings.MAX_TOKENS
+            if context is None:
+                context, max_tokens = CHITCHAT_CONTEXT, settings.CHITCHAT_MAX_TOKENS
+
+            # 2. Stream AI response
+            parts: List[str] = []
+            llm_started = time.perf_counter()
+            try:
+                async for chunk in self.ai_engine.stream(
+                    message=message,
+                    context=context,
+                    history=history,
+                    persona=persona,
+                    summary=summary,
+                    max_tokens=max_tokens,
+                ):
+                    if not parts:
+                        trace.observe("llm_ttft", time.perf_counter() - llm_started)
+                    parts.append(chunk)
+                    yield chunk
+            finally:
+                trace.observe("llm_total", time.perf_counter() - llm_started)
+                reply = "".join(parts)
+                trace.record_tokens("completion", count_tokens(reply))
+                trace.finish()
+                _record_usage(UsageEvent.from_trace(trace, "stream"))
+                self._remember(chatbot_id, session_id, message, reply)
+
+    async def complete(
+        self,
+        chatbot_id: str,
+        session_id: str,
+        message: str,
+        history: List[Dict[str, str]],
+        visitor_id: str = "",
+        persona: Optional[Persona] = None,
+        max_tokens: int = settings.MAX_TOKENS,
+    ) -> Completion:
+        """
+        Non-streaming counterpart of stream_response() for integrations that
+        only want the finished reply. Concurrent identical questions from
+        sessions without history (e.g. many new Telegram users asking the
+        same thing) are coalesced into one retrieval and one LLM call; each
+        caller still gets its own usage record, the followers' as "coalesced".
+        """
+        started = time.perf_counter()
+        history, summary = await self._history(chatbot_id, session_id, history)
+        if history or summary:
+            completion, _ = await self._complete(
+                chatbot_id, session_id, message, history, persona, max_tokens, summary
+            )
+            self._remember(chatbot_id, session_id, message, completion.text)
+            return completion
+
+        key = (chatbot_id, persona, max_tokens, " ".join(message.lower().split()))
+        shared = self._inflight.get(key)
+        leader = shared is None
+        if leader:
+            shared = asyncio.ensure_future(
+                self._complete(chatbot_id, session_id, message, history, persona, max_tokens)
+            )
+            self._inflight[key] = shared
+            shared.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            logger.info("Coalescing duplicate question for chatbot=%s", chatbot_id)
+        completion, usage = await asyncio.shield(shared)
+        if not leader:
+            # the leader's _complete recorded the LLM call; this is our share of it
+            _record_usage(replace(
+                usage,
+                session_id=session_id,
+                mode="coalesced",
+                total_ms=round((time.perf_counter() - started) * 1000),
+            ))
+        self._remember(chatbot_id, session_id, message, completion.text)
+        return completion
+
+    async def _complete(
+        self,
+        chatbot_id: str,
+        session_id: str,
+        message: str,
+        history: List[Dict[str, str]],
+        persona: Optional[Persona],
+        max_tokens: int,
+        summary: str = "",
+    ) -> Tuple[Completion, UsageEvent]:
+        trace = RequestTrace(chatbot_id, session_id)
+        with trace.activate():
+            context = await self._retrieve(trace, chatbot_id, message, _loaded(history, summary))
+            if context is None:
+                context, max_tokens = CHITCHAT_CONTEXT, min(max_tokens, settings.CHITCHAT_MAX_TOKENS)
+            with trace.span("llm_total"):
+                completion = await self.ai_engine.complete(
+                    message=message,
+                    context=context,
+                    history=history,
+                    persona=persona,
+                    summary=summary,
+                    max_tokens=max_tokens,
+                )
+            trace.record_tokens("completion", completion.completion_tokens)
+            trace.finish()
+            usage = UsageEvent.from_trace(trace, "complete")
+            _record_usage(usage)
+        return completion, usage
+
+
+def _loaded(
+    history: List[Dict[str, str]], summary: str
+) -> "asyncio.Future[Tuple[List[Dict[str, str]], str]]":
+    """An already-loaded history, for _retrieve (which may never await it)."""
+    loaded = asyncio.get_running_loop().create_future()
+    loaded.set_result((history, summary))
+    return loaded
+
+
+def _record_usage(usage: UsageEvent) -> None:
+    if settings.TELEMETRY_ENABLED:
+        get_telemetry_writer().record(usage)
+
+
+def _ewma(average: float, sample: float, alpha: float = 0.2) -> float:
+    return sample if average == 0.0 else alpha * sample + (1 - alpha) * average
+
+
+_rag_service: Optional[RagService] = None
+
+
+def get_rag_service() -> RagService:
+    """Process-wide RagService shared by the chat router and in-process callers."""
+    global _rag_service
+    if _rag_service is None:
+        _rag_service = RagService()
+    return _rag_service
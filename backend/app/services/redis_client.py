@@ -0,0 +1,83 @@
+"""
+Redis Client – one pooled Redis client per process, shared by the session
+store, document status and admission control.
+
+The client comes with a shared circuit breaker: when any user of it sees
+Redis fail, all of them fall back to their in-process state for
+REDIS_RETRY_SECONDS instead of each timing out on their own. Short socket
+timeouts keep a dead Redis from stalling requests. main.lifespan closes the
+client on shutdown.
+
+Usage::
+
+    redis = shared_redis(settings.REDIS_URL)
+    r = redis.available()           # None while Redis is unset or marked down
+    if r is not None:
+        try:
+            ...
+        except (RedisError, OSError) as exc:
+            redis.mark_down("Session store", exc, "using in-process history")
+"""
+import logging
+import time
+from typing import Dict, Optional
+
+import redis.asyncio as aioredis
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+REDIS_RETRY_SECONDS = 30.0
+
+
+class SharedRedis:
+    def __init__(self, url: str):
+        self.client: Optional[aioredis.Redis] = (
+            aioredis.from_url(
+                url,
+                decode_responses=True,
+                socket_connect_timeout=1.0,
+                socket_timeout=1.0,
+            )
+            if url else None
+        )
+        self._down_until = 0.0
+
+    def available(self) -> Optional[aioredis.Redis]:
+        """The client, or None if Redis is not configured or was just marked down."""
+        if self.client is None or time.monotonic() < self._down_until:
+            return None
+        return self.client
+
+    def mark_down(self, component: str, exc: Exception, fallback: str) -> None:
+        """Skip Redis for REDIS_RETRY_SECONDS in every component after *exc*."""
+        logger.warning(
+            "%s: Redis unavailable (%s) – %s for %.0fs", component, exc, fallback, REDIS_RETRY_SECONDS,
+        )
+        self._down_until = time.monotonic() + REDIS_RETRY_SECONDS
+
+    async def aclose(self) -> None:
+        if self.client is not None:
+            await self.client.aclose()
+
+
+_clients: Dict[str, SharedRedis] = {}
+
+
+def shared_redis(url: str = settings.REDIS_URL) -> SharedRedis:
+    """Process-wide client for *url* (an empty URL gives one that is never available)."""
+    client = _clients.get(url)
+    if client is None:
+        client = _clients[url] = SharedRedis(url)
+    return client
+
+
+async def close_redis() -> None:
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception:
+            logger.exception("Error closing Redis client")
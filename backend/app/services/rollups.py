@@ -0,0 +1,261 @@
+"""
+Analytics Rollups – hourly and daily per-chatbot aggregates of the chat
+tables, so the dashboard and NL2SQL read O(days) summary rows instead of
+scanning "Message" and "ChatSession".
+
+A background job (started in main.py's lifespan) refreshes the rollups
+every ROLLUP_REFRESH_SECONDS. Each run recomputes only the buckets at or
+after the last watermark (minus one hour for stragglers): the affected
+hourly buckets from the raw tables, then the affected days from the hourly
+rows, in one transaction. A Postgres advisory lock keeps concurrent
+workers from refreshing at the same time. The first run backfills
+everything.
+
+"Unanswered" counts assistant replies whose confidence is below
+ROLLUP_UNANSWERED_CONFIDENCE.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.config import settings
+from app.database import Base, engine, read_engine
+from app.services.nl2sql_cache import get_nl2sql_cache
+
+logger = logging.getLogger(__name__)
+
+_LOCK_KEY = 0x5271_0045   # pg advisory lock id for the refresh job
+_EPOCH = datetime(1970, 1, 1)
+_STATE = "chat"
+
+
+class HourlyRollup(Base):
+    __tablename__ = "analytics_rollup_hourly"
+
+    chatbot_id: Mapped[str] = mapped_column(sa.Text, primary_key=True)
+    bucket: Mapped[datetime] = mapped_column(sa.DateTime, primary_key=True)  # UTC hour
+    sessions: Mapped[int] = mapped_column(sa.Integer, default=0)
+    messages: Mapped[int] = mapped_column(sa.Integer, default=0)
+    user_messages: Mapped[int] = mapped_column(sa.Integer, default=0)
+    tokens: Mapped[int] = mapped_column(sa.BigInteger, default=0)
+    confidence_sum: Mapped[float] = mapped_column(sa.Float, default=0.0)
+    confidence_count: Mapped[int] = mapped_column(sa.Integer, default=0)
+    unanswered: Mapped[int] = mapped_column(sa.Integer, default=0)
+
+
+class DailyRollup(Base):
+    __tablename__ = "analytics_rollup_daily"
+
+    chatbot_id: Mapped[str] = mapped_column(sa.Text, primary_key=True)
+    day: Mapped[date] = mapped_column(sa.Date, primary_key=True)  # UTC day
+    sessions: Mapped[int] = mapped_column(sa.Integer, default=0)
+    messages: Mapped[int] = mapped_column(sa.Integer, default=0)
+    user_messages: Mapped[int] = mapped_column(sa.Integer, default=0)
+    tokens: Mapped[int] = mapped_column(sa.BigInteger, default=0)
+    confidence_sum: Mapped[float] = mapped_column(sa.Float, default=0.0)
+    confidence_count: Mapped[int] = mapped_column(sa.Integer, default=0)
+    unanswered: Mapped[int] = mapped_column(sa.Integer, default=0)
+
+
+class DailyLanguageRollup(Base):
+    __tablename__ = "analytics_rollup_language_daily"
+
+    chatbot_id: Mapped[str] = mapped_column(sa.Text, primary_key=True)
+    day: Mapped[date] = mapped_column(sa.Date, primary_key=True)
+    language: Mapped[str] = mapped_column(sa.Text, primary_key=True)
+    sessions: Mapped[int] = mapped_column(sa.Integer, default=0)
+
+
+class RollupState(Base):
+    __tablename__ = "analytics_rollup_state"
+
+    name: Mapped[str] = mapped_column(sa.Text, primary_key=True)
+    watermark: Mapped[datetime] = mapped_column(sa.DateTime)
+
+
+ROLLUP_TABLES = (
+    HourlyRollup.__tablename__, DailyRollup.__tablename__, DailyLanguageRollup.__tablename__,
+)
+
+_METRICS = "sessions, messages, user_messages, tokens, confidence_sum, confidence_count, unanswered"
+
+_REFRESH_HOURLY = sa.text(f"""
+WITH msg AS (
+    SELECT s."chatbotId" AS chatbot_id,
+           date_trunc('hour', m."createdAt") AS bucket,
+           count(*) AS messages,
+           count(*) FILTER (WHERE m.role = 'USER') AS user_messages,
+           coalesce(sum(m.tokens), 0) AS tokens,
+           coalesce(sum(m.confidence), 0) AS confidence_sum,
+           count(m.confidence) AS confidence_count,
+           count(*) FILTER (WHERE m.role = 'ASSISTANT' AND m.confidence < :unanswered) AS unanswered
+    FROM "Message" m JOIN "ChatSession" s ON s.id = m."sessionId"
+    WHERE m."createdAt" >= :since
+    GROUP BY 1, 2
+), ses AS (
+    SELECT "chatbotId" AS chatbot_id, date_trunc('hour', "createdAt") AS bucket, count(*) AS sessions
+    FROM "ChatSession"
+    WHERE "createdAt" >= :since
+    GROUP BY 1, 2
+)
+INSERT INTO analytics_rollup_hourly (chatbot_id, bucket, {_METRICS})
+SELECT coalesce(msg.chatbot_id, ses.chatbot_id), coalesce(msg.bucket, ses.bucket),
+       coalesce(ses.sessions, 0), coalesce(msg.messages, 0), coalesce(msg.user_messages, 0),
+       coalesce(msg.tokens, 0), coalesce(msg.confidence_sum, 0), coalesce(msg.confidence_count, 0),
+       coalesce(msg.unanswered, 0)
+FROM msg FULL OUTER JOIN ses ON ses.chatbot_id = msg.chatbot_id AND ses.bucket = msg.bucket
+""")
+
+_REFRESH_DAILY = sa.text(f"""
+INSERT INTO analytics_rollup_daily (chatbot_id, day, {_METRICS})
+SELECT chatbot_id, bucket::date, sum(sessions), sum(messages), sum(user_messages), sum(tokens),
+       sum(confidence_sum), sum(confidence_count), sum(unanswered)
+FROM analytics_rollup_hourly
+WHERE bucket >= :day_start
+GROUP BY 1, 2
+""")
+
+_REFRESH_LANGUAGES = sa.text("""
+INSERT INTO analytics_rollup_language_daily (chatbot_id, day, language, sessions)
+SELECT "chatbotId", "createdAt"::date, language, count(*)
+FROM "ChatSession"
+WHERE "createdAt" >= :day_start
+GROUP BY 1, 2, 3
+""")
+
+# Buckets about to be recomputed are cleared first (so rows deleted upstream
+# disappear) and re-inserted; chatbots deleted since the last run are pruned.
+_CLEAR = [
+    sa.text("DELETE FROM analytics_rollup_hourly WHERE bucket >= :since"),
+    sa.text("DELETE FROM analytics_rollup_daily WHERE day >= :first_day"),
+    sa.text("DELETE FROM analytics_rollup_language_daily WHERE day >= :first_day"),
+] + [
+    sa.text(f'DELETE FROM {table} WHERE chatbot_id NOT IN (SELECT id FROM "Chatbot")')
+    for table in ROLLUP_TABLES
+]
+
+_OVERVIEW = sa.text("""
+SELECT r.day, sum(r.sessions) AS sessions, sum(r.messages) AS messages,
+       sum(r.tokens) AS tokens, sum(r.unanswered) AS unanswered,
+       sum(r.confidence_sum) / NULLIF(sum(r.confidence_count), 0) AS avg_confidence
+FROM analytics_rollup_daily r JOIN "Chatbot" c ON c.id = r.chatbot_id
+WHERE c."userId" = :user_id AND r.day >= :since
+GROUP BY r.day
+ORDER BY r.day
+""")
+
+_OVERVIEW_LANGUAGES = sa.text("""
+SELECT l.language, sum(l.sessions) AS sessions
+FROM analytics_rollup_language_daily l JOIN "Chatbot" c ON c.id = l.chatbot_id
+WHERE c."userId" = :user_id AND l.day >= :since
+GROUP BY l.language
+ORDER BY sessions DESC
+""")
+
+
+@dataclass
+class DailyStats:
+    day: date
+    sessions: int
+    messages: int
+    tokens: int
+    unanswered: int
+    avg_confidence: Optional[float]
+
+
+@dataclass
+class Overview:
+    daily: List[DailyStats]
+    languages: Dict[str, int]   # sessions per language, most used first
+
+
+class RollupService:
+    def __init__(self, unanswered_below: float = settings.ROLLUP_UNANSWERED_CONFIDENCE):
+        self.unanswered_below = unanswered_below
+
+    async def refresh(self) -> bool:
+        """Bring the rollups up to date; False if another worker holds the lock."""
+        started = time.perf_counter()
+        async with engine.begin() as conn:
+            locked = (await conn.execute(
+                sa.text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _LOCK_KEY}
+            )).scalar()
+            if not locked:
+                return False
+            now = (await conn.execute(sa.text("SELECT (now() AT TIME ZONE 'utc')::timestamp"))).scalar()
+            watermark = (await conn.execute(
+                sa.select(RollupState.watermark).where(RollupState.name == _STATE)
+            )).scalar()
+
+            since = refresh_start(watermark)
+            params = {
+                "since": since,
+                "first_day": since.date(),
+                "day_start": datetime.combine(since.date(), datetime.min.time()),
+                "unanswered": self.unanswered_below,
+            }
+            for statement in _CLEAR:
+                await conn.execute(statement, params)
+            await conn.execute(_REFRESH_HOURLY, params)
+            await conn.execute(_REFRESH_DAILY, params)
+            await conn.execute(_REFRESH_LANGUAGES, params)
+            await conn.execute(
+                sa.text(
+                    "INSERT INTO analytics_rollup_state (name, watermark) VALUES (:name, :now) "
+                    "ON CONFLICT (name) DO UPDATE SET watermark = EXCLUDED.watermark"
+                ),
+                {"name": _STATE, "now": now},
+            )
+        get_nl2sql_cache().invalidate(*ROLLUP_TABLES)
+        logger.info("Analytics rollups refreshed from %s in %.2fs", since, time.perf_counter() - started)
+        return True
+
+    async def run_forever(self, interval: float = settings.ROLLUP_REFRESH_SECONDS) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Analytics rollup refresh failed")
+            await asyncio.sleep(interval)
+
+    async def overview(self, user_id: str, days: int) -> Overview:
+        """Daily totals across the user's chatbots for the last *days* days, plus languages."""
+        params = {"user_id": user_id, "since": datetime.now(timezone.utc).date() - timedelta(days=days - 1)}
+        async with read_engine().connect() as conn:
+            rows = (await conn.execute(_OVERVIEW, params)).mappings().all()
+            languages = (await conn.execute(_OVERVIEW_LANGUAGES, params)).all()
+        daily: List[DailyStats] = [
+            DailyStats(
+                day=row["day"],
+                sessions=int(row["sessions"]),
+                messages=int(row["messages"]),
+                tokens=int(row["tokens"]),
+                unanswered=int(row["unanswered"]),
+                avg_confidence=None if row["avg_confidence"] is None else float(row["avg_confidence"]),
+            )
+            for row in rows
+        ]
+        return Overview(daily, {lang: int(n) for lang, n in languages})
+
+
+def refresh_start(watermark: Optional[datetime]) -> datetime:
+    """First hour bucket to recompute: the watermark's hour minus one for late rows."""
+    if watermark is None:
+        return _EPOCH
+    return watermark.replace(minute=0, second=0, microsecond=0) - timedelta(hours=1)
+
+
+_rollup_service: Optional[RollupService] = None
+
+
+def get_rollup_service() -> RollupService:
+    global _rollup_service
+    if _rollup_service is None:
+        _rollup_service = RollupService()
+    return _rollup_service
@@ -0,0 +1,236 @@
+"""
+Session Store – server-side conversation history keyed by (chatbot_id,
+session_id), so two bots never share a transcript even if their clients
+reuse a session id (Telegram sessions are "tg_<chat_id>" for every bot).
+
+Each session keeps the last SESSION_MAX_TURNS turns in a Redis list used as
+a ring buffer plus a small hash of rolling counters, so clients only need to
+send the new message. Every key expires after SESSION_TTL_SECONDS of
+inactivity. Turns are numbered (seq) as they are appended; compact() folds
+turns away by number inside a Lua script, so turns appended – or trimmed by
+the ring – while the summary was being written are never lost or
+double-counted, and a compaction based on a stale summary is discarded.
+
+If Redis is unreachable the store falls back to a bounded in-process LRU
+(per worker, lost on restart) and retries Redis after REDIS_RETRY_SECONDS
+(see redis_client.py).
+"""
+import json
+import logging
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from app.config import settings
+from app.services.redis_client import shared_redis
+from app.utils.token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# KEYS = turns, meta; ARGV = max_turns, ttl, tokens added, turn JSON...
+# Numbers each turn from the meta hash's total_turns counter.
+_APPEND = """
+local count = #ARGV - 3
+local seq = redis.call('HINCRBY', KEYS[2], 'total_turns', count) - count
+for i = 4, #ARGV do
+  seq = seq + 1
+  local turn = cjson.decode(ARGV[i])
+  turn['seq'] = seq
+  redis.call('RPUSH', KEYS[1], cjson.encode(turn))
+end
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[1]), -1)
+redis.call('HINCRBY', KEYS[2], 'total_tokens', ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+return seq
+"""
+
+# KEYS = turns, meta; ARGV = summarized_seq the summary was built on, last seq
+# it covers, summary, ttl. Returns the number of turns dropped, or -1 if
+# another compaction got there first.
+_COMPACT = """
+if tonumber(redis.call('HGET', KEYS[2], 'summarized_seq') or '0') ~= tonumber(ARGV[1]) then
+  return -1
+end
+local upto, dropped = tonumber(ARGV[2]), 0
+while true do
+  local head = redis.call('LINDEX', KEYS[1], 0)
+  if not head or (tonumber(cjson.decode(head)['seq']) or 0) > upto then break end
+  redis.call('LPOP', KEYS[1])
+  dropped = dropped + 1
+end
+redis.call('HSET', KEYS[2], 'summary', ARGV[3], 'summarized_seq', upto)
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return dropped
+"""
+
+
+@dataclass
+class SessionHistory:
+    turns: List[Dict[str, Any]] = field(default_factory=list)
+    tokens: int = 0          # tokens in the turns currently buffered
+    meta: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def summary(self) -> str:
+        """Running summary of turns already folded away (see summarizer.py)."""
+        return self.meta.get("summary", "")
+
+    @property
+    def summarized_seq(self) -> int:
+        """seq of the last turn folded into the summary (0 if none)."""
+        return int(self.meta.get("summarized_seq", 0))
+
+    def messages(self) -> List[Dict[str, str]]:
+        """Turns as plain {"role", "content"} dicts for the AI engine."""
+        return [{"role": t["role"], "content": t["content"]} for t in self.turns]
+
+
+class _MemorySession:
+    def __init__(self, max_turns: int):
+        self.turns: Deque[Dict[str, Any]] = deque(maxlen=max_turns)
+        self.meta: Dict[str, str] = {}
+
+
+class SessionStore:
+    def __init__(
+        self,
+        redis_url: str = settings.REDIS_URL,
+        max_turns: int = settings.SESSION_MAX_TURNS,
+        ttl: int = settings.SESSION_TTL_SECONDS,
+        max_local_sessions: int = settings.SESSION_LOCAL_MAX,
+    ):
+        self.max_turns = max_turns
+        self.ttl = ttl
+        self.max_local_sessions = max_local_sessions
+        self._redis = shared_redis(redis_url)
+        client = self._redis.client
+        self._append_script = client.register_script(_APPEND) if client else None
+        self._compact_script = client.register_script(_COMPACT) if client else None
+        self._local: "OrderedDict[Tuple[str, str], _MemorySession]" = OrderedDict()
+
+    # ── Public API ─────────────────────────────────────────────────────────
+
+    async def load(self, chatbot_id: str, session_id: str) -> SessionHistory:
+        r = self._redis.available()
+        if r is not None:
+            try:
+                async with r.pipeline(transaction=False) as pipe:
+                    pipe.lrange(self._turns_key(chatbot_id, session_id), 0, -1)
+                    pipe.hgetall(self._meta_key(chatbot_id, session_id))
+                    raw_turns, meta = await pipe.execute()
+                turns = [json.loads(t) for t in raw_turns]
+                return SessionHistory(turns, sum(t.get("tokens", 0) for t in turns), meta)
+            except (RedisError, OSError) as exc:
+                self._redis.mark_down("Session store", exc, "using in-process history")
+
+        session = self._local.get((chatbot_id, session_id))
+        if session is None:
+            return SessionHistory()
+        turns = list(session.turns)
+        return SessionHistory(turns, sum(t.get("tokens", 0) for t in turns), dict(session.meta))
+
+    async def append(self, chatbot_id: str, session_id: str, turns: List[Dict[str, str]]) -> None:
+        """Add turns to the session's ring buffer, dropping the oldest beyond max_turns."""
+        records = [
+            {"role": t["role"], "content": t["content"], "tokens": count_tokens(t["content"])}
+            for t in turns
+        ]
+        added = sum(rec["tokens"] for rec in records)
+
+        r = self._redis.available()
+        if r is not None:
+            try:
+                await self._append_script(
+                    keys=self._keys(chatbot_id, session_id),
+                    args=[self.max_turns, self.ttl, added, *(json.dumps(rec) for rec in records)],
+                )
+                return
+            except (RedisError, OSError) as exc:
+                self._redis.mark_down("Session store", exc, "using in-process history")
+
+        session = self._local_session(chatbot_id, session_id)
+        seq = int(session.meta.get("total_turns", 0))
+        for rec in records:
+            seq += 1
+            session.turns.append({**rec, "seq": seq})
+        session.meta["total_tokens"] = str(int(session.meta.get("total_tokens", 0)) + added)
+        session.meta["total_turns"] = str(seq)
+
+    async def set_meta(self, chatbot_id: str, session_id: str, **fields: str) -> None:
+        r = self._redis.available()
+        if r is not None:
+            meta_key = self._meta_key(chatbot_id, session_id)
+            try:
+                async with r.pipeline(transaction=True) as pipe:
+                    pipe.hset(meta_key, mapping=fields)
+                    pipe.expire(meta_key, self.ttl)
+                    await pipe.execute()
+                return
+            except (RedisError, OSError) as exc:
+                self._redis.mark_down("Session store", exc, "using in-process history")
+        self._local_session(chatbot_id, session_id).meta.update(fields)
+
+    async def compact(
+        self, chatbot_id: str, session_id: str, since: int, upto: int, summary: str
+    ) -> bool:
+        """
+        Replace the turns numbered up to *upto* with *summary*, which was
+        built on the summary covering turns up to *since*. Returns False
+        (and changes nothing) if the session was compacted meanwhile.
+        """
+        r = self._redis.available()
+        if r is not None:
+            try:
+                dropped = await self._compact_script(
+                    keys=self._keys(chatbot_id, session_id),
+                    args=[since, upto, summary, self.ttl],
+                )
+                return int(dropped) >= 0
+            except (RedisError, OSError) as exc:
+                self._redis.mark_down("Session store", exc, "using in-process history")
+        session = self._local_session(chatbot_id, session_id)
+        if int(session.meta.get("summarized_seq", 0)) != since:
+            return False
+        while session.turns and session.turns[0].get("seq", 0) <= upto:
+            session.turns.popleft()
+        session.meta.update(summary=summary, summarized_seq=str(upto))
+        return True
+
+    # ── Internals ──────────────────────────────────────────────────────────
+
+    @classmethod
+    def _keys(cls, chatbot_id: str, session_id: str) -> List[str]:
+        return [cls._turns_key(chatbot_id, session_id), cls._meta_key(chatbot_id, session_id)]
+
+    @staticmethod
+    def _turns_key(chatbot_id: str, session_id: str) -> str:
+        return f"chat:{chatbot_id}:session:{session_id}:turns"
+
+    @staticmethod
+    def _meta_key(chatbot_id: str, session_id: str) -> str:
+        return f"chat:{chatbot_id}:session:{session_id}:meta"
+
+    def _local_session(self, chatbot_id: str, session_id: str) -> _MemorySession:
+        key = (chatbot_id, session_id)
+        session = self._local.get(key)
+        if session is None:
+            session = self._local[key] = _MemorySession(self.max_turns)
+            while len(self._local) > self.max_local_sessions:
+                self._local.popitem(last=False)
+        else:
+            self._local.move_to_end(key)
+        return session
+
+
+_session_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """Process-wide session store shared by every chat entry point."""
+    global _session_store
+    if _session_store is None:
+        _session_store = SessionStore()
+    return _session_store
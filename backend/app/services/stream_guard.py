@@ -0,0 +1,100 @@
+"""
+Stream Guard – stops a chat reply early so we stop paying for it.
+
+Wraps the delta stream from RagService and ends it when the client
+disconnects, the reply exceeds CHAT_STREAM_MAX_SECONDS of wall-clock time,
+or CHAT_STREAM_MAX_TOKENS have been streamed. Ending the stream closes the
+upstream generator, which closes the Groq HTTP stream and frees the
+gateway slot. Each early stop is counted in chat_streams_cancelled_total.
+"""
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+
+from fastapi import Request
+
+from app.config import settings
+from app.services.metrics import STREAMS_CANCELLED, chatbot_label
+from app.utils.token_counter import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class StreamGuard:
+    def __init__(
+        self,
+        chatbot_id: str,
+        request: Optional[Request] = None,
+        max_seconds: float = settings.CHAT_STREAM_MAX_SECONDS,
+        max_tokens: int = settings.CHAT_STREAM_MAX_TOKENS,
+    ):
+        self.chatbot_id = chatbot_id
+        self.request = request
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.tokens = 0
+        self.reason: Optional[str] = None  # "disconnect" | "timeout" | "token_cap"
+        self._deadline = 0.0
+        self._scope: Optional[asyncio.Timeout] = None
+
+    @property
+    def disconnected(self) -> bool:
+        return self.reason == "disconnect"
+
+    async def wrap(self, deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        self._deadline = loop.time() + self.max_seconds
+        watcher = (
+            asyncio.ensure_future(self._watch_disconnect())
+            if self.request is not None else None
+        )
+        source = deltas.__aiter__()
+        try:
+            while self.reason is None:
+                try:
+                    # the timeout only ever spans the upstream await, never a yield
+                    async with asyncio.timeout_at(self._deadline) as scope:
+                        self._scope = scope
+                        delta = await source.__anext__()
+                except StopAsyncIteration:
+                    return
+                except TimeoutError:
+                    self._stop("timeout")  # keeps "disconnect" if that fired it
+                    return
+                finally:
+                    self._scope = None
+
+                self.tokens += max(1, count_tokens(delta))
+                yield delta
+                if self.tokens >= self.max_tokens:
+                    self._stop("token_cap")
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            if self.reason is not None:
+                STREAMS_CANCELLED.labels(self.reason, chatbot_label(self.chatbot_id)).inc()
+                logger.info(
+                    "Chat stream for chatbot=%s stopped early (%s) after %d tokens",
+                    self.chatbot_id, self.reason, self.tokens,
+                )
+
+    def _stop(self, reason: str) -> None:
+        if self.reason is None:
+            self.reason = reason
+
+    async def _watch_disconnect(self) -> None:
+        # The body has already been read, so the next ASGI message is the
+        # disconnect (or nothing, if the reply completes first).
+        assert self.request is not None
+        while True:
+            message = await self.request.receive()
+            if message["type"] == "http.disconnect":
+                break
+        self.reason = "disconnect"
+        now = asyncio.get_running_loop().time()
+        self._deadline = now
+        if self._scope is not None:
+            self._scope.reschedule(now)
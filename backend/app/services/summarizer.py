@@ -0,0 +1,87 @@
+"""
+Conversation Summarizer – folds older turns of a long session into a
+running summary so prompts stay bounded without losing context.
+
+Runs in the background after a reply has been delivered. Once the turns
+buffered for a session exceed SUMMARY_TRIGGER_TOKENS – or the next exchange
+would push the oldest turn out of the SESSION_MAX_TURNS ring buffer –
+everything but the last SUMMARY_KEEP_TURNS turns is merged into the
+session's summary (via a low-priority Groq call) and removed from the
+buffer, so turns are summarized before the ring can drop them. AIEngine
+sends the summary ahead of the remaining turns.
+"""
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.config import settings
+from app.services.llm_gateway import Priority, get_llm_gateway
+from app.services.session_store import SessionStore
+
+logger = logging.getLogger(__name__)
+
+_SUMMARY_PROMPT = """Update the running summary of a customer-support conversation.
+Keep the customer's name and contact details, their questions and problems,
+facts and prices already given, and anything promised to them. Be brief and
+factual; write in the conversation's language. Return ONLY the summary.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}"""
+
+
+class ConversationSummarizer:
+    def __init__(
+        self,
+        store: SessionStore,
+        trigger_tokens: int = settings.SUMMARY_TRIGGER_TOKENS,
+        keep_turns: int = settings.SUMMARY_KEEP_TURNS,
+    ):
+        self.store = store
+        self.trigger_tokens = trigger_tokens
+        self.keep_turns = keep_turns
+        self.gateway = get_llm_gateway()
+        self._running: Set[Tuple[str, str]] = set()
+
+    async def maybe_summarize(self, chatbot_id: str, session_id: str) -> Optional[str]:
+        """Summarize the session if it is over budget; returns the new summary."""
+        key = (chatbot_id, session_id)
+        if key in self._running:
+            return None
+        self._running.add(key)
+        try:
+            history = await self.store.load(chatbot_id, session_id)
+            older = history.turns[: -self.keep_turns] if self.keep_turns else history.turns
+            # one more exchange (user + assistant) must fit without trimming
+            ring_full = len(history.turns) + 2 > self.store.max_turns
+            if not older or (history.tokens <= self.trigger_tokens and not ring_full):
+                return None
+
+            summary = await self._summarize(history.summary, older)
+            if not await self.store.compact(
+                chatbot_id, session_id, history.summarized_seq, older[-1].get("seq", 0), summary
+            ):
+                logger.info("Session chatbot=%s session=%s was compacted meanwhile", chatbot_id, session_id)
+                return None
+            logger.info(
+                "Summarized %d turns of chatbot=%s session=%s (%d tokens buffered)",
+                len(older), chatbot_id, session_id, history.tokens,
+            )
+            return summary
+        except Exception:
+            logger.exception("Summarizing chatbot=%s session=%s failed", chatbot_id, session_id)
+            return None
+        finally:
+            self._running.discard(key)
+
+    async def _summarize(self, summary: str, turns: List[Dict]) -> str:
+        transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+        response = await self.gateway.complete(
+            [{"role": "user", "content": _SUMMARY_PROMPT.format(
+                summary=summary or "(none yet)", turns=transcript,
+            )}],
+            max_tokens=settings.SUMMARY_MAX_TOKENS,
+            priority=Priority.BACKGROUND,
+        )
+        return (response.choices[0].message.content or summary).strip()
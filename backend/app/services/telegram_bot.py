@@ -1,14 +1,39 @@
 """
-Telegram Bot Manager – runs Telegram bots for chatbots using polling.
-No webhooks, no HTTPS, no tunnels needed. Works purely over localhost.
-Each chatbot with a telegramToken gets its own polling bot instance.
+Telegram Bot Manager – hosts a Telegram bot for every chatbot with a
+telegramToken. Replies are streamed in-process from the shared RagService
+(no loopback HTTP call); pass a backend_url to start_bot() to route through
+a remote /chat/telegram instead. Ordering, coalescing and the concurrency
+limit live in telegram_dispatch.py.
+
+TELEGRAM_MODE picks how updates arrive:
+
+  polling  this process long-polls its shard of the bots (the default; no
+           HTTPS or tunnels needed). Bots are restored from
+           "Chatbot"."telegramToken" on startup and re-synced every
+           TELEGRAM_SYNC_SECONDS, so registrations survive restarts.
+  webhook  no pollers: start_bot() points the bot at
+           TELEGRAM_WEBHOOK_URL/telegram/webhook/{chatbot_id}, so every bot
+           is multiplexed through one endpoint, served by a single API
+           worker (per-chat ordering is kept in-process); a bot's
+           Application is built from the database on first update.
+           Each bot gets its own secret token, HMAC(TELEGRAM_WEBHOOK_SECRET,
+           chatbot_id); webhook mode refuses to run without the secret.
+  worker   the API process runs no bots; telegram_worker.py processes poll
+           the TELEGRAM_SHARD_COUNT shards between them.
+
+Chatbots are assigned to shards by a stable hash of their id.
 """
 import asyncio
+import hashlib
+import hmac
 import logging
-from typing import Dict
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
 
-import httpx
-from telegram import Update
+import sqlalchemy as sa
+from telegram import Bot, Update
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -17,10 +42,49 @@ from telegram.ext import (
     filters,
 )
 
+from app.config import settings
+from app.database import engine
+from app.services.admission import AdmissionRejected, get_admission
+from app.services.http_clients import http_clients
+from app.services.rag_service import get_rag_service
+from app.services.stream_guard import StreamGuard
+from app.services.telegram_dispatch import (
+    ChatKey,
+    IncomingMessage,
+    StreamingReply,
+    get_chat_dispatcher,
+)
+
 logger = logging.getLogger(__name__)
 
 # Store running bot applications by chatbot_id
 _running_bots: Dict[str, Application] = {}
+# Tokens that failed to start, so sync_bots() doesn't retry them every pass
+_failed_tokens: Dict[str, str] = {}
+# Webhook mode: when each cached Application must re-check its "Chatbot" row
+_webhook_recheck: Dict[str, float] = {}
+_webhook_locks: Dict[str, asyncio.Lock] = {}
+
+SYNC_CONCURRENCY = 8      # bots started in parallel by sync_bots()
+WEBHOOK_APP_TTL = 60.0    # seconds a webhook Application is trusted without a re-check
+
+
+@dataclass
+class BotRegistration:
+    chatbot_id: str
+    token: str
+    business_name: str
+
+
+def shard_of(chatbot_id: str, shard_count: Optional[int] = None) -> int:
+    """Stable shard for *chatbot_id* (the same in every process)."""
+    count = settings.TELEGRAM_SHARD_COUNT if shard_count is None else shard_count
+    return zlib.crc32(chatbot_id.encode()) % max(1, count)
+
+
+def owns(chatbot_id: str) -> bool:
+    """Whether this process polls *chatbot_id* (TELEGRAM_SHARD_INDEX of TELEGRAM_SHARD_COUNT)."""
+    return shard_of(chatbot_id) == settings.TELEGRAM_SHARD_INDEX
 
 
 async def _handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -33,88 +97,139 @@ async def _handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def _handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle incoming text messages — send to RAG backend and reply."""
+    """Queue incoming text on its chat's mailbox; replies are generated there."""
     if not update.message or not update.message.text:
         return
 
-    user_message = update.message.text
     chatbot_id = context.bot_data.get("chatbot_id", "")
     chat_id = update.message.chat_id
     user_id = update.message.from_user.id if update.message.from_user else 0
-    backend_url = context.bot_data.get("backend_url", "http://localhost:8000")
+    bot, backend_url = context.bot, context.bot_data.get("backend_url")
+
+    async def _answer(key: ChatKey, batch: List[IncomingMessage]) -> None:
+        await _reply(bot, chatbot_id, key[1], batch, backend_url)
+
+    get_chat_dispatcher().submit(
+        (chatbot_id, chat_id),
+        IncomingMessage(update.message.text, user_id, update.message.message_id),
+        _answer,
+    )
 
-    # Send "typing" indicator
-    await update.message.chat.send_action("typing")
 
+async def _reply(
+    bot: Bot,
+    chatbot_id: str,
+    chat_id: int,
+    batch: List[IncomingMessage],
+    backend_url: Optional[str] = None,
+) -> None:
+    """
+    Answer one batch of a chat's messages as a single query, streaming the
+    reply. In-process replies are admitted like /chat/* requests (a remote
+    backend admits them itself).
+    """
+    user_message = "\n".join(m.text for m in batch)
+    user_id = batch[0].user_id  # batches hold one sender's messages
+    reply = StreamingReply(bot, chat_id)
+    reply.start_typing()
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{backend_url}/chat/telegram",
-                json={
-                    "chatbot_id": chatbot_id,
-                    "session_id": f"tg_{chat_id}",
-                    "message": user_message,
-                    "visitor_id": f"telegram_{user_id}",
-                    "history": [],
-                },
+        if backend_url:
+            await reply.feed(
+                await _reply_via_http(backend_url, chatbot_id, chat_id, user_id, user_message)
             )
+        else:
+            ticket = await get_admission().admit("chat", chatbot_id)
+            try:
+                await ticket.wait(settings.ADMISSION_QUEUE_TIMEOUT_SECONDS)
+                deltas = StreamGuard(chatbot_id).wrap(get_rag_service().stream_response(
+                    chatbot_id=chatbot_id,
+                    session_id=f"tg_{chat_id}",
+                    message=user_message,
+                    history=[],
+                    visitor_id=f"telegram_{user_id}",
+                ))
+                async for delta in deltas:
+                    await reply.feed(delta)
+            finally:
+                ticket.release()
+        await reply.finish("Sorry, I couldn't generate a response.")
+    except AdmissionRejected as exc:
+        logger.info("Telegram reply for chatbot %s throttled: %s", chatbot_id, exc.detail)
+        await bot.send_message(
+            chat_id=chat_id,
+            text="⏳ I'm getting a lot of messages right now. Please try again in a minute.",
+        )
+    except Exception:
+        logger.exception("Error generating reply for Telegram bot")
+        await bot.send_message(chat_id=chat_id, text="😞 Something went wrong. Please try again in a moment.")
+    finally:
+        reply.close()
 
-            if response.status_code == 200:
-                data = response.json()
-                reply = data.get("reply", "Sorry, I couldn't generate a response.")
-            else:
-                logger.error("Backend returned %s: %s", response.status_code, response.text)
-                reply = "😞 I'm having trouble connecting right now. Please try again later."
-
-    except Exception as exc:
-        logger.exception("Error calling backend for Telegram bot")
-        reply = "😞 Something went wrong. Please try again in a moment."
 
-    # Telegram has a 4096 char limit per message
-    if len(reply) > 4000:
-        for i in range(0, len(reply), 4000):
-            await update.message.reply_text(reply[i : i + 4000])
-    else:
-        await update.message.reply_text(reply)
+async def _reply_via_http(
+    backend_url: str, chatbot_id: str, chat_id: int, user_id: int, user_message: str
+) -> str:
+    """Call a remote backend's /chat/telegram over the shared pooled client."""
+    client = http_clients.get("internal")
+    response = await client.post(
+        f"{backend_url}/chat/telegram",
+        json={
+            "chatbot_id": chatbot_id,
+            "session_id": f"tg_{chat_id}",
+            "message": user_message,
+            "visitor_id": f"telegram_{user_id}",
+            "history": [],
+        },
+        timeout=60.0,
+    )
+    if response.status_code != 200:
+        logger.error("Backend returned %s: %s", response.status_code, response.text)
+        return "😞 I'm having trouble connecting right now. Please try again later."
+    return response.json().get("reply", "")
 
 
-async def start_bot(chatbot_id: str, token: str, business_name: str, backend_url: str = "http://localhost:8000"):
-    """Start a Telegram bot for a specific chatbot using polling."""
+async def start_bot(chatbot_id: str, token: str, business_name: str, backend_url: Optional[str] = None):
+    """
+    Start a Telegram bot for a specific chatbot: long-polling, or in webhook
+    mode register the shared webhook for it. Replies are generated
+    in-process unless *backend_url* is given.
+    """
     if chatbot_id in _running_bots:
         logger.info("Bot for chatbot %s is already running, restarting...", chatbot_id)
         await stop_bot(chatbot_id)
 
+    webhook = settings.TELEGRAM_MODE == "webhook"
+    if webhook and not (settings.TELEGRAM_WEBHOOK_URL and settings.TELEGRAM_WEBHOOK_SECRET):
+        logger.error(
+            "TELEGRAM_MODE=webhook needs TELEGRAM_WEBHOOK_URL and TELEGRAM_WEBHOOK_SECRET; "
+            "not starting bot %s", chatbot_id,
+        )
+        return False
+
     # Retry up to 3 times (Telegram API can be slow from certain regions)
     max_retries = 3
     for attempt in range(1, max_retries + 1):
         try:
-            # Increase timeouts to handle slow connections to api.telegram.org
-            app = (
-                Application.builder()
-                .token(token)
-                .connect_timeout(30.0)
-                .read_timeout(30.0)
-                .write_timeout(30.0)
-                .pool_timeout(30.0)
-                .build()
-            )
-
-            # Store metadata in bot_data so handlers can access it
-            app.bot_data["chatbot_id"] = chatbot_id
-            app.bot_data["business_name"] = business_name
-            app.bot_data["backend_url"] = backend_url
+            app = _build_app(chatbot_id, token, business_name, backend_url, polling=not webhook)
 
-            # Register handlers
-            app.add_handler(CommandHandler("start", _handle_start))
-            app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, _handle_message))
-
-            # Initialize and start polling
+            # Initialize and start polling (or register the webhook)
             logger.info("Connecting to Telegram API (attempt %d/%d)...", attempt, max_retries)
             await app.initialize()
             await app.start()
-            await app.updater.start_polling(drop_pending_updates=True)
+            if webhook:
+                await app.bot.set_webhook(
+                    url=webhook_url(chatbot_id),
+                    secret_token=webhook_secret(chatbot_id),
+                    allowed_updates=["message"],
+                    drop_pending_updates=True,
+                )
+            else:
+                await app.updater.start_polling(drop_pending_updates=True)
 
             _running_bots[chatbot_id] = app
+            if webhook:
+                _webhook_recheck[chatbot_id] = time.monotonic() + WEBHOOK_APP_TTL
+            _failed_tokens.pop(chatbot_id, None)
             logger.info("✅ Telegram bot started for chatbot %s (%s)", chatbot_id, business_name)
             return True
 
@@ -127,22 +242,209 @@ async def start_bot(chatbot_id: str, token: str, business_name: str, backend_url
                 await asyncio.sleep(5)  # wait before retrying
             else:
                 logger.exception("Failed to start Telegram bot for chatbot %s after %d attempts", chatbot_id, max_retries)
+                _failed_tokens[chatbot_id] = token
                 return False
 
 
-async def stop_bot(chatbot_id: str):
-    """Stop a running Telegram bot."""
+async def stop_bot(chatbot_id: str, unregister: bool = False, token: Optional[str] = None):
+    """
+    Stop a running Telegram bot. With *unregister* (the chatbot was
+    disconnected) its webhook is removed too – using *token* if another
+    worker was serving the bot and this one holds no Application for it.
+    """
     app = _running_bots.pop(chatbot_id, None)
-    if app:
-        try:
+    _webhook_recheck.pop(chatbot_id, None)
+    webhook = unregister and settings.TELEGRAM_MODE == "webhook"
+    if app is None:
+        if webhook and token:
+            try:
+                async with Bot(token) as bot:
+                    await bot.delete_webhook()
+                logger.info("⏹ Telegram webhook removed for chatbot %s", chatbot_id)
+            except Exception:
+                logger.exception("Error removing Telegram webhook for chatbot %s", chatbot_id)
+        return
+    try:
+        if webhook:
+            await app.bot.delete_webhook()
+        if app.updater is not None:
             await app.updater.stop()
-            await app.stop()
-            await app.shutdown()
-            logger.info("⏹ Telegram bot stopped for chatbot %s", chatbot_id)
-        except Exception:
-            logger.exception("Error stopping Telegram bot for chatbot %s", chatbot_id)
+        await app.stop()
+        await app.shutdown()
+        logger.info("⏹ Telegram bot stopped for chatbot %s", chatbot_id)
+    except Exception:
+        logger.exception("Error stopping Telegram bot for chatbot %s", chatbot_id)
+
+
+async def stop_all() -> None:
+    """Stop every bot this process runs (shutdown; webhooks stay registered)."""
+    await get_chat_dispatcher().close()
+    await asyncio.gather(*(stop_bot(chatbot_id) for chatbot_id in list(_running_bots)))
 
 
 def get_running_bots() -> list:
     """Return list of chatbot_ids with active Telegram bots."""
     return list(_running_bots.keys())
+
+
+def webhook_url(chatbot_id: str) -> str:
+    return f"{settings.TELEGRAM_WEBHOOK_URL.rstrip('/')}/telegram/webhook/{chatbot_id}"
+
+
+def webhook_secret(chatbot_id: str) -> str:
+    """
+    X-Telegram-Bot-Api-Secret-Token for *chatbot_id*'s webhook. Derived per
+    bot, so one bot's secret can't be replayed against another's endpoint.
+    """
+    key = settings.TELEGRAM_WEBHOOK_SECRET.encode()
+    return hmac.new(key, chatbot_id.encode(), hashlib.sha256).hexdigest()
+
+
+async def check_token(token: str) -> bool:
+    """Whether *token* is a valid bot token (one getMe call)."""
+    try:
+        async with Bot(token):
+            return True
+    except Exception as exc:
+        logger.info("Telegram token rejected: %s", exc)
+        return False
+
+
+# ── Registrations ────────────────────────────────────────────────────────────
+
+
+async def load_registrations(chatbot_id: Optional[str] = None) -> List[BotRegistration]:
+    """Active chatbots with a Telegram token, from the dashboard's "Chatbot" table."""
+    query = (
+        'SELECT id, "businessName", "telegramToken" FROM "Chatbot" '
+        'WHERE "telegramToken" IS NOT NULL AND "telegramToken" <> \'\' AND "isActive"'
+    )
+    params: Dict[str, Any] = {}
+    if chatbot_id is not None:
+        query += " AND id = :id"
+        params["id"] = chatbot_id
+    async with engine.connect() as conn:
+        rows = (await conn.execute(sa.text(query), params)).all()
+    return [BotRegistration(row[0], row[2], row[1]) for row in rows]
+
+
+async def sync_bots() -> None:
+    """
+    Make the bots polled here match the registrations in this shard: start
+    new ones and ones whose token changed, stop ones that were removed.
+    """
+    wanted = {r.chatbot_id: r for r in await load_registrations() if owns(r.chatbot_id)}
+
+    stale = [cid for cid in _running_bots if cid not in wanted]
+    await asyncio.gather(*(stop_bot(cid) for cid in stale))
+
+    gate = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+    async def _start(reg: BotRegistration) -> None:
+        async with gate:
+            await start_bot(reg.chatbot_id, reg.token, reg.business_name)
+
+    todo = [
+        reg for cid, reg in wanted.items()
+        if _failed_tokens.get(cid) != reg.token
+        and (cid not in _running_bots or _running_bots[cid].bot.token != reg.token)
+    ]
+    await asyncio.gather(*(_start(reg) for reg in todo))
+    if stale or todo:
+        logger.info(
+            "Telegram shard %d/%d: %d bots running (+%d, -%d)",
+            settings.TELEGRAM_SHARD_INDEX, settings.TELEGRAM_SHARD_COUNT,
+            len(_running_bots), len(todo), len(stale),
+        )
+
+
+async def run_poller(interval: float = settings.TELEGRAM_SYNC_SECONDS) -> None:
+    """Restore this shard's bots, then re-sync every *interval* seconds (0 = once)."""
+    while True:
+        try:
+            await sync_bots()
+        except Exception:
+            logger.exception("Telegram sync failed")
+        if interval <= 0:
+            return
+        await asyncio.sleep(interval)
+
+
+# ── Webhook mode ─────────────────────────────────────────────────────────────
+
+
+async def handle_webhook_update(chatbot_id: str, payload: Dict[str, Any]) -> bool:
+    """
+    Queue one webhook update for *chatbot_id*'s Application; False if the
+    chatbot has no registered bot. Handlers run on the Application's own
+    task, so the webhook request returns immediately.
+    """
+    app = await _webhook_app(chatbot_id)
+    if app is None:
+        return False
+    await app.update_queue.put(Update.de_json(payload, app.bot))
+    return True
+
+
+async def _webhook_app(chatbot_id: str) -> Optional[Application]:
+    """
+    The Application that serves a webhook bot, built from the database on
+    first use and re-checked every WEBHOOK_APP_TTL seconds, so a bot that was
+    disconnected, deactivated or given a new token on another worker stops
+    being served here with the old one.
+    """
+    app = _running_bots.get(chatbot_id)
+    if app is not None and time.monotonic() < _webhook_recheck.get(chatbot_id, 0.0):
+        return app
+    lock = _webhook_locks.setdefault(chatbot_id, asyncio.Lock())
+    async with lock:
+        app = _running_bots.get(chatbot_id)
+        if app is not None and time.monotonic() < _webhook_recheck.get(chatbot_id, 0.0):
+            return app
+        registrations = await load_registrations(chatbot_id)
+        reg = registrations[0] if registrations else None
+        if app is not None and (reg is None or app.bot.token != reg.token):
+            await stop_bot(chatbot_id)
+            app = None
+        if reg is None:
+            _webhook_locks.pop(chatbot_id, None)
+            return None
+        if app is None:
+            app = _build_app(reg.chatbot_id, reg.token, reg.business_name, None, polling=False)
+            await app.initialize()
+            await app.start()
+            _running_bots[chatbot_id] = app
+        app.bot_data["business_name"] = reg.business_name
+        _webhook_recheck[chatbot_id] = time.monotonic() + WEBHOOK_APP_TTL
+        return app
+
+
+def _build_app(
+    chatbot_id: str,
+    token: str,
+    business_name: str,
+    backend_url: Optional[str],
+    polling: bool,
+) -> Application:
+    # Increase timeouts to handle slow connections to api.telegram.org
+    builder = (
+        Application.builder()
+        .token(token)
+        .connect_timeout(30.0)
+        .read_timeout(30.0)
+        .write_timeout(30.0)
+        .pool_timeout(30.0)
+    )
+    if not polling:
+        builder = builder.updater(None)
+    app = builder.build()
+
+    # Store metadata in bot_data so handlers can access it
+    app.bot_data["chatbot_id"] = chatbot_id
+    app.bot_data["business_name"] = business_name
+    app.bot_data["backend_url"] = backend_url
+
+    # Register handlers
+    app.add_handler(CommandHandler("start", _handle_start))
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, _handle_message))
+    return app
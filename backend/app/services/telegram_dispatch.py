@@ -0,0 +1,245 @@
+"""
+Telegram Dispatch – per-chat ordering, coalescing and a global concurrency
+limit for Telegram replies, plus replies that stream into one message.
+
+Every incoming text goes into its chat's mailbox (keyed by chatbot and chat
+id) and the update handler returns at once. Each mailbox is drained by a
+single task, so a chat's replies are generated one at a time and in order.
+Messages that arrive within TELEGRAM_COALESCE_MS of each other, or while
+the previous reply is still being generated, are joined into one query –
+per sender, so in a group chat each member's messages are answered as
+their own query, in the order the members first spoke. Reply generation
+across all bots is capped at TELEGRAM_MAX_CONCURRENCY; chats beyond that
+wait for a slot.
+
+Mailboxes live in this process. That is enough for polling (each bot is
+polled by exactly one process), but in webhook mode updates for one chat
+must all reach the same process, so run the API with a single worker
+there (scale out with TELEGRAM_MODE=worker shards instead).
+
+StreamingReply sends the first tokens as a message and then edits it in
+place at most every TELEGRAM_EDIT_INTERVAL_SECONDS (Telegram throttles
+edits), continuing in a new message past Telegram's length limit.
+"""
+import asyncio
+import logging
+from collections import deque
+from contextlib import suppress
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from telegram.constants import ChatAction
+from telegram.error import BadRequest, RetryAfter
+
+from app.config import settings
+from app.services.metrics import TELEGRAM_CHATS_WAITING, TELEGRAM_MESSAGES, TELEGRAM_REPLIES_ACTIVE
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_LIMIT = 4000     # Telegram allows 4096 characters per message
+TYPING_REFRESH = 4.0     # Telegram clears "typing…" after about five seconds
+
+ChatKey = Tuple[str, int]   # (chatbot_id, chat_id)
+
+
+@dataclass
+class IncomingMessage:
+    text: str
+    user_id: int
+    message_id: int
+
+
+ReplyHandler = Callable[[ChatKey, List[IncomingMessage]], Awaitable[None]]
+
+
+class _Mailbox:
+    def __init__(self, handler: ReplyHandler):
+        self.handler = handler
+        self.pending: Deque[IncomingMessage] = deque()
+        self.task: Optional["asyncio.Task[None]"] = None
+
+
+class ChatDispatcher:
+    def __init__(
+        self,
+        max_concurrency: int = settings.TELEGRAM_MAX_CONCURRENCY,
+        coalesce_window: float = settings.TELEGRAM_COALESCE_MS / 1000,
+        mailbox_size: int = settings.TELEGRAM_MAILBOX_SIZE,
+    ):
+        self.coalesce_window = coalesce_window
+        self.mailbox_size = mailbox_size
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._mailboxes: Dict[ChatKey, _Mailbox] = {}
+
+    def submit(self, key: ChatKey, message: IncomingMessage, handler: ReplyHandler) -> None:
+        """Queue *message* for its chat; *handler* answers each (coalesced) batch."""
+        box = self._mailboxes.get(key)
+        if box is None:
+            box = self._mailboxes[key] = _Mailbox(handler)
+        if len(box.pending) >= self.mailbox_size:
+            box.pending.popleft()
+            TELEGRAM_MESSAGES.labels("dropped").inc()
+        box.pending.append(message)
+        if box.task is None:
+            box.task = asyncio.create_task(self._drain(key, box))
+
+    async def close(self) -> None:
+        tasks = [box.task for box in self._mailboxes.values() if box.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _drain(self, key: ChatKey, box: _Mailbox) -> None:
+        try:
+            while box.pending:
+                if self.coalesce_window > 0:
+                    await asyncio.sleep(self.coalesce_window)
+                batch = list(box.pending)
+                box.pending.clear()
+                for group in _by_sender(batch):
+                    if len(group) > 1:
+                        TELEGRAM_MESSAGES.labels("coalesced").inc(len(group) - 1)
+                    await self._answer(key, box.handler, group)
+        finally:
+            if self._mailboxes.get(key) is box:
+                del self._mailboxes[key]
+
+    async def _answer(self, key: ChatKey, handler: ReplyHandler, group: List[IncomingMessage]) -> None:
+        TELEGRAM_CHATS_WAITING.inc()
+        try:
+            await self._slots.acquire()
+        finally:
+            TELEGRAM_CHATS_WAITING.dec()
+        TELEGRAM_REPLIES_ACTIVE.inc()
+        try:
+            await handler(key, group)
+            TELEGRAM_MESSAGES.labels("answered").inc()
+        except Exception:
+            logger.exception("Telegram reply failed for chatbot %s chat %s", *key)
+        finally:
+            TELEGRAM_REPLIES_ACTIVE.dec()
+            self._slots.release()
+
+
+def _by_sender(batch: List[IncomingMessage]) -> List[List[IncomingMessage]]:
+    """Split a coalesced batch per sender, in the order senders first appear."""
+    groups: Dict[int, List[IncomingMessage]] = {}
+    for message in batch:
+        groups.setdefault(message.user_id, []).append(message)
+    return list(groups.values())
+
+
+class StreamingReply:
+    """
+    Usage::
+
+        reply = StreamingReply(bot, chat_id)
+        reply.start_typing()
+        async for delta in deltas:
+            await reply.feed(delta)
+        await reply.finish("Sorry, …")
+    """
+
+    def __init__(
+        self,
+        bot: Any,
+        chat_id: int,
+        edit_interval: float = settings.TELEGRAM_EDIT_INTERVAL_SECONDS,
+        limit: int = MESSAGE_LIMIT,
+    ):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.edit_interval = edit_interval
+        self.limit = limit
+        self.messages_sent = 0
+        self._text = ""                  # text of the message being streamed
+        self._shown = ""                 # what Telegram currently shows for it
+        self._message_id: Optional[int] = None
+        self._last_edit = 0.0
+        self._typing: Optional["asyncio.Task[None]"] = None
+
+    def start_typing(self) -> None:
+        """Keep "typing…" visible until the first text is sent."""
+        if self._typing is None:
+            self._typing = asyncio.create_task(self._keep_typing())
+
+    async def feed(self, delta: str) -> None:
+        self._text += delta
+        while len(self._text) > self.limit:
+            cut = _split_point(self._text, self.limit)
+            head, self._text = self._text[:cut], self._text[cut:].lstrip()
+            await self._show(head, final=True)
+            self._message_id, self._shown = None, ""
+        loop = asyncio.get_running_loop()
+        if loop.time() - self._last_edit >= self.edit_interval:
+            await self._show(self._text)
+
+    async def finish(self, fallback: str) -> None:
+        """Show the complete text (or *fallback* if nothing was generated)."""
+        if not self._text.strip() and not self.messages_sent:
+            self._text = fallback
+        await self._show(self._text, final=True)
+        self.close()
+
+    def close(self) -> None:
+        if self._typing is not None:
+            self._typing.cancel()
+            self._typing = None
+
+    async def _show(self, text: str, final: bool = False) -> None:
+        if not text.strip() or text == self._shown:
+            return
+        for attempt in range(2):
+            try:
+                if self._message_id is None:
+                    message = await self.bot.send_message(chat_id=self.chat_id, text=text)
+                    self._message_id = message.message_id
+                    self.messages_sent += 1
+                    self.close()
+                else:
+                    await self.bot.edit_message_text(
+                        text=text, chat_id=self.chat_id, message_id=self._message_id
+                    )
+                self._shown = text
+                break
+            except RetryAfter as exc:
+                if not final or attempt:
+                    break  # a later edit (or the final one) catches up
+                await asyncio.sleep(_seconds(exc.retry_after))
+            except BadRequest as exc:
+                if "not modified" not in str(exc).lower():
+                    raise
+                self._shown = text
+                break
+        self._last_edit = asyncio.get_running_loop().time()
+
+    async def _keep_typing(self) -> None:
+        while True:
+            with suppress(Exception):
+                await self.bot.send_chat_action(chat_id=self.chat_id, action=ChatAction.TYPING)
+            await asyncio.sleep(TYPING_REFRESH)
+
+
+def _split_point(text: str, limit: int) -> int:
+    """Cut at the last paragraph, line or word break before *limit*, if there is one."""
+    for sep in ("\n\n", "\n", " "):
+        cut = text.rfind(sep, limit // 2, limit)
+        if cut > 0:
+            return cut
+    return limit
+
+
+def _seconds(value: Any) -> float:
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+
+_chat_dispatcher: Optional[ChatDispatcher] = None
+
+
+def get_chat_dispatcher() -> ChatDispatcher:
+    """Process-wide dispatcher shared by every bot, so the concurrency limit is global."""
+    global _chat_dispatcher
+    if _chat_dispatcher is None:
+        _chat_dispatcher = ChatDispatcher()
+    return _chat_dispatcher
@@ -0,0 +1,174 @@
+"""
+Telemetry – per-reply usage records (retrieved chunks, tokens, latency)
+written to Postgres without touching chat latency.
+
+The chat path calls record(), which only appends to a bounded in-memory
+queue and never waits: when the queue is full the record is dropped and
+counted (telemetry_events_total{outcome="dropped_full"}). A background
+task started in main.py's lifespan drains the queue and writes up to
+TELEMETRY_BATCH_SIZE records per multi-row INSERT, at least every
+TELEMETRY_FLUSH_SECONDS while records are waiting. A failed batch is
+dropped and counted rather than retried, so a database outage can't grow
+memory. Shutdown flushes what is left.
+"""
+import asyncio
+import logging
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.config import settings
+from app.database import Base, engine
+from app.services.metrics import TELEMETRY_EVENTS, TELEMETRY_QUEUE, RequestTrace
+
+logger = logging.getLogger(__name__)
+
+# asyncpg caps a statement at 32767 bind parameters
+_MAX_PARAMS = 32767
+
+
+class ChatUsage(Base):
+    __tablename__ = "chat_usage"
+
+    id: Mapped[int] = mapped_column(sa.BigInteger, primary_key=True, autoincrement=True)
+    created_at: Mapped[datetime] = mapped_column(sa.DateTime, index=True)   # UTC
+    chatbot_id: Mapped[str] = mapped_column(sa.Text, index=True)
+    session_id: Mapped[str] = mapped_column(sa.Text)
+    mode: Mapped[str] = mapped_column(sa.Text)                # stream | complete | coalesced
+    retrieval: Mapped[str] = mapped_column(sa.Text)           # retrieved | skipped_rules | skipped_centroid
+    retrieved_chunks: Mapped[List[str]] = mapped_column(ARRAY(sa.Text))
+    prompt_tokens: Mapped[int] = mapped_column(sa.Integer)
+    completion_tokens: Mapped[int] = mapped_column(sa.Integer)
+    ttft_ms: Mapped[Optional[int]] = mapped_column(sa.Integer, nullable=True)
+    total_ms: Mapped[int] = mapped_column(sa.Integer)
+
+
+@dataclass
+class UsageEvent:
+    chatbot_id: str
+    session_id: str
+    mode: str
+    retrieval: str
+    retrieved_chunks: List[str] = field(default_factory=list)
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    ttft_ms: Optional[int] = None
+    total_ms: int = 0
+    created_at: datetime = field(
+        default_factory=lambda: datetime.now(timezone.utc).replace(tzinfo=None)
+    )
+
+    @classmethod
+    def from_trace(cls, trace: RequestTrace, mode: str) -> "UsageEvent":
+        ttft = trace.spans.get("llm_ttft")
+        return cls(
+            chatbot_id=trace.chatbot_id,
+            session_id=trace.session_id,
+            mode=mode,
+            retrieval=trace.retrieval,
+            retrieved_chunks=list(trace.retrieved),
+            prompt_tokens=trace.tokens.get("prompt", 0),
+            completion_tokens=trace.tokens.get("completion", 0),
+            ttft_ms=None if ttft is None else round(ttft * 1000),
+            total_ms=round(trace.spans.get("total", trace.since_start()) * 1000),
+        )
+
+
+class TelemetryWriter:
+    def __init__(
+        self,
+        max_queue: int = settings.TELEMETRY_QUEUE_SIZE,
+        batch_size: int = settings.TELEMETRY_BATCH_SIZE,
+        flush_interval: float = settings.TELEMETRY_FLUSH_SECONDS,
+    ):
+        columns = len(ChatUsage.__table__.columns)
+        self.batch_size = max(1, min(batch_size, _MAX_PARAMS // columns))
+        self.flush_interval = flush_interval
+        self._queue: "asyncio.Queue[UsageEvent]" = asyncio.Queue(maxsize=max_queue)
+        self._stopping = False
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.written = 0
+        self.dropped = 0
+
+    def record(self, event: UsageEvent) -> bool:
+        """Queue *event* for writing; never blocks. False if it had to be dropped."""
+        if self._stopping:
+            return False
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self._drop("dropped_full", 1)
+            return False
+        TELEMETRY_QUEUE.set(self._queue.qsize())
+        return True
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        while not (self._stopping and self._queue.empty()):
+            batch = await self._next_batch()
+            if batch:
+                await self._write(batch)
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Stop accepting records and flush what is queued."""
+        self._stopping = True
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            self._drop("dropped_error", self._queue.qsize())
+            logger.warning("Telemetry: shutdown flush timed out")
+
+    async def _next_batch(self) -> List[UsageEvent]:
+        """Wait for a first record, then gather more until the batch is full or the interval ends."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        batch: List[UsageEvent] = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0 or self._stopping:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        TELEMETRY_QUEUE.set(self._queue.qsize())
+        return batch
+
+    async def _write(self, batch: List[UsageEvent]) -> None:
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(sa.insert(ChatUsage).values([asdict(e) for e in batch]))
+        except Exception as exc:
+            self._drop("dropped_error", len(batch))
+            logger.warning("Telemetry: dropped %d usage records (%s)", len(batch), exc)
+            return
+        self.written += len(batch)
+        TELEMETRY_EVENTS.labels("written").inc(len(batch))
+
+    def _drop(self, outcome: str, count: int) -> None:
+        self.dropped += count
+        TELEMETRY_EVENTS.labels(outcome).inc(count)
+
+
+_telemetry_writer: Optional[TelemetryWriter] = None
+
+
+def get_telemetry_writer() -> TelemetryWriter:
+    global _telemetry_writer
+    if _telemetry_writer is None:
+        _telemetry_writer = TelemetryWriter()
+    return _telemetry_writer
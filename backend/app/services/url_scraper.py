@@ -28,6 +28,14 @@ Changelog vs. original:
   [OPT]  Shared _extract_text() helper used by both fetch paths (consistent stripping)
   [OPT]  O(1) set-based deduplication throughout (no more O(n) list scans)
   [OPT]  Log verbosity reduced – per-sitemap counts demoted to DEBUG
+  [OPT]  Crawls share one pooled keep-alive client (http_clients registry)
+  [OPT]  SimHash near-duplicate detection drops pages that differ only by a
+         date, banner or breadcrumb (NEAR_DUPLICATE_THRESHOLD)
+  [OPT]  iter_pages() async generator yields pages as they are fetched so
+         ingestion can index a site while it is still being crawled
+  [OPT]  JS-dependence classifier scores every fetched page; only pages that
+         score above JS_RENDER_THRESHOLD are queued for Playwright rendering
+         (replaces the unconditional render + hardcoded pricing-path probes)
 """
 
 from __future__ import annotations
@@ -36,13 +44,19 @@ import asyncio
 import hashlib
 import logging
 import re
+import time
 import xml.etree.ElementTree as ET
 from dataclasses import dataclass, field
+from typing import AsyncIterator
 from urllib.parse import urljoin, urlparse, urldefrag
 
 import httpx
 from bs4 import BeautifulSoup
 
+from app.config import settings
+from app.services.http_clients import http_clients
+from app.utils.simhash import SimHashIndex
+
 logger = logging.getLogger(__name__)
 
 # ---------------------------------------------------------------------------
@@ -90,6 +104,21 @@ TIMEOUT       = 15   # seconds per request
 MAX_RETRIES   = 3    # retry attempts for transient failures
 RETRY_BACKOFF = 2.0  # base seconds for exponential back-off
 
+JS_RENDER_THRESHOLD = 0.5   # pages scoring >= this are rendered with Playwright
+MAX_JS_RENDERS      = 10    # hard cap on Playwright renders per crawl
+JS_RENDER_ESTIMATE  = 12.0  # seconds per render, used until a real one is timed
+
+# Mount points left empty in the static HTML by SPA frameworks
+_SPA_ROOT_IDS = {"root", "app", "__next", "__nuxt", "___gatsby", "svelte"}
+_SPA_ROOT_ATTRS = ("ng-app", "data-reactroot", "data-server-rendered", "data-v-app")
+
+# Widgets whose content is typically hidden until JS switches panes
+_INTERACTIVE_CLASSES = re.compile(
+    r"\b(swiper|carousel|slick|tab-pane|tab-content|accordion|pricing-tab)",
+    re.IGNORECASE,
+)
+_NOSCRIPT_JS_HINT = re.compile(r"javascript|enable js|browser", re.IGNORECASE)
+
 
 # ---------------------------------------------------------------------------
 # Data containers
@@ -102,6 +131,94 @@ class _RobotsInfo:
     crawl_delay:  float | None = None
 
 
+@dataclass
+class _JsSignals:
+    """Raw-HTML signals collected before boilerplate stripping."""
+    script_chars:  int  = 0      # inline script bytes
+    script_tags:   int  = 0      # <script> elements, inline or external
+    spa_root:      bool = False  # empty framework mount point present
+    noscript_hint: bool = False  # <noscript> asks the visitor to enable JS
+    widgets:       int  = 0      # tabs / carousels / accordions
+
+    def score(self, text_chars: int) -> float:
+        """
+        Heuristic JS-dependence score in [0, 1] for a page whose static HTML
+        yielded *text_chars* characters of visible text.
+        """
+        score = 0.0
+        if text_chars < 200:
+            score += 0.35
+        elif text_chars < 800:
+            score += 0.15
+
+        script_weight = self.script_chars + 500 * self.script_tags
+        ratio = script_weight / max(text_chars, 1)
+        if ratio >= 5:
+            score += 0.25
+        elif ratio >= 1:
+            score += 0.1
+
+        if self.spa_root:
+            score += 0.35
+        if self.noscript_hint:
+            score += 0.2
+        if self.widgets >= 2:
+            score += 0.2
+        return min(score, 1.0)
+
+
+@dataclass
+class CrawledPage:
+    """One unique page yielded by URLScraper.iter_pages()."""
+    url:      str
+    text:     str
+    js_score: float = 0.0
+
+    @property
+    def needs_js(self) -> bool:
+        return self.js_score >= JS_RENDER_THRESHOLD
+
+
+@dataclass
+class CrawlReport:
+    """
+    Per-crawl statistics. Pass an instance to crawl() to have it filled in,
+    then hand it to render_js_pages() for the selective Playwright phase.
+    """
+    pages_crawled:     int              = 0
+    duplicate_pages:   int              = 0
+    near_duplicates:   int              = 0
+    chars_skipped:     int              = 0
+    js_scores:         dict[str, float] = field(default_factory=dict)
+    js_candidates:     list[str]        = field(default_factory=list)
+    js_rendered:       int              = 0
+    js_render_seconds: float            = 0.0
+
+    @property
+    def js_skipped(self) -> int:
+        """Pages that did NOT need a Playwright render."""
+        return max(len(self.js_scores) - self.js_rendered, 0)
+
+    @property
+    def seconds_saved(self) -> float:
+        """Estimated render time avoided by skipping static pages."""
+        per_page = (
+            self.js_render_seconds / self.js_rendered
+            if self.js_rendered else JS_RENDER_ESTIMATE
+        )
+        return self.js_skipped * per_page
+
+    def summary(self) -> str:
+        return (
+            f"pages={self.pages_crawled} duplicates={self.duplicate_pages} "
+            f"near_duplicates={self.near_duplicates} "
+            f"chars_skipped={self.chars_skipped} "
+            f"js_rendered={self.js_rendered}/{len(self.js_scores)} "
+            f"render_time={self.js_render_seconds:.1f}s "
+            f"saved≈{self.seconds_saved:.0f}s"
+        )
+
+
 # ---------------------------------------------------------------------------
 # Module-level pure helpers
 # ---------------------------------------------------------------------------
@@ -158,6 +275,42 @@ def _extract_text(soup: BeautifulSoup) -> str:
     return "\n".join(line for line in raw.splitlines() if line.strip())
 
 
+def _js_signals(soup: BeautifulSoup) -> _JsSignals:
+    """
+    Collect JS-dependence signals from a freshly parsed page.
+    Must run before _extract_text(), which decomposes <script>/<noscript>.
+    """
+    signals = _JsSignals()
+
+    for script in soup.find_all("script"):
+        signals.script_tags += 1
+        signals.script_chars += len(script.string or "")
+
+    for el in soup.find_all(id=True):
+        if el.get("id") in _SPA_ROOT_IDS and len(el.get_text(strip=True)) < 50:
+            signals.spa_root = True
+            break
+    if not signals.spa_root:
+        signals.spa_root = any(soup.find(attrs={a: True}) for a in _SPA_ROOT_ATTRS)
+
+    signals.noscript_hint = any(
+        _NOSCRIPT_JS_HINT.search(ns.get_text(" ", strip=True))
+        for ns in soup.find_all("noscript")
+    )
+
+    signals.widgets = len(soup.find_all(attrs={"role": "tab"})) + len(
+        soup.find_all(class_=_INTERACTIVE_CLASSES)
+    )
+    return signals
+
+
+def _scraper_client() -> httpx.AsyncClient:
+    """Process-wide pooled client for crawling (keep-alive across crawls)."""
+    return http_clients.get(
+        "scraper", headers=_HEADERS, follow_redirects=True, timeout=TIMEOUT
+    )
+
+
 async def _fetch_with_retry(
     client:      httpx.AsyncClient,
     url:         str,
@@ -229,23 +382,26 @@ class URLScraper:
 
         # Full site crawl
         combined_text, page_count = await scraper.crawl("https://example.com")
+
+        # Full site crawl + Playwright only for JS-dependent pages
+        report = CrawlReport()
+        combined_text, page_count = await scraper.crawl(url, report=report)
+        js_text = await scraper.render_js_pages(report)
     """
 
     # ── Public API ─────────────────────────────────────────────────────────
 
     async def scrape(self, url: str, timeout: int = TIMEOUT) -> str:
         """Scrape a single page and return clean text."""
-        async with httpx.AsyncClient(
-            headers=_HEADERS, follow_redirects=True, timeout=timeout
-        ) as client:
-            text = await self._fetch_page(client, url, timeout=timeout)
-            logger.info("Scraped %s: %d chars", url, len(text))
-            return text
+        text = await self._fetch_page(_scraper_client(), url, timeout=timeout)
+        logger.info("Scraped %s: %d chars", url, len(text))
+        return text
 
     async def crawl(
         self,
         seed_url:  str,
         max_pages: int = 50,
+        report:    CrawlReport | None = None,
     ) -> tuple[str, int]:
         """
         Crawl the entire website starting from *seed_url*.
@@ -254,100 +410,186 @@ class URLScraper:
             (combined_text, pages_crawled)
 
         *max_pages* caps the number of **unique-content** pages extracted,
-        not merely the number of URLs visited.
+        not merely the number of URLs visited. If *report* is given it is
+        filled with per-page JS-dependence scores and the render queue.
         """
+        texts: list[str] = []
+        async for page in self.iter_pages(seed_url, max_pages, report):
+            if page.text:
+                texts.append(f"--- PAGE: {page.url} ---\n{page.text}")
+
+        combined = "\n\n".join(texts)
+        logger.info("Crawled %s: %d total chars", seed_url, len(combined))
+        return combined, len(texts)
+
+    async def iter_pages(
+        self,
+        seed_url:  str,
+        max_pages: int = 50,
+        report:    CrawlReport | None = None,
+    ) -> AsyncIterator[CrawledPage]:
+        """
+        Crawl like crawl() but yield each unique page as soon as it is
+        fetched, so callers can index a site while it is still being crawled.
+
+        Pages with no static text are still yielded when they score as
+        JS-dependent, so a downstream stage can render them.
+        """
+        report = report if report is not None else CrawlReport()
         parsed = urlparse(seed_url)
         base   = f"{parsed.scheme}://{parsed.netloc}"
         sem    = asyncio.Semaphore(CONCURRENCY)
 
-        async with httpx.AsyncClient(
-            headers=_HEADERS, follow_redirects=True, timeout=TIMEOUT
-        ) as client:
-
-            # ── Phase 1: parse robots.txt once for sitemaps + Crawl-delay ──
-            robots = await self._parse_robots(client, base)
-            if robots.crawl_delay:
-                logger.info(
-                    "Honouring robots.txt Crawl-delay: %.1fs", robots.crawl_delay
-                )
+        client = _scraper_client()
 
-            # ── Phase 2: discover all URLs via sitemaps ────────────────────
-            sitemap_urls = await self._discover_from_sitemaps(
-                client, base, robots.sitemap_urls
-            )
+        # ── Phase 1: parse robots.txt once for sitemaps + Crawl-delay ──
+        robots = await self._parse_robots(client, base)
+        if robots.crawl_delay:
             logger.info(
-                "Sitemap discovery for %s: found %d URLs", base, len(sitemap_urls)
+                "Honouring robots.txt Crawl-delay: %.1fs", robots.crawl_delay
             )
 
-            # ── Phase 3: build the initial crawl queue ─────────────────────
-            queue:   list[str] = []
-            queued:  set[str]  = set()  # every URL ever enqueued – O(1) look-up
-
-            def _enqueue(u: str) -> None:
-                """Add *u* to the queue iff it hasn't been seen and is crawlable."""
-                if u not in queued and _is_crawlable(u):
-                    queued.add(u)
-                    queue.append(u)
-
-            # Seed URL goes through _is_crawlable just like every other URL
-            _enqueue(self._normalise(seed_url))
-            for u in sitemap_urls:
-                _enqueue(self._normalise(u))
-
-            visited:     set[str]  = set()  # URLs already fetched
-            texts:       list[str] = []
-            seen_hashes: set[str]  = set()  # content-hash dedup
-
-            # ── Phase 4: BFS fetch loop ────────────────────────────────────
-            while queue and len(texts) < max_pages:
-
-                # Pull up to CONCURRENCY items (semaphore is the throttle)
-                batch: list[str] = []
-                while queue and len(batch) < CONCURRENCY:
-                    u = queue.pop(0)
-                    if u not in visited:
-                        visited.add(u)
-                        batch.append(u)
-
-                if not batch:
-                    break
-
-                results = await asyncio.gather(
-                    *[
-                        self._crawl_page(
-                            client, sem, u, base, robots.crawl_delay
-                        )
-                        for u in batch
-                    ],
-                    return_exceptions=True,
-                )
-
-                for u, result in zip(batch, results):
-                    if isinstance(result, BaseException):
-                        logger.warning("Skipped %s: %s", u, result)
-                        continue
-
-                    page_text, links = result
+        # ── Phase 2: discover all URLs via sitemaps ────────────────────
+        sitemap_urls = await self._discover_from_sitemaps(
+            client, base, robots.sitemap_urls
+        )
+        logger.info(
+            "Sitemap discovery for %s: found %d URLs", base, len(sitemap_urls)
+        )
 
-                    if page_text:
-                        h = _content_hash(page_text)
-                        if h in seen_hashes:
-                            # e.g. /ABOUT and /ABOUT/index.html are identical
-                            logger.debug("Duplicate content skipped: %s", u)
-                        else:
-                            seen_hashes.add(h)
-                            texts.append(f"--- PAGE: {u} ---\n{page_text}")
+        # ── Phase 3: build the initial crawl queue ─────────────────────
+        queue:   list[str] = []
+        queued:  set[str]  = set()  # every URL ever enqueued – O(1) look-up
+
+        def _enqueue(u: str) -> None:
+            """Add *u* to the queue iff it hasn't been seen and is crawlable."""
+            if u not in queued and _is_crawlable(u):
+                queued.add(u)
+                queue.append(u)
+
+        # Seed URL goes through _is_crawlable just like every other URL
+        _enqueue(self._normalise(seed_url))
+        for u in sitemap_urls:
+            _enqueue(self._normalise(u))
+
+        visited:     set[str]  = set()  # URLs already fetched
+        seen_hashes: set[str]  = set()  # content-hash dedup
+        near_dups = SimHashIndex(settings.NEAR_DUPLICATE_THRESHOLD)
+
+        # ── Phase 4: BFS fetch loop ────────────────────────────────────
+        while queue and report.pages_crawled < max_pages:
+
+            # Pull up to CONCURRENCY items (semaphore is the throttle)
+            batch: list[str] = []
+            while queue and len(batch) < CONCURRENCY:
+                u = queue.pop(0)
+                if u not in visited:
+                    visited.add(u)
+                    batch.append(u)
+
+            if not batch:
+                break
+
+            results = await asyncio.gather(
+                *[
+                    self._crawl_page(
+                        client, sem, u, base, robots.crawl_delay
+                    )
+                    for u in batch
+                ],
+                return_exceptions=True,
+            )
 
-                    for link in links:
-                        _enqueue(link)
+            for u, result in zip(batch, results):
+                if isinstance(result, BaseException):
+                    logger.warning("Skipped %s: %s", u, result)
+                    continue
+
+                page_text, links, js_score = result
+                is_duplicate = False
+
+                for link in links:
+                    _enqueue(link)
+
+                if page_text:
+                    h = _content_hash(page_text)
+                    if h in seen_hashes:
+                        # e.g. /ABOUT and /ABOUT/index.html are identical
+                        logger.debug("Duplicate content skipped: %s", u)
+                        report.duplicate_pages += 1
+                        report.chars_skipped += len(page_text)
+                        is_duplicate = True
+                    elif not near_dups.add_if_new(page_text):
+                        # same page with a different date/banner/breadcrumb
+                        logger.debug("Near-duplicate content skipped: %s", u)
+                        seen_hashes.add(h)
+                        report.near_duplicates += 1
+                        report.chars_skipped += len(page_text)
+                        is_duplicate = True
+                    else:
+                        seen_hashes.add(h)
+                        report.pages_crawled += 1
+
+                if is_duplicate or js_score is None:
+                    continue
+                report.js_scores[u] = js_score
+                if page_text or js_score >= JS_RENDER_THRESHOLD:
+                    yield CrawledPage(url=u, text=page_text, js_score=js_score)
+
+        report.js_candidates = sorted(
+            (u for u, score in report.js_scores.items() if score >= JS_RENDER_THRESHOLD),
+            key=lambda u: report.js_scores[u],
+            reverse=True,
+        )[:MAX_JS_RENDERS]
 
-        pages_crawled = len(texts)
-        combined      = "\n\n".join(texts)
         logger.info(
-            "Crawled %s: %d unique pages, %d total chars",
-            seed_url, pages_crawled, len(combined),
+            "Crawled %s: %d unique pages, %d queued for JS render",
+            seed_url, report.pages_crawled, len(report.js_candidates),
         )
-        return combined, pages_crawled
+
+    async def render_js_pages(
+        self,
+        report:       CrawlReport,
+        wait_seconds: int = 5,
+    ) -> str:
+        """
+        Render only the pages crawl() flagged as JS-dependent with Playwright
+        and return their combined text. Render time is recorded on *report*.
+        """
+        parts: list[str] = []
+        for url in report.js_candidates:
+            js_text = await self.render_js_page(url, report, wait_seconds)
+            if js_text:
+                parts.append(f"--- JS-RENDERED CONTENT: {url} ---\n{js_text}")
+
+        return "\n\n".join(parts)
+
+    async def render_js_page(
+        self,
+        url:          str,
+        report:       CrawlReport,
+        wait_seconds: int = 5,
+    ) -> str:
+        """
+        Render a single page with Playwright, recording the time on *report*.
+        Returns "" when Playwright is unavailable or the page has no content.
+        """
+        try:
+            from app.services.js_scraper import scrape_with_js
+        except ImportError:
+            logger.info("Playwright not available – skipping JS rendering")
+            return ""
+
+        started = time.perf_counter()
+        try:
+            js_text = await scrape_with_js(url, wait_seconds=wait_seconds)
+        except Exception as exc:
+            logger.warning("JS render failed for %s: %s", url, exc)
+            js_text = ""
+        report.js_render_seconds += time.perf_counter() - started
+        report.js_rendered += 1
+
+        return js_text if len(js_text) > 100 else ""
 
     # ── robots.txt ─────────────────────────────────────────────────────────
 
@@ -507,10 +749,11 @@ class URLScraper:
         url:         str,
         base:        str,
         crawl_delay: float | None = None,
-    ) -> tuple[str, list[str]]:
+    ) -> tuple[str, list[str], float | None]:
         """
         Fetch one page inside the semaphore gate, then return
-        (clean_text, list_of_internal_links).
+        (clean_text, list_of_internal_links, js_dependence_score).
+        The score is None for non-HTML responses.
         """
         async with sem:
             resp = await _fetch_with_retry(client, url)
@@ -521,7 +764,7 @@ class URLScraper:
 
         ct = resp.headers.get("content-type", "")
         if "text/html" not in ct:
-            return "", []
+            return "", [], None
 
         soup = BeautifulSoup(resp.text, "html.parser")
 
@@ -535,7 +778,9 @@ class URLScraper:
             if _same_origin(absolute, base) and _is_crawlable(absolute):
                 links.append(absolute)
 
-        return _extract_text(soup), links
+        signals = _js_signals(soup)
+        text    = _extract_text(soup)
+        return text, links, signals.score(len(text))
 
     async def _fetch_page(
         self,
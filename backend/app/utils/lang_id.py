@@ -0,0 +1,150 @@
+"""
+Language ID – fast, deterministic language identification with no model
+download.
+
+1. Script: most writing systems map to one language (or a small family
+   told apart by a few distinctive letters), so counting code points by
+   Unicode block settles Cyrillic, Greek, Arabic, Hebrew, Indic, Thai,
+   Hangul, kana and Han text outright.
+2. Latin text is scored against short stop-word lists plus
+   language-specific diacritics.
+Confidence reflects how clearly the winner beats the runner-up and how
+much evidence there was; callers fall back to the session language when
+it is low (typically very short messages like "ok" or "merci").
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Tuple
+
+_WORD = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+# (first, last, script) – checked in order
+_SCRIPTS: List[Tuple[int, int, str]] = [
+    (0x0041, 0x024F, "latin"),
+    (0x0370, 0x03FF, "el"),
+    (0x0400, 0x04FF, "cyrillic"),
+    (0x0590, 0x05FF, "he"),
+    (0x0600, 0x06FF, "arabic"),
+    (0x0900, 0x097F, "hi"),
+    (0x0980, 0x09FF, "bn"),
+    (0x0A00, 0x0A7F, "pa"),
+    (0x0A80, 0x0AFF, "gu"),
+    (0x0B80, 0x0BFF, "ta"),
+    (0x0C00, 0x0C7F, "te"),
+    (0x0C80, 0x0CFF, "kn"),
+    (0x0D00, 0x0D7F, "ml"),
+    (0x0E00, 0x0E7F, "th"),
+    (0x3040, 0x30FF, "ja"),     # hiragana + katakana
+    (0x4E00, 0x9FFF, "han"),
+    (0xAC00, 0xD7AF, "ko"),
+]
+
+_UKRAINIAN = frozenset("іїєґ")
+_PERSIAN = frozenset("پچژگ")
+_URDU = frozenset("ٹڈڑںھےۓ")
+
+_STOPWORDS: Dict[str, FrozenSet[str]] = {
+    lang: frozenset(words.split())
+    for lang, words in {
+        "en": "the and is are you your to of in for it on with this that what how do does "
+              "can i my we our have has be at not or from please hello hi thanks",
+        "es": "el la los las de que y en un una es por para con no se su al lo como más "
+              "pero sus le ya o este sí porque esta hola gracias cuánto dónde tienen quiero",
+        "fr": "le la les de des du et est un une en que qui pour dans pas sur au avec ce "
+              "vous nous je il elle mais ou bonjour merci combien où avez votre",
+        "de": "der die das und ist nicht ein eine zu den von mit sich des auf für im dem "
+              "sie es ich wir haben ihr wie was hallo danke bitte wo kann",
+        "it": "il lo la i gli le di e è che un una per non in con si da del della sono "
+              "ciao grazie quanto dove avete vorrei come",
+        "pt": "o a os as de do da que e é um uma em para com não se por mais dos das "
+              "você vocês olá obrigado obrigada quanto onde têm quero",
+        "nl": "de het een en is van in te dat op niet met voor zijn je ik we hebben "
+              "hallo bedankt hoeveel waar kunnen",
+        "tr": "ve bir bu da de için ile ne mi mı var yok çok ben sen biz merhaba "
+              "teşekkürler nerede kaç nasıl",
+        "id": "yang dan di ke dari ini itu untuk dengan tidak ada saya anda kami apa "
+              "halo terima kasih berapa dimana bisa",
+        "sv": "och att det som en på är av för med den till inte har jag vi hej tack "
+              "hur var kan",
+        "pl": "i w z na nie się to jest że do jak co ale po tak czy dzień dobry "
+              "dziękuję ile gdzie",
+    }.items()
+}
+
+_DIACRITICS: Dict[str, str] = {
+    "ñ": "es", "¿": "es", "¡": "es",
+    "ç": "fr", "œ": "fr", "ê": "fr", "î": "fr", "û": "fr", "ë": "fr",
+    "ß": "de", "ä": "de", "ö": "de", "ü": "de",
+    "ã": "pt", "õ": "pt",
+    "ì": "it", "ò": "it",
+    "ğ": "tr", "ş": "tr", "ı": "tr",
+    "ą": "pl", "ę": "pl", "ł": "pl", "ś": "pl", "ż": "pl", "ź": "pl", "ć": "pl", "ń": "pl",
+    "å": "sv",
+}
+
+
+@dataclass(frozen=True)
+class Detection:
+    lang: str           # ISO 639-1 code ("und" when there is no signal at all)
+    confidence: float   # 0.0 – 1.0
+
+
+def _script_counts(text: str) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for ch in text:
+        code = ord(ch)
+        if code < 0x41 or not ch.isalpha():
+            continue
+        for first, last, script in _SCRIPTS:
+            if first <= code <= last:
+                counts[script] = counts.get(script, 0) + 1
+                break
+    return counts
+
+
+def _resolve_script(script: str, text: str) -> str:
+    if script == "cyrillic":
+        return "uk" if any(ch in _UKRAINIAN for ch in text.lower()) else "ru"
+    if script == "arabic":
+        if any(ch in _URDU for ch in text):
+            return "ur"
+        return "fa" if any(ch in _PERSIAN for ch in text) else "ar"
+    if script == "han":
+        return "zh"
+    return script
+
+
+def _latin(text: str) -> Detection:
+    lowered = text.lower()
+    words = _WORD.findall(lowered)
+    scores = {lang: 0.0 for lang in _STOPWORDS}
+    for word in words:
+        for lang, stop in _STOPWORDS.items():
+            if word in stop:
+                scores[lang] += 1.0
+    for ch in lowered:
+        lang = _DIACRITICS.get(ch)
+        if lang is not None:
+            scores[lang] += 0.5
+
+    ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0] != "en"))
+    (best, top), (_, second) = ranked[0], ranked[1]
+    if top == 0:
+        return Detection("en", 0.2)  # Latin script, no evidence – assume English, weakly
+    margin = (top - second) / top
+    evidence = min(1.0, top / 3)
+    return Detection(best, round(margin * evidence, 3))
+
+
+def detect(text: str) -> Detection:
+    """Identify the language of *text* (see module docstring)."""
+    counts = _script_counts(text)
+    if not counts:
+        return Detection("und", 0.0)
+    script, hits = max(counts.items(), key=lambda kv: kv[1])
+    if script == "han" and counts.get("ja"):
+        script = "ja"  # Japanese mixes kanji with kana
+    if script != "latin":
+        share = hits / sum(counts.values())
+        return Detection(_resolve_script(script, text), round(min(1.0, share * min(1.0, hits / 2)), 3))
+    return _latin(text)
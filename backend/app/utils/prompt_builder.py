@@ -1,5 +1,22 @@
 """
 Prompt Builder – constructs the system prompt for the AI engine.
+
+The persona (company, personality, language) is kept separate from the
+per-query context so it can form a stable, cacheable prompt prefix.
+"""
+from dataclasses import dataclass
+
+PERSONA_TEMPLATE = """\
+You are a helpful AI customer-support assistant for {company_name}.
+Your personality: {personality}
+Your primary language: {language}
+Always stay in character as a support agent for {company_name}.
+"""
+
+CONTEXT_TEMPLATE = """\
+<context>
+{context}
+</context>
 """
 
 SYSTEM_TEMPLATE = """\
@@ -23,6 +40,28 @@ Additional instructions:
 """
 
 
+@dataclass(frozen=True)
+class Persona:
+    """Per-chatbot prompt settings; hashable so compiled prefixes can be cached."""
+    company_name: str = ""
+    personality: str = ""
+    language: str = ""
+
+
+def build_persona_prompt(persona: Persona) -> str:
+    return PERSONA_TEMPLATE.format(
+        company_name=persona.company_name or "the company",
+        personality=persona.personality or "friendly and professional",
+        language=persona.language or "English",
+    )
+
+
+def build_context_prompt(context: str) -> str:
+    return CONTEXT_TEMPLATE.format(
+        context=context or "No context documents are available.",
+    )
+
+
 def build_system_prompt(
     company_name: str,
     personality: str,
@@ -0,0 +1,123 @@
+"""
+SimHash – 64-bit locality-sensitive fingerprints for near-duplicate text.
+Texts that share most of their word shingles get fingerprints that differ
+in only a few bits; a banded LSH index keeps look-ups sub-linear.
+"""
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import re
+
+_BITS = 64
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def simhash(text: str, shingle: int = 3) -> int:
+    """Return the 64-bit SimHash of *text* over word *shingle*-grams."""
+    tokens = _WORD_RE.findall(text.lower())
+    if len(tokens) >= shingle:
+        features = Counter(
+            " ".join(tokens[i : i + shingle]) for i in range(len(tokens) - shingle + 1)
+        )
+    else:
+        features = Counter(tokens or [text])
+
+    weights = [0] * _BITS
+    for feature, weight in features.items():
+        h = int.from_bytes(
+            hashlib.blake2b(feature.encode("utf-8", errors="replace"), digest_size=8).digest(),
+            "big",
+        )
+        for bit in range(_BITS):
+            weights[bit] += weight if (h >> bit) & 1 else -weight
+
+    fingerprint = 0
+    for bit, w in enumerate(weights):
+        if w > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class SimHashIndex:
+    """
+    Near-duplicate index. Two texts are near-duplicates when the fraction of
+    matching fingerprint bits is >= *threshold* (1.0 = exact match only).
+
+    The fingerprint is split into (max_distance + 1) bands; by the pigeonhole
+    principle any fingerprint within max_distance bits shares at least one
+    band exactly, so only same-band candidates need a Hamming check.
+    """
+
+    def __init__(self, threshold: float = 0.9):
+        self.max_distance = max(0, int((1.0 - threshold) * _BITS))
+        n_bands = self.max_distance + 1
+        width = _BITS // n_bands
+        self._bands: List[Tuple[int, int]] = [
+            (i * width, width if i < n_bands - 1 else _BITS - i * width)
+            for i in range(n_bands)
+        ]
+        self._buckets: Dict[Tuple[int, int], List[int]] = {}
+
+    def _keys(self, fp: int) -> List[Tuple[int, int]]:
+        return [
+            (i, (fp >> start) & ((1 << width) - 1))
+            for i, (start, width) in enumerate(self._bands)
+        ]
+
+    def find(self, fp: int) -> Optional[int]:
+        """Return an indexed fingerprint within max_distance of *fp*, if any."""
+        for key in self._keys(fp):
+            for other in self._buckets.get(key, ()):
+                if hamming(fp, other) <= self.max_distance:
+                    return other
+        return None
+
+    def add(self, fp: int) -> None:
+        for key in self._keys(fp):
+            self._buckets.setdefault(key, []).append(fp)
+
+    def add_if_new(self, text: str) -> bool:
+        """Index *text* and return True, or return False if it is a near-duplicate."""
+        fp = simhash(text)
+        if self.find(fp) is not None:
+            return False
+        self.add(fp)
+        return True
+
+
+@dataclass
+class DedupStats:
+    kept: int = 0
+    dropped: int = 0
+    chars_dropped: int = 0
+
+    def storage_avoided(self, embedding_dim: int = 384) -> int:
+        """Approximate bytes not written to the vector store (float32 vectors + text)."""
+        return self.dropped * embedding_dim * 4 + self.chars_dropped
+
+
+def dedup_chunks(
+    chunks: List[str],
+    threshold: float = 0.9,
+    index: Optional[SimHashIndex] = None,
+) -> Tuple[List[str], DedupStats]:
+    """
+    Drop chunks that are near-duplicates of an earlier chunk.
+    Pass a shared *index* to deduplicate across several calls.
+    """
+    index = index or SimHashIndex(threshold)
+    stats = DedupStats()
+    kept: List[str] = []
+    for chunk in chunks:
+        if index.add_if_new(chunk):
+            kept.append(chunk)
+        else:
+            stats.dropped += 1
+            stats.chars_dropped += len(chunk)
+    stats.kept = len(kept)
+    return kept, stats
@@ -0,0 +1,296 @@
+"""
+SQL Guard – static checks on LLM-generated SQL before it reaches Postgres.
+
+The statement is tokenized (string literals and comments are never mistaken
+for keywords) and must be:
+  * one SELECT (optionally WITH … SELECT) – no DML/DDL, SELECT INTO,
+    row locks or dollar quoting;
+  * calling only allow-listed functions (aggregates, window, date/time,
+    string, math, conditionals) – anything else, e.g. query_to_xml() or
+    ts_stat(), could run SQL from a string or dump tables wholesale;
+  * reading only from an allow-list of tables and never naming a schema, so
+    every reference resolves to whatever the caller puts in scope under that
+    name (nl2sql_service.py shadows each table with a per-user CTE). A name
+    only counts as a CTE where that CTE is in scope – a WITH inside a
+    subquery doesn't hide the table of the same name outside it;
+  * bounded – it is wrapped as SELECT * FROM (…) LIMIT max_rows + 1 so the
+    planner knows the cap and callers can tell when rows were cut off.
+
+This is the first line of defence; execution additionally runs in a
+READ ONLY transaction with a statement_timeout (see nl2sql_service.py).
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+_TOKEN = re.compile(
+    r"""
+    (?P<space>\s+|--[^\n]*|/\*.*?\*/)
+  | (?P<string>[EeBbXxNnUu]?'(?:[^']|'')*')
+  | (?P<dollar>\$[A-Za-z_]*\$)
+  | (?P<qident>"(?:[^"]|"")+")
+  | (?P<cast>::)
+  | (?P<param>:[A-Za-z_]\w*)
+  | (?P<word>[A-Za-z_][\w$]*)
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)
+  | (?P<op>[^\s\w])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_FORBIDDEN_WORDS = frozenset(
+    "insert update delete merge upsert drop alter create truncate grant revoke "
+    "comment copy call do execute prepare deallocate lock vacuum analyze cluster "
+    "reindex refresh set reset listen notify unlisten into discard checkpoint "
+    "security definer table".split()  # TABLE x is SELECT * FROM x
+)
+_FORBIDDEN_PREFIXES = ("pg_", "lo_", "dblink")
+_ALLOWED_FUNCTIONS = frozenset(
+    # aggregates and window functions
+    "count sum avg min max stddev stddev_pop stddev_samp variance var_pop var_samp "
+    "string_agg array_agg json_agg jsonb_agg bool_and bool_or every "
+    "percentile_cont percentile_disc mode corr covar_pop covar_samp "
+    "row_number rank dense_rank percent_rank cume_dist ntile lag lead "
+    "first_value last_value nth_value "
+    # date / time
+    "now date_trunc date_part date_bin extract age to_char to_date to_timestamp "
+    "make_date make_time make_timestamp make_interval justify_days justify_hours "
+    "justify_interval timezone "
+    # string
+    "lower upper length char_length character_length octet_length trim btrim ltrim "
+    "rtrim substring substr position strpos overlay replace split_part concat "
+    "concat_ws left right lpad rpad initcap reverse repeat starts_with format "
+    "regexp_replace regexp_match regexp_matches "
+    # math
+    "abs round ceil ceiling floor trunc sqrt cbrt power mod sign exp ln log log10 "
+    "div width_bucket "
+    # conditionals, casts, arrays
+    "coalesce nullif greatest least cast date to_number unnest array_length cardinality "
+    "array_position generate_series jsonb_build_object json_build_object".split()
+)
+# keywords that may be followed by a parenthesis without being a function call
+_PAREN_KEYWORDS = frozenset(
+    "select from where and or not in exists any all some as on using join lateral "
+    "over filter within group by values when then else case distinct having union "
+    "intersect except array row is between like ilike similar to limit offset "
+    "order partition rows range groups materialized with recursive".split()
+)
+_CLAUSE_END = frozenset(
+    "where group order limit offset fetch having window union intersect except "
+    "on using returning".split()
+)
+# FROM inside these function calls is an argument separator, not a table list
+_FROM_FUNCTIONS = frozenset("extract substring trim overlay position".split())
+
+
+class SQLRejected(ValueError):
+    """The statement failed a guard check; the message is safe to show users."""
+
+
+@dataclass(frozen=True)
+class GuardedSQL:
+    sql: str                   # the bounded statement to execute
+    tables: FrozenSet[str]     # lower-cased tables it reads
+    max_rows: int
+
+
+@dataclass(frozen=True)
+class _Tok:
+    kind: str
+    text: str
+    end: int     # offset just past the token in the source
+
+    @property
+    def value(self) -> str:
+        """Lower-cased keyword / unquoted identifier."""
+        if self.kind == "qident":
+            return self.text[1:-1].replace('""', '"').lower()
+        return self.text.lower()
+
+
+def tokenize(sql: str) -> List[_Tok]:
+    tokens: List[_Tok] = []
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup or "op"
+        if kind == "space":
+            continue
+        text = match.group()
+        if kind == "op" and text in "'\"$":
+            raise SQLRejected("Unterminated literal or identifier.")
+        tokens.append(_Tok(kind, text, match.end()))
+    return tokens
+
+
+def guard_sql(sql: str, allowed_tables: Iterable[str], max_rows: int) -> GuardedSQL:
+    """Validate *sql* (see module docstring); raises SQLRejected."""
+    tokens = tokenize(sql)
+    while tokens and tokens[-1].text == ";":
+        tokens.pop()
+    if not tokens:
+        raise SQLRejected("Empty query.")
+    if any(t.text == ";" for t in tokens):
+        raise SQLRejected("Only a single statement is allowed.")
+    if tokens[0].kind != "word" or tokens[0].value not in ("select", "with"):
+        raise SQLRejected("Only SELECT queries are allowed.")
+
+    closes = _matching_parens(tokens)
+    ctes = _ctes(tokens, closes)
+    cte_names = {cte.at for cte in ctes}
+    depth = 0
+    for i, tok in enumerate(tokens):
+        depth += {"(": 1, ")": -1}.get(tok.text, 0) if tok.kind == "op" else 0
+        if depth < 0:
+            raise SQLRejected("Unbalanced parentheses.")
+        if tok.kind == "dollar":
+            raise SQLRejected("Dollar-quoted strings are not allowed.")
+        if tok.kind not in ("word", "qident"):
+            continue
+        word = tok.value
+        if tok.kind == "word" and word in _FORBIDDEN_WORDS:
+            raise SQLRejected(f"'{word.upper()}' is not allowed in analytics queries.")
+        if word.startswith(_FORBIDDEN_PREFIXES) or (
+            _is_call(tokens, i, cte_names) and word not in _ALLOWED_FUNCTIONS
+        ):
+            raise SQLRejected(f"'{word}' is not allowed in analytics queries.")
+
+    if depth:
+        raise SQLRejected("Unbalanced parentheses.")
+
+    allowed = {t.strip('"').lower() for t in allowed_tables}
+    tables = {
+        name for name, at in _tables(tokens)  # names are never schema-qualified
+        if not any(cte.name == name and cte.visible(at) for cte in ctes)
+    }
+    denied = sorted(tables - allowed)
+    if denied:
+        raise SQLRejected(f"Table(s) not available for analytics: {', '.join(denied)}.")
+
+    body = sql[: tokens[-1].end]  # minus trailing semicolons / comments
+    bounded = f"SELECT * FROM (\n{body}\n) AS nl2sql_q LIMIT {max_rows + 1}"
+    return GuardedSQL(bounded, frozenset(tables), max_rows)
+
+
+def _next_text(tokens: List[_Tok], i: int) -> Optional[str]:
+    return tokens[i + 1].text if i + 1 < len(tokens) else None
+
+
+def _is_call(tokens: List[_Tok], i: int, cte_names: Set[int]) -> bool:
+    """Whether the name at *i* calls a function (rather than being a keyword,
+    a type modifier, an alias or CTE column list)."""
+    if _next_text(tokens, i) != "(" or i in cte_names:
+        return False
+    if tokens[i].kind == "word" and tokens[i].value in _PAREN_KEYWORDS:
+        return False
+    prev = tokens[i - 1].text.lower() if i else ""
+    return prev not in ("as", "::")  # `AS t(a, b)`, `::numeric(10, 2)`
+
+
+def _matching_parens(tokens: List[_Tok]) -> Dict[int, int]:
+    """Index of each "(" -> index of its ")"; call once parentheses are balanced."""
+    closes: Dict[int, int] = {}
+    stack: List[int] = []
+    for i, tok in enumerate(tokens):
+        if tok.text == "(":
+            stack.append(i)
+        elif tok.text == ")" and stack:
+            closes[stack.pop()] = i
+    return closes
+
+
+@dataclass(frozen=True)
+class _CTE:
+    name: str
+    at: int          # index of the name token
+    body: Tuple[int, int]   # its parentheses
+    scope: Tuple[int, int]  # the WITH up to the end of its query
+    recursive: bool
+
+    def visible(self, i: int) -> bool:
+        """Whether a reference at token *i* means this CTE (not a real table)."""
+        if not self.scope[0] < i < self.scope[1]:
+            return False
+        inside_body = self.body[0] < i < self.body[1]
+        return i > self.body[1] or (inside_body and self.recursive)
+
+
+def _ctes(tokens: List[_Tok], closes: Dict[int, int]) -> List[_CTE]:
+    """`WITH [RECURSIVE] name [(cols)] AS [[NOT] MATERIALIZED] (…), …` definitions."""
+    ctes: List[_CTE] = []
+    enclosing: List[int] = []   # open parentheses around the current token
+    for i, tok in enumerate(tokens):
+        if tok.text == "(":
+            enclosing.append(i)
+        elif tok.text == ")" and enclosing:
+            enclosing.pop()
+        if not (tok.kind == "word" and tok.value == "with"):
+            continue
+        scope_end = closes.get(enclosing[-1], len(tokens)) if enclosing else len(tokens)
+        recursive = _next_text(tokens, i) is not None and tokens[i + 1].value == "recursive"
+        j = i + 2 if recursive else i + 1
+        while j < len(tokens) and tokens[j].kind in ("word", "qident"):
+            name, k = tokens[j].value, j + 1
+            if k < len(tokens) and tokens[k].text == "(":
+                k = closes.get(k, len(tokens)) + 1  # column list
+            if k >= len(tokens) or tokens[k].value != "as":
+                break
+            k += 1
+            while k < len(tokens) and tokens[k].value in ("not", "materialized"):
+                k += 1
+            if k >= len(tokens) or tokens[k].text != "(":
+                break
+            body_end = closes.get(k, len(tokens))
+            ctes.append(_CTE(name, j, (k, body_end), (i, scope_end), recursive))
+            if _next_text(tokens, body_end) != ",":
+                break
+            j = body_end + 2
+    return ctes
+
+
+def _tables(tokens: List[_Tok]) -> List[Tuple[str, int]]:
+    """(relation, token index) for names in FROM lists and JOINs, at any nesting depth."""
+    tables: List[Tuple[str, int]] = []
+    # one frame per open parenthesis: [in_from_list, is_function_args]
+    frames: List[List[bool]] = [[False, False]]
+    expect_table = False
+    i = 0
+    while i < len(tokens):
+        tok, word = tokens[i], tokens[i].value
+        frame = frames[-1]
+        if tok.text == "(":
+            prev = tokens[i - 1].value if i else ""
+            frames.append([False, prev in _FROM_FUNCTIONS])
+            expect_table = False  # subquery or table function
+        elif tok.text == ")":
+            if len(frames) > 1:
+                frames.pop()
+        elif (
+            tok.kind == "word" and word == "from" and not frame[1]
+            and not (i and tokens[i - 1].value == "distinct")  # IS [NOT] DISTINCT FROM
+        ):
+            frame[0] = expect_table = True
+        elif tok.kind == "word" and word == "join":
+            frame[0] = expect_table = True
+        elif tok.text == "," and frame[0]:
+            expect_table = True
+        elif tok.kind == "word" and word in _CLAUSE_END:
+            frame[0] = expect_table = False
+        elif expect_table and tok.kind == "word" and word in ("only", "lateral"):
+            pass
+        elif expect_table and tok.kind in ("word", "qident"):
+            name, i = _qualified(tokens, i)
+            if name is not None:
+                tables.append((name, i))
+            expect_table = False
+        else:
+            expect_table = False
+        i += 1
+    return tables
+
+
+def _qualified(tokens: List[_Tok], i: int) -> Tuple[Optional[str], int]:
+    """Resolve `table` or `func(` at *i*; returns (table, last index). `schema.table` is rejected."""
+    if _next_text(tokens, i) == "(":
+        return None, i  # set-returning function, e.g. generate_series(...)
+    if _next_text(tokens, i) == ".":
+        raise SQLRejected("Schema-qualified tables are not allowed in analytics queries.")
+    return tokens[i].value, i
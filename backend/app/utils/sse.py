@@ -0,0 +1,128 @@
+"""
+SSE helpers – frame encoding and delta coalescing for streamed chat replies.
+
+Groq emits one delta per token or two; framing each one separately costs a
+JSON encode, a generator hop and a tiny socket write per token. coalesce()
+buffers deltas for up to *window* seconds (or *max_chars*) and emits them as
+one frame, and sends `: ping` comments while the upstream is idle so proxies
+don't time out the connection. Clients concatenate `content` fields, so
+coalesced frames are wire-compatible with per-token ones.
+"""
+import asyncio
+import json
+from contextlib import suppress
+from typing import Any, AsyncIterator, List, Optional
+
+from app.config import settings
+
+try:
+    import orjson
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:  # optional dependency
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+DONE = b"data: [DONE]\n\n"
+PING = b": ping\n\n"
+
+
+def event(payload: Any) -> bytes:
+    """Encode *payload* as one `data:` frame."""
+    return b"data: " + dumps(payload) + b"\n\n"
+
+
+async def coalesce(
+    deltas: AsyncIterator[str],
+    window: float = settings.SSE_COALESCE_MS / 1000,
+    max_chars: int = settings.SSE_MAX_FRAME_CHARS,
+    heartbeat: float = settings.SSE_HEARTBEAT_SECONDS,
+) -> AsyncIterator[bytes]:
+    """
+    Yield SSE frames of the form {"content": ...} built from *deltas*.
+
+    A frame is flushed *window* seconds after its first delta arrived, as soon
+    as it holds *max_chars*, or when the stream ends. If *deltas* raises, text
+    already buffered is flushed before the error propagates.
+
+    *deltas* is drained by a single pump task and the consumer is woken
+    through plain futures and loop timers, so there is no per-token task or
+    queue hop. Closing this generator cancels the pump and closes *deltas*.
+    """
+    loop = asyncio.get_running_loop()
+    buf: List[str] = []
+    size = 0
+    ready = ping = finished = False
+    error: Optional[BaseException] = None
+    waiter: Optional[asyncio.Future] = None
+    timer: Optional[asyncio.TimerHandle] = None
+
+    def _wake() -> None:
+        nonlocal ready, timer
+        ready = True
+        if timer is not None:
+            timer.cancel()
+            timer = None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def _ping() -> None:
+        nonlocal ping
+        if not buf and waiter is not None and not waiter.done():
+            ping = True
+            waiter.set_result(None)
+
+    async def _pump() -> None:
+        nonlocal size, finished, error, timer
+        try:
+            async for delta in deltas:
+                buf.append(delta)
+                size += len(delta)
+                if size >= max_chars or window <= 0:
+                    _wake()
+                elif timer is None:
+                    timer = loop.call_later(window, _wake)
+        except Exception as exc:
+            error = exc
+        finally:
+            finished = True
+            _wake()
+
+    pump = asyncio.ensure_future(_pump())
+    try:
+        while True:
+            if not ready:
+                waiter = loop.create_future()
+                idle = loop.call_later(heartbeat, _ping) if not buf else None
+                try:
+                    await waiter
+                finally:
+                    waiter = None
+                    if idle is not None:
+                        idle.cancel()
+            if ping:
+                ping = False
+                yield PING
+                continue
+
+            ready = False
+            if buf:
+                frame = event({"content": "".join(buf)})
+                buf.clear()
+                size = 0
+                yield frame
+            if finished and not buf:
+                if error is not None:
+                    raise error
+                return
+    finally:
+        if timer is not None:
+            timer.cancel()
+        if not pump.done():
+            pump.cancel()
+            with suppress(asyncio.CancelledError):
+                await pump
+        aclose = getattr(deltas, "aclose", None)
+        if aclose is not None:
+            await aclose()
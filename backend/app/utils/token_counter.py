@@ -1,6 +1,7 @@
 """
 Token Counter – lightweight approximation using tiktoken (cl100k_base).
-Falls back to char/4 approximation if tiktoken is unavailable.
+Falls back to char/4 approximation if tiktoken (or its encoding file,
+which is downloaded on first use) is unavailable.
 """
 try:
     import tiktoken
@@ -10,6 +11,6 @@ try:
     def count_tokens(text: str) -> int:
         return len(_enc.encode(text))
 
-except ImportError:
+except Exception:  # ImportError, or no network to fetch the encoding
     def count_tokens(text: str) -> int:  # type: ignore[misc]
         return len(text) // 4
@@ -0,0 +1,87 @@
+"""
+Language ID benchmark – throughput and accuracy of app.utils.lang_id on
+multilingual support-chat fixtures, compared with langdetect if installed.
+
+Usage (from backend/):
+    python -m benchmarks.lang_id
+    python -m benchmarks.lang_id --repeat 200
+"""
+import argparse
+import time
+from typing import Callable, List, Tuple
+
+from app.utils.lang_id import detect
+
+FIXTURES: List[Tuple[str, str]] = [
+    ("en", "What are your opening hours on Sunday?"),
+    ("en", "I want to return the shoes I bought last week"),
+    ("en", "Do you have parking near the store?"),
+    ("es", "¿Cuánto cuesta el corte de pelo para hombres?"),
+    ("es", "Hola, quiero reservar una cita para el sábado"),
+    ("es", "No he recibido mi pedido todavía"),
+    ("fr", "Bonjour, quels sont vos horaires d'ouverture ?"),
+    ("fr", "Je voudrais annuler ma commande s'il vous plaît"),
+    ("fr", "Est-ce que vous livrez à Lyon ?"),
+    ("de", "Wie viel kostet die Lieferung nach Berlin?"),
+    ("de", "Ich habe mein Passwort vergessen, was kann ich tun?"),
+    ("de", "Haben Sie am Sonntag geöffnet?"),
+    ("it", "Ciao, quanto costa la spedizione in Italia?"),
+    ("it", "Vorrei prenotare un tavolo per due persone"),
+    ("pt", "Olá, vocês entregam em São Paulo?"),
+    ("pt", "Não recebi o meu reembolso ainda"),
+    ("nl", "Hallo, hoeveel kost de verzending naar Amsterdam?"),
+    ("tr", "Merhaba, siparişim nerede? Çok bekledim"),
+    ("id", "Halo, berapa harga untuk potong rambut?"),
+    ("pl", "Dzień dobry, ile kosztuje dostawa do Warszawy?"),
+    ("sv", "Hej, hur mycket kostar frakten till Stockholm?"),
+    ("ru", "Здравствуйте, сколько стоит доставка в Москву?"),
+    ("uk", "Привіт, скільки коштує доставка до Києва?"),
+    ("el", "Γεια σας, πόσο κοστίζει η αποστολή;"),
+    ("ar", "مرحبا، كم تكلفة الشحن إلى دبي؟"),
+    ("fa", "سلام، هزینه ارسال به تهران چقدر است؟"),
+    ("he", "שלום, כמה עולה המשלוח לתל אביב?"),
+    ("hi", "नमस्ते, दिल्ली तक डिलीवरी का कितना खर्च है?"),
+    ("ta", "வணக்கம், சென்னைக்கு டெலிவரி கட்டணம் எவ்வளவு?"),
+    ("te", "నమస్తే, హైదరాబాద్‌కు డెలివరీ ఛార్జీ ఎంత?"),
+    ("bn", "নমস্কার, কলকাতায় ডেলিভারি খরচ কত?"),
+    ("th", "สวัสดีครับ ค่าส่งไปกรุงเทพเท่าไหร่"),
+    ("zh", "你好，运费是多少？"),
+    ("ja", "こんにちは、送料はいくらですか？"),
+    ("ko", "안녕하세요, 배송비는 얼마인가요?"),
+]
+
+
+def _score(name: str, fn: Callable[[str], str], repeat: int) -> None:
+    correct = sum(fn(text) == lang for lang, text in FIXTURES)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for _, text in FIXTURES:
+            fn(text)
+    elapsed = time.perf_counter() - started
+    per_sec = repeat * len(FIXTURES) / elapsed
+    print(f"{name:<12}{correct:>4}/{len(FIXTURES)} correct{per_sec:>14,.0f} msgs/s")
+    misses = [(lang, fn(text)) for lang, text in FIXTURES if fn(text) != lang]
+    if misses:
+        print(" " * 12 + "misses: " + ", ".join(f"{want}->{got}" for want, got in misses))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+
+    _score("lang_id", lambda text: detect(text).lang, args.repeat)
+    try:
+        from langdetect import DetectorFactory, detect as langdetect_detect  # type: ignore[import-untyped]
+    except ImportError:
+        print("langdetect    not installed – skipped")
+        return
+    DetectorFactory.seed = 0
+    started = time.perf_counter()
+    langdetect_detect("warm up the profiles")
+    print(f"langdetect    profile load {time.perf_counter() - started:.2f}s")
+    _score("langdetect", lambda text: langdetect_detect(text).split("-")[0], max(1, args.repeat // 10))
+
+
+if __name__ == "__main__":
+    main()
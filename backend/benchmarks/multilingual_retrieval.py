@@ -0,0 +1,137 @@
+"""
+Multilingual retrieval benchmark – recall@k and per-query latency of the
+two ways to answer non-English questions over an English knowledge base:
+
+  translate-first  detect -> translate the question to English -> embed with
+                   EMBEDDING_MODEL (the pre-EMBEDDING_MODE=multilingual path)
+  multilingual     embed the question as-is with MULTILINGUAL_EMBEDDING_MODEL
+                   against a collection embedded with the same model
+
+Retrieval is exact cosine over the in-memory fixtures (no Chroma), so the
+numbers isolate the embedding/translation cost. Without --live the
+translate-first path uses the fixtures' reference translations – the best
+case for recall – and its latency excludes the Groq round trip; --live
+translates through LanguageService (needs GROQ_API_KEY).
+
+Usage (from backend/):
+    python -m benchmarks.multilingual_retrieval
+    python -m benchmarks.multilingual_retrieval --k 1 --live
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, List, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.embedding_service import EmbeddingService
+from app.utils.lang_id import detect
+
+KB: List[str] = [
+    "We are open Monday to Saturday from 9am to 7pm and closed on Sundays.",
+    "Standard shipping takes 3-5 business days and is free on orders over $50.",
+    "You can return any unworn item within 30 days for a full refund.",
+    "A men's haircut costs $25 and a women's cut starts at $40.",
+    "Appointments can be booked online or by calling +1 555 0100.",
+    "We accept Visa, Mastercard, PayPal and cash in store.",
+    "Free customer parking is available behind the building.",
+    "To reset your password, click 'Forgot password' on the login page.",
+    "Gift cards are available in $25, $50 and $100 amounts and never expire.",
+    "We deliver to Canada and Mexico; international orders take 7-14 days.",
+]
+
+# (expected KB index, question, reference English translation)
+QUERIES: List[Tuple[int, str, str]] = [
+    (0, "¿A qué hora abren los sábados?", "What time do you open on Saturdays?"),
+    (0, "Êtes-vous ouverts le dimanche ?", "Are you open on Sunday?"),
+    (1, "Wie lange dauert der Versand?", "How long does shipping take?"),
+    (1, "Quanto tempo demora a entrega?", "How long does delivery take?"),
+    (2, "Puis-je retourner un article ?", "Can I return an item?"),
+    (2, "Posso restituire le scarpe dopo due settimane?", "Can I return the shoes after two weeks?"),
+    (3, "¿Cuánto cuesta un corte de pelo para hombre?", "How much is a men's haircut?"),
+    (3, "Сколько стоит женская стрижка?", "How much does a women's haircut cost?"),
+    (4, "Wie kann ich einen Termin buchen?", "How can I book an appointment?"),
+    (4, "予約はどうやってできますか？", "How can I make a reservation?"),
+    (5, "Aceitam PayPal?", "Do you accept PayPal?"),
+    (5, "هل تقبلون الدفع نقدا؟", "Do you accept cash payment?"),
+    (6, "Gibt es Parkplätze?", "Is there parking?"),
+    (6, "क्या पार्किंग उपलब्ध है?", "Is parking available?"),
+    (7, "J'ai oublié mon mot de passe", "I forgot my password"),
+    (7, "Ho dimenticato la password, cosa faccio?", "I forgot my password, what do I do?"),
+    (8, "¿Las tarjetas de regalo caducan?", "Do gift cards expire?"),
+    (8, "Verlopen cadeaubonnen?", "Do gift cards expire?"),
+    (9, "Do you ship to Canada?", "Do you ship to Canada?"),
+    (9, "Livrez-vous au Mexique ?", "Do you deliver to Mexico?"),
+]
+
+
+def _unit(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.linalg.norm(matrix, axis=-1, keepdims=True).clip(min=1e-12)
+
+
+async def _run(
+    name: str,
+    kb_vectors: np.ndarray,
+    embed_query: Callable[[int, str, str], Awaitable[List[float]]],
+    k: int,
+) -> None:
+    hits = 0
+    latencies: List[float] = []
+    for expected, question, reference in QUERIES:
+        started = time.perf_counter()
+        vector = _unit(np.asarray(await embed_query(expected, question, reference), dtype=np.float32))
+        top = np.argsort(-(kb_vectors @ vector))[:k]
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += int(expected in top)
+    latencies.sort()
+    p95 = latencies[int(0.95 * (len(latencies) - 1))]
+    print(
+        f"{name:<18}recall@{k} {hits / len(QUERIES):>5.0%}"
+        f"   p50 {statistics.median(latencies):>7.1f} ms   p95 {p95:>7.1f} ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--live", action="store_true", help="translate through Groq")
+    args = parser.parse_args()
+
+    embedder = EmbeddingService()
+    english, multilingual = settings.EMBEDDING_MODEL, settings.MULTILINGUAL_EMBEDDING_MODEL
+    print(f"{len(KB)} passages, {len(QUERIES)} queries; {english} vs {multilingual}")
+
+    kb_english = _unit(np.asarray(await embedder.embed_chunks(KB, model=english), dtype=np.float32))
+    kb_multi = _unit(np.asarray(await embedder.embed_chunks(KB, model=multilingual), dtype=np.float32))
+    # warm both encoders so the first query doesn't pay for lazy init
+    await embedder.embed_text("warm up", model=english)
+    await embedder.embed_text("warm up", model=multilingual)
+
+    language = None
+    if args.live:
+        from app.services.language_service import LanguageService
+
+        language = LanguageService()
+
+    async def translate_first(_: int, question: str, reference: str) -> List[float]:
+        if detect(question).lang != "en":
+            question = await language.translate(question, "en") if language else reference
+        return await embedder.embed_text(question, model=english)
+
+    async def english_only(_: int, question: str, __: str) -> List[float]:
+        return await embedder.embed_text(question, model=english)
+
+    async def multilingual_direct(_: int, question: str, __: str) -> List[float]:
+        return await embedder.embed_text(question, model=multilingual)
+
+    await _run("english, as-is", kb_english, english_only, args.k)
+    await _run("translate-first" + ("" if args.live else "*"), kb_english, translate_first, args.k)
+    await _run("multilingual", kb_multi, multilingual_direct, args.k)
+    if not args.live:
+        print("* reference translations; add --live to include the Groq translation call")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
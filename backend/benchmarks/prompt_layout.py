@@ -0,0 +1,132 @@
+"""
+Prompt layout benchmark – context-in-system-prompt (old) vs. stable prefix (new).
+
+Counts prompt tokens and the token prefix shared by consecutive turns of
+one conversation (what provider-side prompt caching can reuse). With
+--live and GROQ_API_KEY set, also measures time-to-first-token per layout.
+
+Usage (from backend/):
+    python -m benchmarks.prompt_layout
+    python -m benchmarks.prompt_layout --live --runs 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+from app.services.ai_engine import AIEngine
+from app.utils.prompt_builder import Persona
+from app.utils.token_counter import count_tokens
+
+_OLD_TEMPLATE = """You are a customer-support assistant for a specific business.
+You must ONLY answer questions using the information provided in the Context section below.
+
+STRICT RULES:
+- ONLY use information from the Context to answer questions.
+- If the user's question is NOT related to the business or the Context, politely say:
+  "I'm sorry, I can only help with questions related to our business. Is there anything else I can assist you with regarding our services?"
+- Do NOT answer general knowledge questions (e.g. science, history, geography, etc.)
+- Do NOT make up information that is not in the Context.
+- Be warm, professional, and helpful for business-related queries.
+- Keep answers concise but complete.
+- If users greet you, greet back and ask how you can help with the business services.
+- If users seem frustrated, be empathetic and offer to connect them with a human agent.
+
+Context:
+{context}"""
+
+PERSONA = Persona(
+    company_name="Naturals Salon",
+    personality="Warm, upbeat and precise about prices. Always mention booking online.",
+    language="en",
+)
+QUESTIONS = [
+    "What are your opening hours?",
+    "How much is a haircut for men?",
+    "Do you offer hair spa treatments?",
+    "Can I book for Saturday morning?",
+]
+CHUNK = (
+    "Naturals Salon offers haircuts, colouring, hair spa and bridal packages. "
+    "Men's haircut starts at 350, women's at 600. Open 10am–9pm every day. "
+) * 12
+
+
+def _old_messages(message: str, context: str, history: List[Dict[str, str]]):
+    messages = [{"role": "system", "content": _OLD_TEMPLATE.format(context=context)}]
+    messages += history[-6:]
+    messages.append({"role": "user", "content": message})
+    return messages
+
+
+def _new_messages(message: str, context: str, history: List[Dict[str, str]]):
+    return AIEngine.build_messages(message, context, history, PERSONA)
+
+
+def _render(messages: List[Dict[str, str]]) -> str:
+    return "".join(f"<{m['role']}>{m['content']}" for m in messages)
+
+
+def _shared_prefix_tokens(a: str, b: str) -> int:
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return count_tokens(a[:n])
+
+
+def _conversation(build) -> List[str]:
+    history: List[Dict[str, str]] = []
+    rendered = []
+    for i, question in enumerate(QUESTIONS):
+        context = f"[retrieval {i}] " + CHUNK  # different chunks every turn
+        rendered.append(_render(build(question, context, history)))
+        history += [
+            {"role": "user", "content": question},
+            {"role": "assistant", "content": "Sure – here is what I found. " * 8},
+        ]
+    return rendered
+
+
+def report_tokens() -> None:
+    print(f"{'layout':<8}{'turn':>6}{'prompt tok':>12}{'cacheable tok':>15}")
+    for name, build in (("old", _old_messages), ("new", _new_messages)):
+        prompts = _conversation(build)
+        for turn, prompt in enumerate(prompts):
+            cached = _shared_prefix_tokens(prompts[turn - 1], prompt) if turn else 0
+            print(f"{name:<8}{turn:>6}{count_tokens(prompt):>12}{cached:>15}")
+
+
+async def measure_ttft(runs: int) -> None:
+    from groq import AsyncGroq
+
+    from app.config import settings
+
+    client = AsyncGroq(api_key=settings.GROQ_API_KEY)
+    for name, build in (("old", _old_messages), ("new", _new_messages)):
+        samples = []
+        for i in range(runs):
+            messages = build(QUESTIONS[i % len(QUESTIONS)], f"[{i}] " + CHUNK, [])
+            started = time.perf_counter()
+            stream = await client.chat.completions.create(
+                model=settings.GROQ_MODEL, messages=messages, max_tokens=32, stream=True  # type: ignore[arg-type]
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    samples.append(time.perf_counter() - started)
+                    break
+            await stream.close()
+        print(f"{name}: median TTFT {statistics.median(samples) * 1000:.0f} ms over {runs} runs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--live", action="store_true", help="measure TTFT against Groq")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    report_tokens()
+    if args.live:
+        asyncio.run(measure_ttft(args.runs))
@@ -0,0 +1,75 @@
+"""
+SSE streaming benchmark – per-token frames (old) vs. coalesced frames (new).
+
+Runs N concurrent fake chat streams that emit one token every --gap-ms and
+reports frames written, frames/sec and CPU time per stream for the old
+`json.dumps` per-delta framing and for app.utils.sse.coalesce.
+
+Usage (from backend/):
+    python -m benchmarks.sse_stream
+    python -m benchmarks.sse_stream --streams 500 --tokens 300 --gap-ms 3
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Callable
+
+from app.utils import sse
+
+
+async def _tokens(count: int, gap: float) -> AsyncIterator[str]:
+    for i in range(count):
+        await asyncio.sleep(gap)
+        yield f" tok{i % 97}"
+
+
+async def _old(deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+    async for chunk in deltas:
+        yield f"data: {json.dumps({'content': chunk})}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+async def _new(deltas: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    async for frame in sse.coalesce(deltas):
+        yield frame
+    yield sse.DONE
+
+
+async def _run(writer: Callable, streams: int, tokens: int, gap: float):
+    frames = 0
+    written = 0
+
+    async def _one() -> None:
+        nonlocal frames, written
+        async for frame in writer(_tokens(tokens, gap)):
+            frames += 1
+            written += len(frame)
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    await asyncio.gather(*(_one() for _ in range(streams)))
+    return frames, written, time.perf_counter() - wall, time.process_time() - cpu
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--gap-ms", type=float, default=3.0, help="delay between upstream tokens")
+    args = parser.parse_args()
+
+    print(f"{args.streams} streams x {args.tokens} tokens, {args.gap_ms} ms/token")
+    print(f"{'writer':<8}{'frames':>10}{'KiB':>10}{'frames/s':>12}{'wall s':>9}{'CPU ms/stream':>15}")
+    for name, writer in (("old", _old), ("new", _new)):
+        frames, written, wall, cpu = asyncio.run(
+            _run(writer, args.streams, args.tokens, args.gap_ms / 1000)
+        )
+        print(
+            f"{name:<8}{frames:>10}{written / 1024:>10.0f}{frames / wall:>12.0f}"
+            f"{wall:>9.2f}{cpu * 1000 / args.streams:>15.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import asyncio
+import os
 import sys
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -7,7 +8,13 @@ import logging
 
 from app.config import settings
 from app.database import init_db
-from app.routers import chat, ingest, embeddings, health, telegram
+from app.services.doc_status import get_doc_status_service
+from app.services.http_clients import HTTP2_AVAILABLE, http_clients
+from app.services.rollups import get_rollup_service
+from app.services.telemetry import get_telemetry_writer
+from app.services.redis_client import close_redis
+from app.services import telegram_bot
+from app.routers import analytics, chat, ingest, embeddings, health, telegram
 
 logging.basicConfig(
     level=logging.INFO,
@@ -52,8 +59,7 @@ async def lifespan(app: FastAPI):
     # ── 3. ChromaDB ───────────────────────────────────────────────────────────
     _wait(f"Checking ChromaDB at {settings.CHROMA_HOST}:{settings.CHROMA_PORT} …")
     try:
-        import httpx
-        r = httpx.get(
+        r = await http_clients.get("internal").get(
             f"http://{settings.CHROMA_HOST}:{settings.CHROMA_PORT}/api/v1/heartbeat",
             timeout=3,
         )
@@ -64,8 +70,38 @@ async def lifespan(app: FastAPI):
     except Exception:
         _fail("ChromaDB unreachable – document search will not work")
 
-    # ── 4. Routers ────────────────────────────────────────────────────────────
-    _ok("Routers mounted  (health · chat · ingest · embeddings · telegram)")
+    # ── 4. HTTP clients ───────────────────────────────────────────────────────
+    _ok(f"Pooled HTTP clients ready  (http2: {'on' if HTTP2_AVAILABLE else 'off'})")
+
+    # ── 5. Background jobs ────────────────────────────────────────────────────
+    rollup_task = None
+    if settings.ROLLUP_REFRESH_SECONDS > 0:
+        rollup_task = asyncio.create_task(get_rollup_service().run_forever())
+        _ok(f"Analytics rollups refresh every {settings.ROLLUP_REFRESH_SECONDS:.0f}s")
+    if not settings.NL2SQL_DB_ROLE:
+        _fail("NL2SQL_DB_ROLE is not set – analytics questions are disabled (scripts/nl2sql-role.sql)")
+    if settings.TELEMETRY_ENABLED:
+        get_telemetry_writer().start()
+        _ok("Usage telemetry writer started")
+    get_doc_status_service().start()
+    _ok(f"Document status writes flushed every {settings.DOC_STATUS_FLUSH_MS}ms")
+    telegram_task = None
+    if settings.TELEGRAM_MODE == "polling":
+        telegram_task = asyncio.create_task(telegram_bot.run_poller())
+        _ok(
+            f"Telegram bots restoring  (shard {settings.TELEGRAM_SHARD_INDEX}"
+            f"/{settings.TELEGRAM_SHARD_COUNT})"
+        )
+    elif settings.TELEGRAM_MODE == "webhook" and not settings.TELEGRAM_WEBHOOK_SECRET:
+        _fail("TELEGRAM_MODE=webhook without TELEGRAM_WEBHOOK_SECRET – webhook bots are disabled")
+    elif settings.TELEGRAM_MODE == "webhook" and int(os.environ.get("WEB_CONCURRENCY", "1")) > 1:
+        # per-chat ordering lives in each process (see telegram_dispatch.py)
+        _fail("TELEGRAM_MODE=webhook needs a single API worker – replies may arrive out of order")
+    else:
+        _ok(f"Telegram mode: {settings.TELEGRAM_MODE}")
+
+    # ── 6. Routers ────────────────────────────────────────────────────────────
+    _ok("Routers mounted  (health · chat · ingest · embeddings · telegram · analytics)")
 
     _hdr("══════════  Startup complete – listening on :8000  ══════════\n")
 
@@ -75,6 +111,15 @@ async def lifespan(app: FastAPI):
         pass  # Python 3.13 sends CancelledError on Ctrl-C; suppress the noise
     finally:
         print(f"\n{YLW}  ⏹  SupportIQ Backend shutting down …{RST}", flush=True)
+        if rollup_task is not None:
+            rollup_task.cancel()
+        if telegram_task is not None:
+            telegram_task.cancel()
+        await telegram_bot.stop_all()
+        await get_telemetry_writer().close()
+        await get_doc_status_service().close()
+        await close_redis()
+        await http_clients.aclose()
 
 
 app = FastAPI(
@@ -97,3 +142,4 @@ app.include_router(chat.router, prefix="/chat", tags=["chat"])
 app.include_router(ingest.router, prefix="/ingest", tags=["ingest"])
 app.include_router(embeddings.router, prefix="/embeddings", tags=["embeddings"])
 app.include_router(telegram.router, prefix="/telegram", tags=["telegram"])
+app.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
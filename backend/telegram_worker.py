@@ -0,0 +1,74 @@
+"""
+Telegram worker – polls one shard of the Telegram bots outside the API
+process (TELEGRAM_MODE=worker on the API).
+
+Run one process per shard:
+
+    TELEGRAM_SHARD_COUNT=4 TELEGRAM_SHARD_INDEX=0 python telegram_worker.py
+    python telegram_worker.py --shard-count 4 --shard-index 1
+
+Each worker restores the bots of its shard from "Chatbot"."telegramToken",
+re-syncs every TELEGRAM_SYNC_SECONDS, and answers through the RAG pipeline
+in-process.
+"""
+import argparse
+import asyncio
+import logging
+import signal
+from contextlib import suppress
+
+from app.config import settings
+from app.services import telegram_bot
+from app.services.http_clients import http_clients
+from app.services.redis_client import close_redis
+from app.services.telemetry import get_telemetry_writer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s  %(levelname)-8s  %(name)s – %(message)s",
+)
+logger = logging.getLogger("telegram_worker")
+
+
+async def run() -> None:
+    if settings.TELEGRAM_MODE == "polling":
+        logger.warning("TELEGRAM_MODE=polling: the API process polls bots too; use worker mode on the API")
+    if settings.TELEMETRY_ENABLED:
+        get_telemetry_writer().start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):  # Windows
+            loop.add_signal_handler(sig, stop.set)
+
+    logger.info(
+        "Telegram worker shard %d/%d starting", settings.TELEGRAM_SHARD_INDEX, settings.TELEGRAM_SHARD_COUNT
+    )
+    poller = asyncio.create_task(telegram_bot.run_poller())
+    try:
+        await stop.wait()
+    finally:
+        poller.cancel()
+        await asyncio.gather(poller, return_exceptions=True)
+        await telegram_bot.stop_all()
+        await get_telemetry_writer().close()
+        await close_redis()
+        await http_clients.aclose()
+        logger.info("Telegram worker stopped")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shard-count", type=int, default=settings.TELEGRAM_SHARD_COUNT)
+    parser.add_argument("--shard-index", type=int, default=settings.TELEGRAM_SHARD_INDEX)
+    args = parser.parse_args()
+    if not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard-index must be in [0, --shard-count)")
+    settings.TELEGRAM_SHARD_COUNT = args.shard_count
+    settings.TELEGRAM_SHARD_INDEX = args.shard_index
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Tests for per-chatbot rate limiting and weighted fair scheduling."""
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejected, FairScheduler
+
+
+def _controller(monkeypatch, rate=1.0, burst=2) -> AdmissionController:
+    controller = AdmissionController(redis_url="")
+    controller.limits["chat"] = (rate, burst)
+    monkeypatch.setattr(controller, "weight", AsyncMock(return_value=1.0))
+    return controller
+
+
+@pytest.mark.asyncio
+async def test_slots_are_shared_in_proportion_to_weight():
+    scheduler = FairScheduler("chat", slots=1)
+    holder = scheduler.enqueue("warmup", 1.0)
+    tickets = [scheduler.enqueue("small", 1.0) for _ in range(6)]
+    tickets += [scheduler.enqueue("big", 3.0) for _ in range(6)]
+    assert holder.granted and not any(t.granted for t in tickets)
+
+    order = []
+    current = holder
+    for _ in range(8):
+        current.release()
+        current = next(t for t in tickets if t.granted and t not in order)
+        order.append(current)
+
+    assert [t.chatbot_id for t in order].count("big") == 6  # 3:1 share while both wait
+    assert scheduler.depth("small") == 4 and scheduler.depth("big") == 0
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_rejects_with_retry_after(monkeypatch):
+    controller = _controller(monkeypatch, rate=0.5, burst=2)
+
+    for _ in range(2):
+        (await controller.admit("chat", "bot-1")).release()
+    with pytest.raises(AdmissionRejected) as exc:
+        await controller.admit("chat", "bot-1")
+
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "2"
+    (await controller.admit("chat", "bot-2")).release()  # other tenants unaffected
+
+
+@pytest.mark.asyncio
+async def test_full_queue_and_wait_timeout_answer_429(monkeypatch):
+    controller = _controller(monkeypatch, rate=100.0, burst=100)
+    scheduler = controller.schedulers["chat"]
+    scheduler.slots, scheduler.max_queue = 1, 2
+
+    running = await controller.admit("chat", "bot-1")
+    queued = [await controller.admit("chat", "bot-1") for _ in range(2)]
+    with pytest.raises(AdmissionRejected):
+        await controller.admit("chat", "bot-1")  # queue full
+
+    with pytest.raises(AdmissionRejected):
+        await queued[0].wait(timeout=0.01)
+    assert scheduler.depth("bot-1") == 1
+
+    running.release()
+    await asyncio.wait_for(queued[1].wait(), 1)  # the abandoned ticket is skipped
+    queued[1].release()
+    assert scheduler.active == 0
+
+
+def test_chat_endpoint_answers_429_with_retry_after():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    admission = MagicMock(admit=AsyncMock(side_effect=AdmissionRejected(2.5, "Rate limit exceeded")))
+    with patch("app.routers.chat.get_admission", return_value=admission):
+        resp = TestClient(app).post(
+            "/chat/message",
+            json={"chatbot_id": "bot-1", "session_id": "s", "message": "hi", "history": []},
+        )
+
+    assert resp.status_code == 429
+    assert resp.headers["retry-after"] == "3"
+
+
+@pytest.mark.asyncio
+async def test_failed_upload_read_takes_no_ingest_ticket():
+    from fastapi import BackgroundTasks
+
+    from app.routers import ingest
+
+    admission = MagicMock(admit=AsyncMock())
+    upload = MagicMock(read=AsyncMock(side_effect=OSError("client went away")))
+    with patch("app.routers.ingest.get_admission", return_value=admission):
+        with pytest.raises(OSError):
+            await ingest.ingest_document(BackgroundTasks(), "bot-1", "doc-1", upload)
+
+    admission.admit.assert_not_awaited()
@@ -37,3 +37,86 @@ async def test_chat_message_streams():
             assert resp.status_code == 200
             content = b"".join(resp.iter_bytes())
             assert b"Test" in content
+
+
+def test_metrics_endpoint_exposes_stage_histograms():
+    from app.services.metrics import RequestTrace
+
+    trace = RequestTrace("bot-metrics")
+    with trace.activate():
+        trace.observe("retrieve", 0.01)
+    trace.finish()
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert 'rag_stage_seconds_count{chatbot="bot-metrics",stage="retrieve"}' in resp.text
+
+
+def test_telegram_endpoint_returns_whole_reply_and_usage():
+    from app.services.llm_router import Completion
+
+    with patch(
+        "app.routers.chat.rag_service.complete",
+        new=AsyncMock(return_value=Completion("Hi there", prompt_tokens=40, completion_tokens=2)),
+    ):
+        resp = client.post(
+            "/chat/telegram",
+            json={"chatbot_id": "bot-1", "session_id": "tg_1", "message": "Hello"},
+        )
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["reply"] == body["content"] == "Hi there"
+    assert body["tokens_used"] == 42
+
+
+def test_embeddings_query_batches_embedding_and_search():
+    from app.services.chroma_service import RetrievedChunk
+
+    embed = AsyncMock(side_effect=lambda texts, model=None: [[float(len(t))] for t in texts])
+
+    async def _query_batch(chatbot_id, vectors, n_results, model=None):
+        return [[RetrievedChunk(f"{chatbot_id}_{v[0]:.0f}", "chunk", 0.9, {"chunk_index": 0})] for v in vectors]
+
+    with (
+        patch("app.routers.embeddings.embedding_service.embed_chunks", new=embed),
+        patch("app.routers.embeddings.chroma_service.embedding_model", new=AsyncMock(return_value="m")),
+        patch("app.routers.embeddings.chroma_service.query_batch", side_effect=_query_batch) as search,
+    ):
+        resp = client.post("/embeddings/query", json={"queries": [
+            {"chatbot_id": "bot-a", "query": "hours"},
+            {"chatbot_id": "bot-b", "query": "refund policy"},
+            {"chatbot_id": "bot-a", "query": "hours"},
+        ]})
+
+    assert resp.status_code == 200
+    results = resp.json()["results"]
+    assert [r["chunks"][0]["id"] for r in results] == ["bot-a_5", "bot-b_13", "bot-a_5"]
+    embed.assert_awaited_once_with(["hours", "refund policy"], model="m")
+    assert search.call_count == 2  # one Chroma call per chatbot
+    assert all(r["error"] is None for r in results)
+
+
+def test_embeddings_query_reports_failed_searches():
+    from app.services.chroma_service import RetrievedChunk
+
+    async def _query_batch(chatbot_id, vectors, n_results, model=None):
+        if chatbot_id == "bot-b":
+            raise ConnectionError("Chroma unreachable")
+        return [[RetrievedChunk("a_0", "chunk", 0.9, {})] for _ in vectors]
+
+    with (
+        patch("app.routers.embeddings.embedding_service.embed_chunks",
+              new=AsyncMock(side_effect=lambda texts, model=None: [[0.0] for _ in texts])),
+        patch("app.routers.embeddings.chroma_service.embedding_model", new=AsyncMock(return_value="m")),
+        patch("app.routers.embeddings.chroma_service.query_batch", side_effect=_query_batch),
+    ):
+        resp = client.post("/embeddings/query", json={"queries": [
+            {"chatbot_id": "bot-a", "query": "hours"},
+            {"chatbot_id": "bot-b", "query": "hours"},
+        ]})
+
+    assert resp.status_code == 200
+    ok, failed = resp.json()["results"]
+    assert ok["error"] is None and ok["chunks"][0]["id"] == "a_0"
+    assert failed["chunks"] == [] and "Chroma unreachable" in failed["error"]
@@ -0,0 +1,69 @@
+"""Tests for coalesced document status writes and the progress channel."""
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.services.doc_status import DocumentStatusService
+
+
+def _service() -> DocumentStatusService:
+    service = DocumentStatusService(redis_url="", flush_interval=0.01, engine=MagicMock())
+    service.batches = []
+
+    async def _write(batch):
+        service.batches.append([(s.document_id, s.status, s.chunks) for s in batch])
+
+    service._write = _write
+    return service
+
+
+@pytest.mark.asyncio
+async def test_progress_ticks_coalesce_into_one_batched_write():
+    service = _service()
+    for chunks in range(0, 320, 32):
+        await service.update("doc-1", "PROCESSING", chunks)
+    await service.update("doc-2", "PROCESSING", 5)
+
+    assert service.batches == []  # nothing written until the flush
+    assert await service.flush() == 2
+    assert service.batches == [[("doc-1", "PROCESSING", 288), ("doc-2", "PROCESSING", 5)]]
+
+
+@pytest.mark.asyncio
+async def test_terminal_state_is_written_immediately_and_failures_retry():
+    service = _service()
+    calls = []
+
+    async def _flaky(batch):
+        calls.append([s.status for s in batch])
+        if len(calls) == 1:
+            raise ConnectionError("db down")
+
+    service._write = _flaky
+    await service.update("doc-1", "DONE", 12)
+    assert calls == [["DONE"]] and "doc-1" in service._pending
+
+    await service.update("doc-2", "PROCESSING")
+    await service.flush()
+    assert calls[-1] == ["DONE", "PROCESSING"] and not service._pending
+
+
+@pytest.mark.asyncio
+async def test_subscriber_streams_progress_until_done():
+    service = _service()
+    await service.update("doc-1", "PROCESSING")
+
+    async def collect():
+        return [s async for s in service.subscribe("doc-1", heartbeat=0.02)]
+
+    task = asyncio.create_task(collect())
+    await asyncio.sleep(0.05)
+    await service.update("doc-1", "PROCESSING", 32, 2)
+    await service.update("doc-1", "DONE", 40, 3)
+    states = await asyncio.wait_for(task, 1)
+
+    progress = [(s.status, s.chunks, s.pages) for s in states if s is not None]
+    assert progress == [("PROCESSING", 0, 0), ("PROCESSING", 32, 2), ("DONE", 40, 3)]
+    assert None in states  # heartbeat while idle
+    assert service._local_subs == {}
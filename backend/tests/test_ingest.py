@@ -33,3 +33,101 @@ async def test_document_processor_unknown_ext_falls_back_to_plaintext():
     content = "This is plain text.".encode()
     chunks = await processor.process("file.xyz", content)
     assert len(chunks) >= 1
+
+
+def test_dedup_chunks_drops_near_duplicates():
+    from app.utils.simhash import dedup_chunks
+
+    body = " ".join(f"Our store offers service number {i} at a fair price." for i in range(40))
+    chunks = [
+        f"Updated 1 March 2024. {body}",
+        f"Updated 2 April 2024. {body}",
+        "Completely different text about shipping times and return windows for parcels.",
+    ]
+    kept, stats = dedup_chunks(chunks, threshold=0.9)
+    assert kept == [chunks[0], chunks[2]]
+    assert stats.dropped == 1
+    assert stats.storage_avoided() > 0
+
+
+def test_dedup_chunks_threshold_one_keeps_distinct_text():
+    from app.utils.simhash import dedup_chunks
+
+    kept, stats = dedup_chunks(["alpha beta gamma delta", "epsilon zeta eta theta"], threshold=1.0)
+    assert len(kept) == 2
+    assert stats.dropped == 0
+
+
+@pytest.mark.asyncio
+async def test_url_pipeline_streams_pages_with_source_urls():
+    from unittest.mock import AsyncMock, MagicMock
+
+    from app.services.ingest_pipeline import URLIngestPipeline
+    from app.services.url_scraper import CrawledPage
+
+    async def _fake_pages(url, max_pages, report):
+        yield CrawledPage(url="https://a.test/", text="Opening hours are nine to five.")
+        yield CrawledPage(url="https://a.test/pricing", text="A haircut costs twenty dollars.")
+
+    scraper = MagicMock()
+    scraper.iter_pages = _fake_pages
+    embedder = MagicMock()
+    embedder.embed_chunks = AsyncMock(side_effect=lambda chunks, model=None: [[0.0] * 3 for _ in chunks])
+    chroma = MagicMock()
+    chroma.add_chunks = AsyncMock()
+    chroma.embedding_model = AsyncMock(return_value="all-MiniLM-L6-v2")
+
+    progress = []
+
+    async def _on_progress(r):
+        progress.append(r.chunks)
+
+    pipeline = URLIngestPipeline(scraper, embedder, chroma, TextSplitter())
+    result = await pipeline.run("bot-1", "doc-1", "https://a.test/", on_progress=_on_progress)
+
+    assert result.pages == 2
+    assert result.chunks == 2
+    assert progress and progress[-1] == 2
+    urls = [u for call in chroma.add_chunks.await_args_list for u in call.kwargs["source_urls"]]
+    assert urls == ["https://a.test/", "https://a.test/pricing"]
+
+
+@pytest.mark.asyncio
+async def test_collection_embedding_model_recorded_and_defaulted(monkeypatch):
+    from unittest.mock import MagicMock, patch
+    from app.config import settings
+    from app.services.chroma_service import ChromaService
+    from app.services.embedding_service import collection_model
+
+    monkeypatch.setattr(settings, "EMBEDDING_MODE", "multilingual")
+    assert collection_model() == settings.MULTILINGUAL_EMBEDDING_MODEL
+
+    service = ChromaService()
+    legacy = MagicMock(metadata={"hnsw:space": "cosine"})
+    with (
+        patch.object(service, "_get_collection", return_value=legacy),
+        patch.object(service, "_get_or_create_collection", return_value=legacy),
+    ):
+        assert await service.embedding_model("old-bot") == settings.EMBEDDING_MODEL
+        service.set_embedding_model("old-bot", "multi")
+    legacy.modify.assert_called_once_with(metadata={"embedding_model": "multi"})
+    assert await service.embedding_model("old-bot") == "multi"
+
+
+@pytest.mark.asyncio
+async def test_query_with_stale_model_raises_until_re_embedded():
+    from unittest.mock import MagicMock, patch
+    from app.services.chroma_service import ChromaService, EmbeddingModelChanged
+
+    service = ChromaService()
+    swapped = MagicMock(metadata={"embedding_model": "multi"})
+    swapped.query.return_value = {"ids": [["d_0"]], "documents": [["chunk"]]}
+    service._models["bot"] = ("old", float("inf"))  # cached before the swap
+
+    with patch.object(service, "_get_collection", return_value=swapped):
+        assert await service.embedding_model("bot") == "old"
+        with pytest.raises(EmbeddingModelChanged) as exc:
+            await service.query("bot", [0.1], model="old")
+        assert exc.value.model == "multi"
+        assert await service.embedding_model("bot") == "multi"  # cache corrected
+        assert await service.query("bot", [0.2], model="multi") == ["chunk"]
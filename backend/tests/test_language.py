@@ -0,0 +1,39 @@
+"""Tests for local language identification and translation bypass."""
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.services.language_service import LanguageService
+from app.utils.lang_id import detect
+
+
+def test_detects_script_and_latin_languages_with_confidence():
+    assert detect("Здравствуйте, сколько стоит доставка?").lang == "ru"
+    assert detect("こんにちは、送料はいくらですか？").lang == "ja"
+    assert detect("¿Cuánto cuesta el envío a Madrid?").lang == "es"
+    assert detect("Ich habe mein Passwort vergessen").lang == "de"
+    assert detect("ok").confidence < 0.5
+
+
+@pytest.mark.asyncio
+async def test_translate_skips_same_language_and_caches():
+    service = LanguageService()
+    reply = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Hello, how much?"))])
+
+    with patch.object(service.gateway, "complete", AsyncMock(return_value=reply)) as complete:
+        assert await service.translate("What are your opening hours?", "en") == "What are your opening hours?"
+        assert await service.translate("Hola, ¿cuánto cuesta?", "en") == "Hello, how much?"
+        assert await service.translate("Hola, ¿cuánto cuesta?", "en") == "Hello, how much?"
+
+    assert complete.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_short_message_falls_back_to_session_language():
+    from app.services.session_store import SessionStore
+
+    service = LanguageService()
+    with patch("app.services.language_service.get_session_store", return_value=SessionStore(redis_url="")):
+        assert await service.detect_for_session("bot-1", "s1", "Bonjour, est-ce que vous livrez à Lyon ?") == "fr"
+        assert await service.detect_for_session("bot-1", "s1", "ok") == "fr"
@@ -0,0 +1,66 @@
+"""Tests for the shared Groq gateway (admission, priorities, retries)."""
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import pytest
+from groq import RateLimitError
+
+from app.services.llm_gateway import LLMGateway, Priority
+
+
+def _rate_limit_error(retry_after: str = "0") -> RateLimitError:
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    response = httpx.Response(429, headers={"retry-after": retry_after}, request=request)
+    return RateLimitError("rate limited", response=response, body=None)
+
+
+def _gateway_with(create: AsyncMock, **kwargs) -> LLMGateway:
+    gateway = LLMGateway(rpm=1000, tpm=1_000_000, **kwargs)
+    gateway._client = MagicMock()
+    gateway._client.chat.completions.create = create
+    return gateway
+
+
+@pytest.mark.asyncio
+async def test_complete_retries_on_429(monkeypatch):
+    monkeypatch.setattr("app.services.llm_gateway.RETRY_BACKOFF", 0.0)
+    ok = SimpleNamespace(usage=None, choices=[])
+    create = AsyncMock(side_effect=[_rate_limit_error(), ok])
+    gateway = _gateway_with(create, max_retries=2)
+
+    result = await gateway.complete([{"role": "user", "content": "hi"}], max_tokens=10)
+
+    assert result is ok
+    assert create.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_complete_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr("app.services.llm_gateway.RETRY_BACKOFF", 0.0)
+    create = AsyncMock(side_effect=_rate_limit_error())
+    gateway = _gateway_with(create, max_retries=1)
+
+    with pytest.raises(RateLimitError):
+        await gateway.complete([{"role": "user", "content": "hi"}], max_tokens=10)
+    assert create.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_interactive_is_admitted_before_background():
+    gateway = LLMGateway(rpm=1000, tpm=1_000_000, max_concurrency=1)
+    order = []
+
+    async def _call(name, priority):
+        async with gateway._slot(priority, 1):
+            order.append(name)
+
+    async with gateway._slot(Priority.INTERACTIVE, 1):
+        background = asyncio.create_task(_call("background", Priority.BACKGROUND))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(_call("interactive", Priority.INTERACTIVE))
+        await asyncio.sleep(0)
+
+    await asyncio.gather(background, interactive)
+    assert order == ["interactive", "background"]
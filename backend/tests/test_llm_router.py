@@ -0,0 +1,97 @@
+"""Tests for multi-provider LLM routing, fallback and hedging."""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.services.llm_router import LLMProvider, LLMRouter, OpenAICompatProvider
+
+
+class _FakeProvider(LLMProvider):
+    def __init__(self, name, tokens, delay=0.0, fail=False):
+        self.name = name
+        self.tokens = tokens
+        self.delay = delay
+        self.fail = fail
+        self.closed = False
+
+    async def stream(self, messages, max_tokens):
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError(f"{self.name} is down")
+            for token in self.tokens:
+                yield token
+        finally:
+            self.closed = True
+
+
+async def _collect(router):
+    return [t async for t in router.stream([{"role": "user", "content": "hi"}], 16)]
+
+
+@pytest.mark.asyncio
+async def test_falls_back_when_primary_fails():
+    primary = _FakeProvider("primary", ["x"], fail=True)
+    fallback = _FakeProvider("fallback", ["Hello", " there"])
+    router = LLMRouter([primary, fallback])
+
+    assert await _collect(router) == ["Hello", " there"]
+    assert router.ranked()[0] is fallback  # primary is cooling down
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_cancels_slow_primary():
+    slow = _FakeProvider("slow", ["late"], delay=1.0)
+    fast = _FakeProvider("fast", ["quick"])
+    router = LLMRouter([slow, fast], hedge_after_ms=20)
+
+    assert await _collect(router) == ["quick"]
+    assert slow.closed
+    assert router.stats["fast"].samples == 1
+
+
+@pytest.mark.asyncio
+async def test_primary_that_turns_slow_drops_in_the_ranking():
+    primary = _FakeProvider("primary", ["hi"])
+    backup = _FakeProvider("backup", ["hello"], delay=0.01)
+    router = LLMRouter([primary, backup], hedge_after_ms=20)
+    assert await _collect(router) == ["hi"]
+    assert router.ranked()[0] is primary
+
+    primary.delay = 1.0
+    assert await _collect(router) == ["hello"]
+
+    # the lost race counts as at least hedge_after + the backup's TTFT
+    assert router.stats["primary"].samples == 2
+    assert router.stats["primary"].ttft_ewma > router.stats["backup"].ttft_ewma
+    assert router.ranked()[0] is backup
+    assert await _collect(router) == ["hello"]  # no longer waits on the primary first
+    assert router.stats["primary"].samples == 2
+
+
+@pytest.mark.asyncio
+async def test_openai_compatible_stub_is_parsed():
+    def _stub(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        assert body["stream"] is True
+        lines = [
+            'data: {"choices": [{"delta": {"content": "Hi"}}]}',
+            'data: {"choices": [{"delta": {"content": "!"}}]}',
+            "data: [DONE]",
+        ]
+        return httpx.Response(200, text="\n\n".join(lines))
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(_stub))
+    provider = OpenAICompatProvider("http://stub.local/v1", "stub-model", client=client)
+
+    assert await _collect(LLMRouter([provider])) == ["Hi", "!"]
+
+
+def test_provider_without_stream_cannot_be_instantiated():
+    class _Incomplete(LLMProvider):
+        pass
+
+    with pytest.raises(TypeError):
+        _Incomplete()
@@ -0,0 +1,205 @@
+"""Tests for NL2SQL guarding, bounded execution and caching."""
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.config import settings
+from app.services.nl2sql_cache import NL2SQLCache
+from app.services.nl2sql_service import _SCOPE, ALLOWED_TABLES, NL2SQLService
+from app.utils.sql_guard import SQLRejected, guard_sql
+
+_SQL = (
+    'SELECT count(*) AS sessions FROM "ChatSession" s '
+    'JOIN "Chatbot" c ON c.id = s."chatbotId" WHERE s."createdAt" > now() - interval \'7 days\''
+)
+
+
+@pytest.fixture(autouse=True)
+def _restricted_role(monkeypatch):
+    monkeypatch.setattr(settings, "NL2SQL_DB_ROLE", "nl2sql_reader")
+
+
+def _service(sql: str = _SQL, pages=None) -> NL2SQLService:
+    service = NL2SQLService(cache=NL2SQLCache(result_ttl=60), engine=MagicMock())
+    message = SimpleNamespace(content=f"```sql\n{sql}\n```")
+    service.gateway = MagicMock()
+    service.gateway.complete = AsyncMock(
+        return_value=SimpleNamespace(choices=[SimpleNamespace(message=message)])
+    )
+    service.executed = []
+
+    async def _pages(plan, params):
+        service.executed.append(params)
+        for page in pages or [[{"sessions": 7}]]:
+            yield page
+
+    service._pages = _pages
+    return service
+
+
+def test_guard_accepts_scoped_selects_and_bounds_them():
+    guarded = guard_sql(
+        "WITH mine AS (SELECT id FROM \"Chatbot\" WHERE \"userId\" = :user_id) "
+        "SELECT extract(dow FROM m.\"createdAt\") AS dow, count(*) FROM \"Message\" m, "
+        "\"ChatSession\" s, mine WHERE m.\"sessionId\" = s.id AND s.\"chatbotId\" = mine.id "
+        "AND m.role IS DISTINCT FROM 'USER' GROUP BY 1;",
+        ALLOWED_TABLES,
+        max_rows=100,
+    )
+    assert guarded.tables == {"chatbot", "message", "chatsession"}
+    assert guarded.sql.endswith("LIMIT 101") and ";" not in guarded.sql
+
+
+def test_guard_resolves_cte_names_only_where_they_are_in_scope():
+    guarded = guard_sql(
+        "WITH RECURSIVE days(d) AS (SELECT date_trunc('day', now()) UNION ALL "
+        "SELECT d - interval '1 day' FROM days WHERE d > now() - interval '7 days'), "
+        'per_day AS NOT MATERIALIZED (SELECT day, sum(messages) AS n FROM analytics_rollup_daily GROUP BY day) '
+        "SELECT days.d, coalesce(p.n, 0)::numeric(12, 2) AS n, CAST(p.n AS integer) "
+        "FROM days LEFT JOIN per_day p ON p.day = date(days.d) "
+        "WHERE EXISTS (SELECT 1 FROM \"Chatbot\") AND p.day IN (SELECT max(day) FROM per_day)",
+        ALLOWED_TABLES,
+        max_rows=100,
+    )
+    assert guarded.tables == {"analytics_rollup_daily", "chatbot"}
+
+
+@pytest.mark.parametrize("sql", [
+    'SELECT * FROM "Chatbot"; DROP TABLE "User"',
+    'DELETE FROM "Message"',
+    "SELECT pg_sleep(60)",
+    "SELECT * FROM pg_catalog.pg_authid",
+    'SELECT * FROM "Account"',
+    'SELECT * INTO backup FROM "Message"',
+    'SELECT * FROM "Message" FOR UPDATE',
+    "SELECT 'unterminated",
+    'WITH "Account" AS (SELECT 1) SELECT * FROM public."Account" WHERE :user_id = :user_id',
+    'SELECT "telegramToken" FROM public."Chatbot" WHERE "userId" = :user_id',
+    'SELECT * FROM "Chatbot") x, (SELECT 1',
+    "SELECT schema_to_xml('public', true, false, '')",
+    "SELECT table_to_xml_and_xmlschema('public.\"Account\"', true, false, '')",
+    "SELECT * FROM ts_stat('SELECT to_tsvector(\"telegramToken\") FROM public.\"Chatbot\"')",
+    "SELECT \"query_to_xml\"('SELECT 1', true, false, '')",
+    'SELECT * FROM "Account" WHERE 1 = (WITH "Account" AS (SELECT 1 AS x) SELECT x FROM "Account")',
+    'WITH "Account" AS (SELECT * FROM "Account") SELECT * FROM "Account"',
+    'SELECT * FROM (TABLE "Account") a',
+])
+def test_guard_rejects_unsafe_sql(sql):
+    with pytest.raises(SQLRejected):
+        guard_sql(sql, ALLOWED_TABLES, max_rows=100)
+
+
+@pytest.mark.asyncio
+async def test_tables_are_shadowed_by_user_scoped_ctes_without_secrets():
+    service = _service()
+
+    result = await service.query("How many sessions this week?", "user-a")
+
+    assert result["sql"].startswith(_SCOPE)
+    assert 'public."Chatbot" WHERE "userId" = :user_id' in _SCOPE
+    for secret in ("telegramToken", "systemPrompt", "emailVerified", "d.content"):
+        assert secret not in _SCOPE
+
+
+@pytest.mark.asyncio
+async def test_repeated_question_skips_llm_and_binds_user_id():
+    service = _service()
+
+    first = await service.query("How many sessions this week?", "user-a")
+    second = await service.query("how many sessions this week", "user-b")
+
+    assert service.gateway.complete.await_count == 1
+    prompt = service.gateway.complete.await_args.args[0][0]["content"]
+    assert "user-a" not in prompt
+    assert first["rows"] == [{"sessions": 7}] and first["cached"] is False
+    assert second["sql"] == first["sql"] and second["cached"] is False  # other user, own result
+    assert service.executed == [{"user_id": "user-a"}, {"user_id": "user-b"}]
+
+
+@pytest.mark.asyncio
+async def test_result_cache_hits_until_table_invalidated():
+    service = _service()
+
+    await service.query("sessions count", "user-a")
+    hit = await service.query("Sessions count!", "user-a")
+    assert hit["cached"] is True and len(service.executed) == 1
+
+    service.cache.invalidate("Document")  # unrelated table
+    assert (await service.query("sessions count", "user-a"))["cached"] is True
+
+    service.cache.invalidate('"ChatSession"')
+    assert (await service.query("sessions count", "user-a"))["cached"] is False
+    assert len(service.executed) == 2
+
+
+@pytest.mark.asyncio
+async def test_rejected_sql_is_not_cached():
+    service = _service('SELECT * FROM "Account"')
+
+    result = await service.query("linked accounts", "user-a")
+
+    assert "not available" in result["error"]
+    assert service.cache.get_plan("linked accounts") is None
+    assert service.executed == []
+
+
+@pytest.mark.asyncio
+async def test_shared_plan_needs_no_user_filter_and_runs_in_each_callers_scope():
+    service = _service('SELECT count(*) FROM "Message"')
+
+    first = await service.query("total messages", "user-a")
+    second = await service.query("Total messages?", "user-b")
+
+    assert "error" not in first and second["sql"] == first["sql"]
+    assert first["sql"].startswith(_SCOPE)  # the only place :user_id is bound
+    assert service.executed == [{"user_id": "user-a"}, {"user_id": "user-b"}]
+
+
+@pytest.mark.asyncio
+async def test_rows_stream_in_pages_and_stop_at_cap():
+    pages = [[{"n": i} for i in range(k, k + 3)] for k in range(0, 9, 3)]
+    service = _service(pages=pages)
+    service.max_rows = 5
+
+    events = [e async for e in service.stream("message ids", "user-a")]
+
+    assert [len(e["rows"]) for e in events if "rows" in e] == [3, 2]
+    assert events[-1] == {"count": 5, "truncated": True, "cached": False}
+
+
+@pytest.mark.asyncio
+async def test_expensive_plan_is_rejected_before_execution():
+    conn = MagicMock()
+    conn.begin.return_value.__aenter__ = AsyncMock()
+    conn.begin.return_value.__aexit__ = AsyncMock(return_value=False)
+    conn.execute = AsyncMock(return_value=MagicMock(
+        scalar=MagicMock(return_value='[{"Plan": {"Total Cost": 1e12}}]')
+    ))
+    conn.stream = AsyncMock()
+    engine = MagicMock()
+    engine.connect.return_value.__aenter__ = AsyncMock(return_value=conn)
+    engine.connect.return_value.__aexit__ = AsyncMock(return_value=False)
+    service = NL2SQLService(cache=NL2SQLCache(), engine=engine)
+
+    with pytest.raises(SQLRejected):
+        async for _ in service._pages(guard_sql(_SQL, ALLOWED_TABLES, 10), {"user_id": "u"}):
+            pass
+
+    statements = [str(call.args[0]) for call in conn.execute.await_args_list]
+    assert statements[:2] == ["SET TRANSACTION READ ONLY", 'SET LOCAL ROLE "nl2sql_reader"']
+    assert statements[2].startswith("SET LOCAL statement_timeout")
+    assert statements[3].startswith("EXPLAIN")
+    conn.stream.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_questions_are_refused_without_the_restricted_role(monkeypatch):
+    monkeypatch.setattr(settings, "NL2SQL_DB_ROLE", "")
+    service = _service()
+
+    result = await service.query("How many sessions this week?", "user-a")
+
+    assert "NL2SQL_DB_ROLE" in result["error"]
+    service.gateway.complete.assert_not_awaited()
+    assert service.executed == []
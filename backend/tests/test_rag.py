@@ -9,7 +9,7 @@ from app.services.rag_service import RagService
 async def test_stream_response_returns_chunks():
     service = RagService()
 
-    async def _fake_embed(text):
+    async def _fake_embed(text, model=None):
         return [0.0] * 384
 
     async def _fake_query(*args, **kwargs):
@@ -41,7 +41,7 @@ async def test_stream_response_empty_context():
     """When no chunks are found, the service should still stream (with empty context)."""
     service = RagService()
 
-    async def _fake_embed(text):
+    async def _fake_embed(text, model=None):
         return [0.0] * 384
 
     async def _fake_query(*args, **kwargs):
@@ -66,3 +66,91 @@ async def test_stream_response_empty_context():
 
     assert len(result) == 1
     assert "don't have" in result[0]
+
+
+def test_prompt_prefix_is_stable_across_queries():
+    from app.services.ai_engine import AIEngine
+    from app.utils.prompt_builder import Persona
+
+    persona = Persona(company_name="Acme", personality="Cheerful", language="en")
+    first = AIEngine.build_messages("Hours?", "We open at 9.", [], persona)
+    second = AIEngine.build_messages("Prices?", "Haircut costs 20.", [], persona)
+
+    assert first[:2] == second[:2]
+    assert "Acme" in first[1]["content"]
+    assert "We open at 9." in first[-2]["content"]
+    assert first[-1] == {"role": "user", "content": "Hours?"}
+
+
+@pytest.mark.asyncio
+async def test_complete_coalesces_identical_pending_questions():
+    import asyncio
+
+    from app.services.llm_router import Completion
+
+    service = RagService()
+    writer = MagicMock()
+    calls = 0
+
+    async def _fake_complete(**kwargs):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return Completion("Open 9 to 5.", prompt_tokens=10, completion_tokens=4)
+
+    with (
+        patch.object(service.embedding_svc, "embed_text", AsyncMock(return_value=[0.0] * 384)),
+        patch.object(service.chroma_svc, "query", AsyncMock(return_value=["Hours: 9-5"])),
+        patch.object(service.ai_engine, "complete", side_effect=_fake_complete),
+        patch("app.services.rag_service.settings.TELEMETRY_ENABLED", True),
+        patch("app.services.rag_service.get_telemetry_writer", return_value=writer),
+    ):
+        results = await asyncio.gather(*(
+            service.complete(chatbot_id="bot-1", session_id=f"tg_{i}", message=msg, history=[])
+            for i, msg in enumerate(["When are you open?", "when are you  OPEN?"])
+        ))
+
+    assert calls == 1
+    assert [r.text for r in results] == ["Open 9 to 5.", "Open 9 to 5."]
+    assert not service._inflight
+    # one usage row per caller; only the leader's stands for an LLM call
+    usage = sorted((call.args[0] for call in writer.record.call_args_list), key=lambda u: u.session_id)
+    assert [(u.session_id, u.mode) for u in usage] == [("tg_0", "complete"), ("tg_1", "coalesced")]
+    assert usage[1].completion_tokens == usage[0].completion_tokens == 4
+
+
+def test_intent_gate_rules():
+    from app.services.intent_gate import IntentGate
+
+    gate = IntentGate(embedding_svc=MagicMock())
+    asked = [{"role": "assistant", "content": "Shall I book Saturday 10am for you?"}]
+
+    assert not gate.classify("Hi!", []).retrieve
+    assert gate.classify("thanks 🙏", []).kind == "thanks"
+    assert gate.classify("hi, how much is a haircut?", []).retrieve
+    assert gate.classify("yes", asked).retrieve  # follow-up to our question
+    assert gate.classify("parking", []).ambiguous
+
+
+@pytest.mark.asyncio
+async def test_greeting_skips_embedding_and_search():
+    service = RagService()
+    embed = AsyncMock(return_value=[0.0] * 384)
+    query = AsyncMock(return_value=[])
+
+    async def _fake_stream(*args, **kwargs):
+        assert kwargs["max_tokens"] < 2048
+        yield "Hello! How can I help?"
+
+    with (
+        patch.object(service, "_history", AsyncMock(return_value=([], ""))),
+        patch.object(service.embedding_svc, "embed_text", embed),
+        patch.object(service.chroma_svc, "query", query),
+        patch.object(service.ai_engine, "stream", side_effect=_fake_stream),
+        patch.object(service, "_remember"),
+    ):
+        result = [c async for c in service.stream_response("bot-1", "sess-9", "hello", history=[])]
+
+    assert result == ["Hello! How can I help?"]
+    embed.assert_not_called()
+    query.assert_not_called()
@@ -0,0 +1,129 @@
+"""Tests for the analytics rollups and the overview endpoint."""
+import re
+from datetime import date, datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services import rollups
+from app.services.nl2sql_service import ALLOWED_TABLES
+from app.services.rollups import (
+    DailyRollup,
+    DailyStats,
+    HourlyRollup,
+    Overview,
+    RollupService,
+    refresh_start,
+)
+from app.utils.sql_guard import guard_sql
+from main import app
+
+
+def _insert(statement) -> tuple:
+    """(table, inserted columns, number of selected expressions) of an INSERT … SELECT."""
+    sql = str(statement)
+    table, columns = re.search(r"INSERT INTO (\w+) \(([^)]*)\)", sql).groups()
+    select = sql[sql.index("SELECT", sql.index("INSERT INTO")) + len("SELECT"):]
+    depth, fields = 0, 1
+    for char in select[:re.search(r"\bFROM\b", select).start()]:
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        fields += char == "," and depth == 0
+    return table, [c.strip() for c in columns.split(",")], fields
+
+
+def _binds(statement) -> set:
+    return set(statement.compile().params)
+
+
+def test_rollup_refresh_window_starts_an_hour_before_watermark():
+    assert refresh_start(None) == datetime(1970, 1, 1)  # first run backfills
+    assert refresh_start(datetime(2026, 3, 1, 0, 20, 5)) == datetime(2026, 2, 28, 23, 0)
+
+
+def test_hourly_refresh_fills_every_rollup_column_from_the_raw_tables():
+    table, columns, fields = _insert(rollups._REFRESH_HOURLY)
+    assert table == HourlyRollup.__tablename__
+    assert columns == [c.name for c in HourlyRollup.__table__.columns]
+    assert fields == len(columns)
+    assert _binds(rollups._REFRESH_HOURLY) == {"since", "unanswered"}
+    sql = str(rollups._REFRESH_HOURLY)
+    assert 'FROM "Message" m JOIN "ChatSession" s' in sql
+    assert "FULL OUTER JOIN ses" in sql  # hours with sessions but no messages still count
+
+
+def test_daily_refresh_sums_the_hourly_rows():
+    table, columns, fields = _insert(rollups._REFRESH_DAILY)
+    assert table == DailyRollup.__tablename__
+    assert columns == [c.name for c in DailyRollup.__table__.columns]
+    assert fields == len(columns)
+    assert _binds(rollups._REFRESH_DAILY) == {"day_start"}
+    assert "FROM analytics_rollup_hourly" in str(rollups._REFRESH_DAILY)
+
+
+@pytest.mark.asyncio
+async def test_refresh_clears_then_rebuilds_buckets_since_the_watermark():
+    conn = MagicMock()
+    results = iter([True, datetime(2026, 3, 1, 12, 5), datetime(2026, 3, 1, 0, 20)])
+    conn.execute = AsyncMock(side_effect=lambda *args: SimpleNamespace(scalar=lambda: next(results, None)))
+    engine = MagicMock()
+    engine.begin.return_value.__aenter__ = AsyncMock(return_value=conn)
+    engine.begin.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    with patch.object(rollups, "engine", engine):
+        assert await RollupService(unanswered_below=0.4).refresh()
+
+    calls = conn.execute.await_args_list
+    statements = [call.args[0] for call in calls]
+    hourly = statements.index(rollups._REFRESH_HOURLY)
+    assert statements[hourly + 1] is rollups._REFRESH_DAILY
+    assert all(s in statements[:hourly] for s in rollups._CLEAR)
+    params = calls[hourly].args[1]
+    assert params["since"] == datetime(2026, 2, 28, 23, 0)
+    assert params["day_start"] == datetime(2026, 2, 28)
+    assert params["unanswered"] == 0.4
+    # every statement gets the binds it needs
+    for call in calls[3:-1]:
+        assert _binds(call.args[0]) <= set(call.args[1])
+    assert calls[-1].args[1]["now"] == datetime(2026, 3, 1, 12, 5)
+
+
+@pytest.mark.asyncio
+async def test_refresh_skips_while_another_worker_holds_the_lock():
+    conn = MagicMock()
+    conn.execute = AsyncMock(return_value=SimpleNamespace(scalar=lambda: False))
+    engine = MagicMock()
+    engine.begin.return_value.__aenter__ = AsyncMock(return_value=conn)
+    engine.begin.return_value.__aexit__ = AsyncMock(return_value=False)
+
+    with patch.object(rollups, "engine", engine):
+        assert not await RollupService().refresh()
+    conn.execute.assert_awaited_once()
+
+
+def test_rollups_are_queryable_by_nl2sql():
+    guarded = guard_sql(
+        "SELECT r.day, sum(r.messages) FROM analytics_rollup_daily r "
+        'JOIN "Chatbot" c ON c.id = r.chatbot_id WHERE c."userId" = :user_id GROUP BY 1',
+        ALLOWED_TABLES,
+        max_rows=100,
+    )
+    assert "analytics_rollup_daily" in guarded.tables
+
+
+def test_overview_endpoint_serves_rollups():
+    service = MagicMock()
+    service.overview = AsyncMock(return_value=Overview(
+        daily=[DailyStats(date(2026, 3, 1), 4, 20, 900, 1, 0.82)],
+        languages={"en": 3, "fr": 1},
+    ))
+    with patch("app.routers.analytics.get_rollup_service", return_value=service):
+        resp = TestClient(app).get("/analytics/overview", params={"user_id": "u1", "days": 7})
+
+    assert resp.status_code == 200
+    assert resp.json()["daily"][0] == {
+        "day": "2026-03-01", "sessions": 4, "messages": 20, "tokens": 900,
+        "unanswered": 1, "avg_confidence": 0.82,
+    }
+    service.overview.assert_awaited_once_with("u1", 7)
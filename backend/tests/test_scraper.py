@@ -0,0 +1,38 @@
+"""Tests for the URL scraper helpers."""
+from bs4 import BeautifulSoup
+
+from app.services.url_scraper import (
+    JS_RENDER_THRESHOLD,
+    CrawlReport,
+    _extract_text,
+    _js_signals,
+)
+
+
+def _score(html: str) -> float:
+    soup = BeautifulSoup(html, "html.parser")
+    signals = _js_signals(soup)
+    return signals.score(len(_extract_text(soup)))
+
+
+def test_static_page_scores_low():
+    body = "<p>We are open Monday to Friday, 9am to 5pm.</p>" * 30
+    html = f"<html><body><main>{body}</main><script src='/a.js'></script></body></html>"
+    assert _score(html) < JS_RENDER_THRESHOLD
+
+
+def test_spa_shell_scores_high():
+    html = (
+        "<html><body><div id='root'></div>"
+        "<noscript>You need to enable JavaScript to run this app.</noscript>"
+        "<script src='/static/js/main.js'></script></body></html>"
+    )
+    assert _score(html) >= JS_RENDER_THRESHOLD
+
+
+def test_crawl_report_estimates_time_saved():
+    report = CrawlReport(js_scores={"a": 0.9, "b": 0.1, "c": 0.2})
+    report.js_rendered = 1
+    report.js_render_seconds = 8.0
+    assert report.js_skipped == 2
+    assert report.seconds_saved == 16.0
@@ -0,0 +1,213 @@
+"""Tests for the server-side session history store."""
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.services.rag_service import RagService
+from app.services.session_store import SessionStore
+
+
+@pytest.mark.asyncio
+async def test_ring_buffer_keeps_latest_turns_and_counts_tokens():
+    store = SessionStore(redis_url="", max_turns=4)
+    for i in range(3):
+        await store.append("bot-1", "s1", [
+            {"role": "user", "content": f"question {i}"},
+            {"role": "assistant", "content": f"answer {i}"},
+        ])
+
+    history = await store.load("bot-1", "s1")
+    assert [t["content"] for t in history.turns] == ["question 1", "answer 1", "question 2", "answer 2"]
+    assert history.tokens == sum(t["tokens"] for t in history.turns)
+    assert history.meta["total_turns"] == "6"
+    assert (await store.load("bot-1", "unknown")).turns == []
+    assert (await store.load("bot-2", "s1")).turns == []  # same session id, other bot
+
+
+@pytest.mark.asyncio
+async def test_rag_uses_stored_history_when_client_sends_none():
+    service = RagService()
+    service.session_store = SessionStore(redis_url="")
+    seen = []
+
+    async def _fake_stream(message, context, history, **kwargs):
+        seen.append(history)
+        yield f"reply to {message}"
+
+    with (
+        patch.object(service.embedding_svc, "embed_text", AsyncMock(return_value=[0.0] * 384)),
+        patch.object(service.chroma_svc, "query", AsyncMock(return_value=[])),
+        patch.object(service.ai_engine, "stream", side_effect=_fake_stream),
+    ):
+        for message in ("hi", "and prices?"):
+            _ = [c async for c in service.stream_response("bot-1", "tg_7", message, history=[])]
+            await asyncio.gather(*service._background)
+
+    assert seen[0] == []
+    assert seen[1] == [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "reply to hi"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_failed_reply_is_not_stored_as_a_turn():
+    from app.services.ai_engine import TECHNICAL_ISSUE
+
+    service = RagService()
+    service.session_store = SessionStore(redis_url="")
+
+    async def _failing_stream(message, context, history, **kwargs):
+        yield TECHNICAL_ISSUE
+
+    with (
+        patch.object(service.embedding_svc, "embed_text", AsyncMock(return_value=[0.0] * 384)),
+        patch.object(service.chroma_svc, "query", AsyncMock(return_value=[])),
+        patch.object(service.ai_engine, "stream", side_effect=_failing_stream),
+    ):
+        _ = [c async for c in service.stream_response("bot-1", "tg_7", "prices?", history=[])]
+        await asyncio.gather(*service._background)
+
+    assert (await service.session_store.load("bot-1", "tg_7")).turns == []
+
+
+@pytest.mark.asyncio
+async def test_summarizer_folds_old_turns_into_the_prompt_summary():
+    from types import SimpleNamespace
+
+    from app.services.ai_engine import AIEngine
+    from app.services.summarizer import ConversationSummarizer
+
+    store = SessionStore(redis_url="")
+    for i in range(5):
+        await store.append("bot-1", "s2", [
+            {"role": "user", "content": f"question {i} " + "detail " * 40},
+            {"role": "assistant", "content": f"answer {i} " + "detail " * 40},
+        ])
+    summarizer = ConversationSummarizer(store, trigger_tokens=100, keep_turns=2)
+    reply = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Asked 4 things."))])
+
+    with patch.object(summarizer.gateway, "complete", AsyncMock(return_value=reply)):
+        assert await summarizer.maybe_summarize("bot-1", "s2") == "Asked 4 things."
+
+    history = await store.load("bot-1", "s2")
+    assert [t["content"].split(" detail")[0] for t in history.turns] == ["question 4", "answer 4"]
+    messages = AIEngine.build_messages("next?", "", history.messages(), summary=history.summary)
+    assert "Asked 4 things." in messages[1]["content"]
+
+
+@pytest.mark.asyncio
+async def test_compaction_keeps_turns_appended_while_summarizing():
+    store = SessionStore(redis_url="", max_turns=7)
+    for i in range(3):
+        await store.append("bot-1", "s3", [
+            {"role": "user", "content": f"q{i}"},
+            {"role": "assistant", "content": f"a{i}"},
+        ])
+    before = await store.load("bot-1", "s3")
+
+    async def _append_meanwhile(summary, turns):
+        # another reply lands (and pushes q0 out of the ring) before compaction
+        await store.append("bot-1", "s3", [
+            {"role": "user", "content": "q3"},
+            {"role": "assistant", "content": "a3"},
+        ])
+        await store.append("bot-1", "s3", [{"role": "user", "content": "q4"}])
+        return "summary of q0-a1"
+
+    from app.services.summarizer import ConversationSummarizer
+
+    summarizer = ConversationSummarizer(store, trigger_tokens=10 ** 6, keep_turns=2)
+    with patch.object(summarizer, "_summarize", side_effect=_append_meanwhile):
+        assert await summarizer.maybe_summarize("bot-1", "s3") == "summary of q0-a1"
+
+    history = await store.load("bot-1", "s3")
+    assert [t["content"] for t in history.turns] == ["q2", "a2", "q3", "a3", "q4"]
+    assert history.summarized_seq == 4
+    # a compaction built on the old summary is discarded
+    assert not await store.compact("bot-1", "s3", before.summarized_seq, 6, "stale")
+    assert (await store.load("bot-1", "s3")).summary == "summary of q0-a1"
+
+
+@pytest.mark.asyncio
+async def test_summarizer_runs_before_the_ring_buffer_drops_turns():
+    from app.services.summarizer import ConversationSummarizer
+
+    store = SessionStore(redis_url="", max_turns=6)
+    summarizer = ConversationSummarizer(store, trigger_tokens=10 ** 6, keep_turns=2)
+    summarizer._summarize = AsyncMock(side_effect=lambda summary, turns: summary + "".join(
+        t["content"] for t in turns
+    ))
+    for i in range(6):
+        await store.append("bot-1", "s4", [
+            {"role": "user", "content": f"q{i}"},
+            {"role": "assistant", "content": f"a{i}"},
+        ])
+        await summarizer.maybe_summarize("bot-1", "s4")
+
+    history = await store.load("bot-1", "s4")
+    # nothing fell off the ring unsummarized
+    assert history.summary + "".join(t["content"] for t in history.turns) == "".join(
+        f"q{i}a{i}" for i in range(6)
+    )
+
+
+def test_services_share_one_redis_client_and_breaker():
+    from app.services.admission import AdmissionController
+    from app.services.doc_status import DocumentStatusService
+    from app.services.redis_client import shared_redis
+
+    url = "redis://127.0.0.1:1/0"
+    store = SessionStore(redis_url=url)
+    admission = AdmissionController(redis_url=url)
+    doc_status = DocumentStatusService(redis_url=url)
+    assert store._redis is admission._redis is doc_status._redis is shared_redis(url)
+
+    store._redis.mark_down("Session store", ConnectionError("refused"), "using in-process history")
+    assert admission._redis.available() is None and doc_status._redis.available() is None
+
+
+@pytest.mark.asyncio
+async def test_session_load_overlaps_the_query_embedding():
+    service = RagService()
+    service.session_store = SessionStore(redis_url="")
+    await service.session_store.append("bot-1", "s5", [
+        {"role": "user", "content": "do you ship abroad?"},
+        {"role": "assistant", "content": "We do. Want the rates?"},
+    ])
+    load = service.session_store.load
+    loading = asyncio.Event()
+    events = []
+
+    async def _slow_load(chatbot_id, session_id):
+        loading.set()
+        await asyncio.sleep(0.05)
+        events.append("loaded")
+        return await load(chatbot_id, session_id)
+
+    async def _embed(text, model=None):
+        await loading.wait()
+        events.append("embedded")
+        return [0.0] * 384
+
+    async def _fake_stream(message, context, history, **kwargs):
+        yield "We ship to the EU. Want the rates?"
+
+    with (
+        patch.object(service.session_store, "load", side_effect=_slow_load),
+        patch.object(service.chroma_svc, "embedding_model", AsyncMock(return_value=None)),
+        patch.object(service.embedding_svc, "embed_text", side_effect=_embed),
+        patch.object(service.chroma_svc, "query", AsyncMock(return_value=["rates"])) as query,
+        patch.object(service.ai_engine, "stream", side_effect=_fake_stream),
+    ):
+        _ = [c async for c in service.stream_response("bot-1", "s5", "where do you ship to?", [])]
+        assert events == ["embedded", "loaded"]
+        await asyncio.gather(*service._background)
+
+        # an acknowledgement waits for the history: "yes" answers our question
+        events.clear()
+        _ = [c async for c in service.stream_response("bot-1", "s5", "yes", [])]
+        assert events == ["loaded", "embedded"]
+        assert query.await_count == 2
+    await asyncio.gather(*service._background)
@@ -0,0 +1,59 @@
+"""Tests for SSE frame coalescing."""
+import asyncio
+import json
+
+import pytest
+
+from app.utils import sse
+
+
+async def _deltas(tokens, delay=0.0, fail=False):
+    for token in tokens:
+        await asyncio.sleep(delay)
+        yield token
+    if fail:
+        raise RuntimeError("upstream broke")
+
+
+def _contents(frames):
+    return [json.loads(f[len(b"data: "):])["content"] for f in frames if f.startswith(b"data: ")]
+
+
+@pytest.mark.asyncio
+async def test_deltas_are_coalesced_into_few_frames():
+    tokens = [f"t{i} " for i in range(50)]
+    frames = [f async for f in sse.coalesce(_deltas(tokens), window=0.05)]
+
+    assert "".join(_contents(frames)) == "".join(tokens)
+    assert len(frames) < 5
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_while_upstream_is_idle_and_error_flushes_buffer():
+    frames = []
+    with pytest.raises(RuntimeError):
+        async for frame in sse.coalesce(
+            _deltas(["a", "b"], delay=0.05, fail=True), window=0.001, heartbeat=0.02
+        ):
+            frames.append(frame)
+
+    assert sse.PING in frames
+    assert "".join(_contents(frames)) == "ab"
+
+
+@pytest.mark.asyncio
+async def test_closing_the_writer_closes_upstream():
+    closed = asyncio.Event()
+
+    async def _endless():
+        try:
+            while True:
+                await asyncio.sleep(0.001)
+                yield "x"
+        finally:
+            closed.set()
+
+    writer = sse.coalesce(_endless(), window=0.005)
+    await writer.__anext__()
+    await writer.aclose()
+    assert closed.is_set()
@@ -0,0 +1,65 @@
+"""Tests for chat stream caps and disconnect handling."""
+import asyncio
+
+import pytest
+
+from app.services.stream_guard import StreamGuard
+
+
+class _Upstream:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = 0
+        self.closed = False
+
+    async def stream(self):
+        try:
+            while True:
+                await asyncio.sleep(self.delay)
+                self.sent += 1
+                yield "word "
+        finally:
+            self.closed = True
+
+
+class _DisconnectingRequest:
+    def __init__(self, after):
+        self.after = after
+
+    async def receive(self):
+        await asyncio.sleep(self.after)
+        return {"type": "http.disconnect"}
+
+
+@pytest.mark.asyncio
+async def test_token_cap_closes_upstream():
+    upstream = _Upstream()
+    guard = StreamGuard("bot-1", max_tokens=5)
+
+    chunks = [c async for c in guard.wrap(upstream.stream())]
+
+    assert len(chunks) == 5
+    assert guard.reason == "token_cap"
+    assert upstream.closed
+
+
+@pytest.mark.asyncio
+async def test_wall_clock_cap_interrupts_a_stalled_upstream():
+    upstream = _Upstream(delay=10)
+    guard = StreamGuard("bot-1", max_seconds=0.05)
+
+    assert [c async for c in guard.wrap(upstream.stream())] == []
+    assert guard.reason == "timeout"
+    assert upstream.closed
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_stops_generation_promptly():
+    upstream = _Upstream(delay=0.01)
+    guard = StreamGuard("bot-1", _DisconnectingRequest(after=0.05))  # type: ignore[arg-type]
+
+    chunks = [c async for c in guard.wrap(upstream.stream())]
+
+    assert guard.disconnected
+    assert upstream.closed
+    assert len(chunks) < 20
@@ -0,0 +1,236 @@
+"""Tests for Telegram bot sharding, registration sync and the webhook endpoint."""
+import asyncio
+from collections import Counter
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.services import telegram_bot
+from app.services.telegram_bot import BotRegistration, shard_of
+
+
+def test_shards_are_stable_and_balanced():
+    ids = [f"cl{i:06d}" for i in range(2000)]
+
+    counts = Counter(shard_of(cid, 4) for cid in ids)
+
+    assert sorted(counts) == [0, 1, 2, 3]
+    assert min(counts.values()) > 400
+    assert [shard_of(cid, 4) for cid in ids[:50]] == [shard_of(cid, 4) for cid in ids[:50]]
+
+
+@pytest.mark.asyncio
+async def test_sync_starts_own_shard_and_stops_removed(monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_SHARD_COUNT", 2)
+    monkeypatch.setattr(settings, "TELEGRAM_SHARD_INDEX", 0)
+    ids = [f"bot-{i}" for i in range(10)]
+    mine = [cid for cid in ids if shard_of(cid) == 0]
+    registrations = [BotRegistration(cid, f"token-{cid}", cid) for cid in ids]
+
+    running = {"removed": SimpleNamespace(bot=SimpleNamespace(token="t"))}
+    monkeypatch.setattr(telegram_bot, "_running_bots", running)
+    monkeypatch.setattr(telegram_bot, "_failed_tokens", {})
+    monkeypatch.setattr(telegram_bot, "load_registrations", AsyncMock(return_value=registrations))
+
+    async def _start(chatbot_id, token, business_name, backend_url=None):
+        running[chatbot_id] = SimpleNamespace(bot=SimpleNamespace(token=token))
+        return True
+
+    async def _stop(chatbot_id, unregister=False):
+        running.pop(chatbot_id, None)
+
+    with patch.object(telegram_bot, "start_bot", side_effect=_start) as start, \
+            patch.object(telegram_bot, "stop_bot", side_effect=_stop):
+        await telegram_bot.sync_bots()
+        await telegram_bot.sync_bots()  # nothing changed: no restarts
+
+    assert sorted(running) == sorted(mine)
+    assert start.await_count == len(mine)
+
+
+@pytest.mark.asyncio
+async def test_webhook_update_is_queued_on_the_bots_application(monkeypatch):
+    from telegram import Bot, Update
+
+    app = SimpleNamespace(bot=Bot("123:ABC"), update_queue=asyncio.Queue())
+    monkeypatch.setattr(telegram_bot, "_running_bots", {"bot-1": app})
+    monkeypatch.setattr(telegram_bot, "_webhook_recheck", {"bot-1": float("inf")})
+    payload = {
+        "update_id": 7,
+        "message": {
+            "message_id": 1, "date": 0, "text": "hi",
+            "chat": {"id": 42, "type": "private"},
+        },
+    }
+
+    assert await telegram_bot.handle_webhook_update("bot-1", payload)
+    update = app.update_queue.get_nowait()
+    assert isinstance(update, Update) and update.message.chat_id == 42
+
+
+@pytest.mark.asyncio
+async def test_webhook_app_is_rechecked_and_dropped_when_unregistered(monkeypatch):
+    app = SimpleNamespace(bot=SimpleNamespace(token="old"), update_queue=asyncio.Queue())
+    running = {"bot-1": app}
+    monkeypatch.setattr(telegram_bot, "_running_bots", running)
+    monkeypatch.setattr(telegram_bot, "_webhook_recheck", {"bot-1": 0.0})  # TTL expired
+    registrations = AsyncMock(return_value=[])
+    monkeypatch.setattr(telegram_bot, "load_registrations", registrations)
+
+    async def _stop(chatbot_id, unregister=False, token=None):
+        running.pop(chatbot_id, None)
+
+    with patch.object(telegram_bot, "stop_bot", side_effect=_stop) as stop:
+        assert not await telegram_bot.handle_webhook_update("bot-1", {"update_id": 1})
+
+    stop.assert_awaited_once_with("bot-1")
+    assert app.update_queue.empty() and running == {}
+
+
+@pytest.mark.asyncio
+async def test_disconnect_removes_webhook_served_by_another_worker(monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_MODE", "webhook")
+    monkeypatch.setattr(telegram_bot, "_running_bots", {})
+    bot = SimpleNamespace(delete_webhook=AsyncMock())
+
+    class _Bot:
+        def __init__(self, token):
+            assert token == "123:ABC"
+
+        async def __aenter__(self):
+            return bot
+
+        async def __aexit__(self, *exc):
+            return False
+
+    with patch.object(telegram_bot, "Bot", _Bot):
+        await telegram_bot.stop_bot("bot-1", unregister=True, token="123:ABC")
+
+    bot.delete_webhook.assert_awaited_once()
+
+
+def test_webhook_endpoint_checks_the_per_bot_secret(monkeypatch):
+    from main import app
+
+    def post(chatbot_id, secret):
+        return client.post(
+            f"/telegram/webhook/{chatbot_id}",
+            json={"update_id": 1},
+            headers={"X-Telegram-Bot-Api-Secret-Token": secret},
+        )
+
+    handler = AsyncMock(return_value=True)
+    with patch("app.routers.telegram.handle_webhook_update", handler):
+        client = TestClient(app)
+        monkeypatch.setattr(settings, "TELEGRAM_WEBHOOK_SECRET", "")
+        unconfigured = post("bot-1", "")  # no secret configured: nothing is accepted
+        monkeypatch.setattr(settings, "TELEGRAM_WEBHOOK_SECRET", "s3cret")
+        shared = post("bot-1", "s3cret")
+        other_bot = post("bot-1", telegram_bot.webhook_secret("bot-2"))
+        ok = post("bot-1", telegram_bot.webhook_secret("bot-1"))
+
+    assert [r.status_code for r in (unconfigured, shared, other_bot, ok)] == [403, 403, 403, 200]
+    handler.assert_awaited_once_with("bot-1", {"update_id": 1})
+
+
+@pytest.mark.asyncio
+async def test_webhook_mode_refuses_to_start_without_a_secret(monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_MODE", "webhook")
+    monkeypatch.setattr(settings, "TELEGRAM_WEBHOOK_URL", "https://api.example.com")
+    monkeypatch.setattr(settings, "TELEGRAM_WEBHOOK_SECRET", "")
+
+    with patch.object(telegram_bot, "_build_app") as build:
+        assert await telegram_bot.start_bot("bot-1", "123:ABC", "Acme") is False
+    build.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_serializes_each_chat_and_coalesces_bursts():
+    from app.services.telegram_dispatch import ChatDispatcher, IncomingMessage
+
+    dispatcher = ChatDispatcher(max_concurrency=1, coalesce_window=0.01)
+    batches, active, peak = [], 0, 0
+
+    async def handler(key, batch):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.03)
+        batches.append((key[1], [m.text for m in batch]))
+        active -= 1
+
+    for text in ("hi", "I need", "a refund"):
+        dispatcher.submit(("bot", 1), IncomingMessage(text, 9, 0), handler)
+    dispatcher.submit(("bot", 2), IncomingMessage("hours?", 8, 0), handler)
+    await asyncio.sleep(0.02)
+    dispatcher.submit(("bot", 1), IncomingMessage("order 42", 9, 0), handler)  # arrives mid-reply
+    while dispatcher._mailboxes:
+        await asyncio.sleep(0.01)
+
+    assert peak == 1  # global limit
+    assert [b for b in batches if b[0] == 1] == [(1, ["hi", "I need", "a refund"]), (1, ["order 42"])]
+    assert (2, ["hours?"]) in batches
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_answers_each_group_member_separately():
+    from app.services.telegram_dispatch import ChatDispatcher, IncomingMessage
+
+    dispatcher = ChatDispatcher(max_concurrency=4, coalesce_window=0.01)
+    batches = []
+
+    async def handler(key, batch):
+        batches.append([(m.user_id, m.text) for m in batch])
+
+    for user_id, text in ((1, "hi"), (2, "price?"), (1, "I need help")):
+        dispatcher.submit(("bot", -100), IncomingMessage(text, user_id, 0), handler)
+    while dispatcher._mailboxes:
+        await asyncio.sleep(0.01)
+
+    assert batches == [[(1, "hi"), (1, "I need help")], [(2, "price?")]]
+
+
+@pytest.mark.asyncio
+async def test_streaming_reply_edits_one_message_and_splits_long_text():
+    from app.services.telegram_dispatch import StreamingReply
+
+    bot = SimpleNamespace(
+        send_message=AsyncMock(return_value=SimpleNamespace(message_id=1)),
+        edit_message_text=AsyncMock(),
+        send_chat_action=AsyncMock(),
+    )
+    reply = StreamingReply(bot, chat_id=5, edit_interval=0, limit=40)
+
+    for delta in ("Opening ", "hours are ", "nine to five."):
+        await reply.feed(delta)
+    await reply.finish("fallback")
+
+    assert bot.send_message.await_count == 1
+    assert [c.kwargs["text"] for c in bot.edit_message_text.await_args_list][-1] == "Opening hours are nine to five."
+
+    await reply.feed(" Closed on Sundays and on public holidays.")
+    await reply.finish("fallback")
+    assert bot.send_message.await_count == 2  # past the limit: continues in a new message
+    assert reply.messages_sent == 2
+
+
+@pytest.mark.asyncio
+async def test_in_process_replies_are_admitted_per_chatbot():
+    from unittest.mock import MagicMock
+
+    from app.services.admission import AdmissionRejected
+    from app.services.telegram_dispatch import IncomingMessage
+
+    bot = SimpleNamespace(send_message=AsyncMock(), send_chat_action=AsyncMock())
+    admission = MagicMock(admit=AsyncMock(side_effect=AdmissionRejected(3, "Rate limit exceeded")))
+    rag = MagicMock()
+    with patch.object(telegram_bot, "get_admission", return_value=admission), \
+            patch.object(telegram_bot, "get_rag_service", return_value=rag):
+        await telegram_bot._reply(bot, "bot-1", 5, [IncomingMessage("hi", 9, 1)])
+
+    admission.admit.assert_awaited_once_with("chat", "bot-1")
+    rag.stream_response.assert_not_called()
+    assert "try again" in bot.send_message.await_args.kwargs["text"]
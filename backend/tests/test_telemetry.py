@@ -0,0 +1,58 @@
+"""Tests for the batched usage telemetry writer."""
+import asyncio
+
+import pytest
+
+from app.services.metrics import RequestTrace
+from app.services.telemetry import TelemetryWriter, UsageEvent
+
+
+def _event(i: int = 0) -> UsageEvent:
+    return UsageEvent(chatbot_id="bot-1", session_id=f"s{i}", mode="stream", retrieval="retrieved")
+
+
+@pytest.mark.asyncio
+async def test_records_are_flushed_in_batches_and_on_close():
+    writer = TelemetryWriter(max_queue=100, batch_size=3, flush_interval=0.05)
+    batches = []
+
+    async def _write(batch):
+        batches.append([e.session_id for e in batch])
+
+    writer._write = _write
+    for i in range(7):
+        assert writer.record(_event(i))
+    writer.start()
+    await asyncio.sleep(0.01)
+    writer.record(_event(7))
+    await writer.close()
+
+    assert [len(b) for b in batches] == [3, 3, 2]
+    assert [s for b in batches for s in b] == [f"s{i}" for i in range(8)]
+    assert not writer.record(_event(8))  # closed
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_instead_of_blocking():
+    writer = TelemetryWriter(max_queue=2, batch_size=10, flush_interval=0.05)
+
+    results = [writer.record(_event(i)) for i in range(5)]
+
+    assert results == [True, True, False, False, False]
+    assert writer.dropped == 3
+
+
+def test_usage_event_from_trace():
+    trace = RequestTrace("bot-1", "sess-1")
+    trace.retrieval = "retrieved"
+    trace.record_retrieved(["doc1_0", "doc1_3"])
+    trace.record_tokens("prompt", 420)
+    trace.record_tokens("completion", 64)
+    trace.observe("llm_ttft", 0.2504)
+    trace.finish()
+
+    event = UsageEvent.from_trace(trace, "stream")
+
+    assert event.retrieved_chunks == ["doc1_0", "doc1_3"]
+    assert (event.prompt_tokens, event.completion_tokens, event.ttft_ms) == (420, 64, 250)
+    assert event.total_ms >= 0 and event.session_id == "sess-1"
@@ -84,6 +84,7 @@ export async function POST(req: NextRequest) {
           visitor_id: visitorId,
           history: historyForBackend,
           language,
+          business_name: chatbot.businessName,
           system_prompt: chatbot.systemPrompt,
         }),
       });
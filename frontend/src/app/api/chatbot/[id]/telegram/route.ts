@@ -68,7 +68,7 @@ export async function POST(req: NextRequest, { params }: Props) {
       await fetch(`${backendUrl}/telegram/disconnect`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ chatbot_id: params.id }),
+        body: JSON.stringify({ chatbot_id: params.id, token: chatbot.telegramToken }),
       });
     } catch {
       // Silently fail if backend is unreachable
@@ -0,0 +1,33 @@
+-- scripts/nl2sql-role.sql – restricted role for NL2SQL analytics queries
+--
+-- The backend shadows every analytics table with a per-user CTE that selects
+-- only the columns below (app/services/nl2sql_service.py). This role is the
+-- second line of defence: with NL2SQL_DB_ROLE=nl2sql_reader each query runs
+-- under SET LOCAL ROLE and can read nothing else – no telegramToken,
+-- systemPrompt, document content, Account / Session tokens.
+--
+--   psql "$DATABASE_URL" -v app_user=chatbot -f scripts/nl2sql-role.sql
+--
+-- Re-run after Prisma migrations that add analytics columns.
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'nl2sql_reader') THEN
+    CREATE ROLE nl2sql_reader NOLOGIN;
+  END IF;
+END
+$$;
+
+GRANT nl2sql_reader TO :"app_user";
+GRANT USAGE ON SCHEMA public TO nl2sql_reader;
+REVOKE ALL ON ALL TABLES IN SCHEMA public FROM nl2sql_reader;
+
+GRANT SELECT (id, name, email, plan, "createdAt") ON "User" TO nl2sql_reader;
+GRANT SELECT (id, "userId", name, "businessName", language, "isActive", "createdAt")
+  ON "Chatbot" TO nl2sql_reader;
+GRANT SELECT (id, "chatbotId", "visitorId", language, "createdAt") ON "ChatSession" TO nl2sql_reader;
+GRANT SELECT (id, "sessionId", role, content, tokens, confidence, "createdAt") ON "Message" TO nl2sql_reader;
+GRANT SELECT (id, "chatbotId", name, type, status, "chunkCount", "createdAt") ON "Document" TO nl2sql_reader;
+
+GRANT SELECT ON chat_usage, analytics_rollup_hourly, analytics_rollup_daily,
+  analytics_rollup_language_daily TO nl2sql_reader;
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+scripts/reembed-collections.py
+
+Re-embeds existing chatbot collections with another embedding model (for
+example after switching EMBEDDING_MODE=multilingual) and records the model
+on each collection so queries are embedded to match.
+
+Documents, ids and metadata are kept. Each collection is rebuilt into a
+shadow collection (never updated in place, so the live one is never half
+on one model and half on the other), chunks written or deleted meanwhile
+are reconciled, and the shadow is then renamed over the original. Chunks
+are compared by a hash of their text and metadata, not just their id, so
+a document re-ingested during the rebuild (same ids, new content) is
+copied again rather than left stale in the shadow.
+Running backends notice the swap on their next query (ChromaService checks
+the collection's model) – no restart needed.
+
+Usage (Chroma reachable via CHROMA_HOST / CHROMA_PORT):
+    python scripts/reembed-collections.py                       # every bot_* collection
+    python scripts/reembed-collections.py --chatbot <chatbot_id>
+    python scripts/reembed-collections.py --model all-MiniLM-L6-v2 --dry-run
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Allow running from repo root
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from app.config import settings  # noqa: E402
+from app.services.chroma_service import ChromaService  # noqa: E402
+from app.services.embedding_service import EmbeddingService, collection_model  # noqa: E402
+
+PAGE_SIZE = 256
+
+
+async def reembed(
+    chroma: ChromaService,
+    embedder: EmbeddingService,
+    name: str,
+    model: str,
+    dry_run: bool,
+) -> None:
+    client = chroma._get_client()
+    collection = client.get_collection(name)
+    current = (collection.metadata or {}).get("embedding_model") or settings.EMBEDDING_MODEL
+    total = collection.count()
+    if current == model:
+        print(f"{name}: already on {model} ({total} chunks) – skipped")
+        return
+    print(f"{name}: {current} -> {model} ({total} chunks)")
+    if dry_run or total == 0:
+        if total == 0 and not dry_run:
+            _record_model(collection, model)
+        return
+
+    shadow_name, old_name = f"{name}__reembed", f"{name}__old"
+    for leftover in (shadow_name, old_name):  # from an interrupted run
+        try:
+            client.delete_collection(leftover)
+        except Exception:
+            pass
+    shadow = client.create_collection(
+        shadow_name, metadata={"hnsw:space": "cosine", "embedding_model": model}
+    )
+
+    started = time.perf_counter()
+    copied: Dict[str, str] = {}  # chunk id -> fingerprint of what the shadow got
+    done = 0
+    for offset in range(0, total, PAGE_SIZE):
+        page = collection.get(offset=offset, limit=PAGE_SIZE, include=["documents", "metadatas"])
+        done += await _copy(embedder, shadow, page, model, copied)
+        print(f"  {done}/{total}", end="\r", flush=True)
+
+    # catch up with ingests, re-ingests and deletions that hit the original meanwhile
+    added, removed = await _reconcile(embedder, collection, shadow, model, copied, delete=True)
+
+    # swap: the name is free only between these two calls
+    collection.modify(name=old_name)
+    try:
+        shadow.modify(name=name)
+    except Exception:
+        # an ingest re-created the collection in that instant: fold it in, retry
+        stray = client.get_collection(name)
+        added += (await _reconcile(embedder, stray, shadow, model, copied, delete=False))[0]
+        client.delete_collection(name)
+        shadow.modify(name=name)
+    added += (await _reconcile(embedder, collection, shadow, model, copied, delete=False))[0]
+    client.delete_collection(old_name)
+    print(f"  {done}/{total} in {time.perf_counter() - started:.1f}s "
+          f"(+{added} / -{removed} changed during the rebuild)")
+
+
+async def _copy(
+    embedder: EmbeddingService, target, page, model: str, copied: Dict[str, str]
+) -> int:
+    ids: List[str] = page["ids"]
+    if not ids:
+        return 0
+    documents: List[str] = page["documents"]
+    vectors = await embedder.embed_chunks(documents, model=model)
+    target.upsert(ids=ids, embeddings=vectors, documents=documents, metadatas=page["metadatas"])
+    copied.update(zip(ids, map(_fingerprint, documents, page["metadatas"])))
+    return len(ids)
+
+
+async def _reconcile(
+    embedder: EmbeddingService, source, target, model: str, copied: Dict[str, str], delete: bool
+):
+    """
+    Copy chunks that are new or changed in *source* into *target*; with
+    *delete* drop ones only *target* has. A chunk *target* no longer holds
+    as copied was written (or deleted) there directly after the swap and is
+    newer, so it is left alone.
+    """
+    source_chunks, target_chunks = _fingerprints(source), _fingerprints(target)
+    changed = sorted(
+        chunk_id for chunk_id, fingerprint in source_chunks.items()
+        if fingerprint != copied.get(chunk_id) and target_chunks.get(chunk_id) == copied.get(chunk_id)
+    )
+    added = 0
+    for k in range(0, len(changed), PAGE_SIZE):
+        page = source.get(ids=changed[k : k + PAGE_SIZE], include=["documents", "metadatas"])
+        added += await _copy(embedder, target, page, model, copied)
+    extra = sorted(set(target_chunks) - set(source_chunks)) if delete else []
+    if extra:
+        target.delete(ids=extra)
+    return added, len(extra)
+
+
+def _fingerprints(collection) -> Dict[str, str]:
+    """chunk id -> hash of its text and metadata."""
+    fingerprints: Dict[str, str] = {}
+    offset = 0
+    while True:
+        page = collection.get(offset=offset, limit=PAGE_SIZE, include=["documents", "metadatas"])
+        fingerprints.update(zip(page["ids"], map(_fingerprint, page["documents"], page["metadatas"])))
+        if len(page["ids"]) < PAGE_SIZE:
+            return fingerprints
+        offset += PAGE_SIZE
+
+
+def _fingerprint(document: Optional[str], metadata: Optional[dict]) -> str:
+    payload = json.dumps([document, metadata or {}], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _record_model(collection, model: str) -> None:
+    metadata = {k: v for k, v in (collection.metadata or {}).items() if not k.startswith("hnsw:")}
+    metadata["embedding_model"] = model
+    collection.modify(metadata=metadata)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chatbot", help="only this chatbot id (default: all bot_* collections)")
+    parser.add_argument("--model", default=collection_model(), help="target embedding model")
+    parser.add_argument("--dry-run", action="store_true", help="list what would change")
+    args = parser.parse_args()
+
+    chroma = ChromaService()
+    embedder = EmbeddingService()
+    if args.chatbot:
+        names = [chroma._collection_name(args.chatbot)]
+    else:
+        names = sorted(
+            c.name for c in chroma._get_client().list_collections() if c.name.startswith("bot_")
+        )
+    print(f"Re-embedding {len(names)} collection(s) with {args.model}")
+    for name in names:
+        await reembed(chroma, embedder, name, args.model, args.dry_run)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())